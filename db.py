@@ -1,88 +1,491 @@
+import os
+import re
 import sqlite3
+import logging
+import threading
 from contextlib import closing
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Any, Dict, List, Tuple, Optional
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:  # без cryptography работает всё, кроме сохранения ключей API
+    Fernet = InvalidToken = None
+
+logger = logging.getLogger(__name__)
 
 DB_NAME = 'trading_bot.db'
 
+# Закрытые сделки старше HOT_MONTHS полных месяцев переносятся из основной БД
+# в помесячные архивы ARCHIVE_DIR/trades-ГГГГ-ММ.db рядом с DB_NAME
+ARCHIVE_DIR = 'archive'
+HOT_MONTHS = 1
+_ARCHIVE_FILE = re.compile(r'trades-(\d{4}-\d{2})\.db')
+_archive_checked: Optional[str] = None  # месяц последней проверки архивации
+
+TRADE_COLUMNS = ('id', 'strategy', 'symbol', 'entry_price', 'exit_price', 'volume', 'entry_time', 'exit_time',
+                 'profit', 'status', 'side', 'leverage', 'mode', 'fee', 'user_id', 'run_id', 'params_hash')
+# Колонки сделки после id — общие для основной таблицы и архивов
+_TRADE_DDL = '''
+    strategy TEXT NOT NULL,
+    symbol TEXT NOT NULL,
+    entry_price REAL NOT NULL,
+    exit_price REAL,
+    volume REAL NOT NULL,
+    entry_time TEXT NOT NULL,
+    exit_time TEXT,
+    profit REAL,
+    status TEXT NOT NULL DEFAULT 'open',
+    side TEXT,
+    leverage INTEGER,
+    mode TEXT NOT NULL DEFAULT 'live',
+    fee REAL,
+    user_id INTEGER NOT NULL DEFAULT 0,
+    run_id TEXT NOT NULL DEFAULT '',
+    params_hash TEXT
+'''
+# Миграция баз и архивов, созданных до появления колонок; user_id = 0 — сделки без владельца,
+# run_id = '' — сделки, записанные до учёта запусков
+_TRADE_MIGRATIONS = (
+    ('side', 'side TEXT'),
+    ('leverage', 'leverage INTEGER'),
+    ('mode', "mode TEXT NOT NULL DEFAULT 'live'"),
+    ('fee', 'fee REAL'),
+    ('user_id', 'user_id INTEGER NOT NULL DEFAULT 0'),
+    ('run_id', "run_id TEXT NOT NULL DEFAULT ''"),
+    ('params_hash', 'params_hash TEXT'),
+)
+
+# Значения по умолчанию для полей settings, не заданных пользователем
+DEFAULT_SETTINGS = {
+    'default_strategy': 'Стратегия 2',
+    'default_symbol': 'BTCUSDT',
+    'risk_per_trade': 0.01,
+    'leverage': 5,
+    'api_key': None,
+    'api_secret': None,
+}
+
+# Ключи API пользователей хранятся (и кешируются) только зашифрованными Fernet;
+# ключ шифрования — в переменной окружения SECRETS_KEY (Fernet.generate_key())
+SECRETS_KEY_ENV = 'SECRETS_KEY'
+_SECRET_FIELDS = ('api_key', 'api_secret')
+_ENCRYPTED_PREFIX = 'enc:'
+
+# Write-through кеш настроек: чтение без обращения к SQLite, запись — сразу в БД и в кеш
+_settings_cache: Dict[int, Optional[Tuple]] = {}
+_settings_lock = threading.Lock()
+
+def _add_missing_columns(conn: sqlite3.Connection, table: str, columns: Tuple[Tuple[str, str], ...]):
+    """Миграция: добавляет колонки, которых нет в таблице (в том числе 'archive.trades')"""
+    schema, _, name = table.rpartition('.')
+    prefix = f'{schema}.' if schema else ''
+    existing = {row[1] for row in conn.execute(f'PRAGMA {prefix}table_info({name})')}
+    for name, ddl in columns:
+        if name not in existing:
+            conn.execute(f'ALTER TABLE {table} ADD COLUMN {ddl}')
+
+# Сводная строка по всем стратегиям, парам или дням
+ALL = '*'
+
+# Первичный ключ сводной таблицы: статистика каждого пользователя и каждого запуска
+# (live или paper-N) считается отдельно
+_STATS_KEY = ('user_id', 'mode', 'run_id', 'strategy', 'symbol', 'day')
+_STATS_COLUMNS = ('trades', 'wins', 'gross_pnl', 'net_pnl', 'fees', 'equity', 'peak', 'max_drawdown',
+                  'hold_seconds')
+
+def _fernet() -> 'Fernet':
+    key = os.getenv(SECRETS_KEY_ENV)
+    if Fernet is None or not key:
+        raise RuntimeError(f"Для хранения ключей API нужны пакет cryptography и переменная {SECRETS_KEY_ENV}")
+    return Fernet(key.encode('ascii'))
+
+def encrypt_secret(value: Optional[str]) -> Optional[str]:
+    if not value or value.startswith(_ENCRYPTED_PREFIX):
+        return value
+    return _ENCRYPTED_PREFIX + _fernet().encrypt(value.encode('utf-8')).decode('ascii')
+
+def decrypt_secret(value: Optional[str]) -> Optional[str]:
+    """Расшифровка ключа API; значения, сохранённые до шифрования, возвращаются как есть"""
+    if not value or not value.startswith(_ENCRYPTED_PREFIX):
+        return value
+    try:
+        return _fernet().decrypt(value[len(_ENCRYPTED_PREFIX):].encode('ascii')).decode('utf-8')
+    except InvalidToken:
+        raise RuntimeError(f"Ключ API не расшифровывается: изменилась переменная {SECRETS_KEY_ENV}?")
+
+def _encrypt_stored_secrets(conn: sqlite3.Connection):
+    """Миграция: шифрует ключи API, сохранённые открытым текстом"""
+    rows = conn.execute(
+        f"SELECT user_id, api_key, api_secret FROM settings WHERE "
+        f"(api_key IS NOT NULL AND api_key NOT LIKE '{_ENCRYPTED_PREFIX}%') OR "
+        f"(api_secret IS NOT NULL AND api_secret NOT LIKE '{_ENCRYPTED_PREFIX}%')"
+    ).fetchall()
+    if not rows:
+        return
+    try:
+        encrypted = [(encrypt_secret(key), encrypt_secret(secret), user_id) for user_id, key, secret in rows]
+    except RuntimeError as e:
+        logger.warning(f"Ключи API {len(rows)} пользователей хранятся открытым текстом: {e}")
+        return
+    conn.executemany('UPDATE settings SET api_key = ?, api_secret = ? WHERE user_id = ?', encrypted)
+    logger.info(f"Ключи API {len(rows)} пользователей зашифрованы")
+
 def init_db():
     """Инициализирует базу данных с необходимыми таблицами"""
     with closing(sqlite3.connect(DB_NAME)) as conn:
         with conn:
-            conn.execute('''
-                CREATE TABLE IF NOT EXISTS trades (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    strategy TEXT NOT NULL,
-                    symbol TEXT NOT NULL,
-                    entry_price REAL NOT NULL,
-                    exit_price REAL,
-                    volume REAL NOT NULL,
-                    entry_time TEXT NOT NULL,
-                    exit_time TEXT,
-                    profit REAL,
-                    status TEXT NOT NULL DEFAULT 'open'
-                )
-            ''')
+            stats_columns = {row[1] for row in conn.execute('PRAGMA table_info(trade_stats)')}
+            if stats_columns and not set(_STATS_KEY) <= stats_columns:
+                # Ключ сводной таблицы изменился: пересобираем её из сделок
+                conn.execute('DROP TABLE trade_stats')
+            stats_existed = set(_STATS_KEY) <= stats_columns
+            # AUTOINCREMENT: id не переиспользуются после переноса сделок в архив
+            conn.execute(f'CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY AUTOINCREMENT, {_TRADE_DDL})')
+            _add_missing_columns(conn, 'trades', _TRADE_MIGRATIONS)
+            conn.execute('DROP INDEX IF EXISTS idx_trades_status')
+            conn.execute('DROP INDEX IF EXISTS idx_trades_entry')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_status ON trades (user_id, status, mode)')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_entry ON trades (user_id, mode, entry_time)')
             conn.execute('''
                 CREATE TABLE IF NOT EXISTS settings (
                     user_id INTEGER PRIMARY KEY,
                     default_strategy TEXT,
                     default_symbol TEXT,
-                    risk_per_trade REAL DEFAULT 0.01
+                    risk_per_trade REAL DEFAULT 0.01,
+                    leverage INTEGER DEFAULT 5,
+                    api_key TEXT,
+                    api_secret TEXT
+                )
+            ''')
+            _add_missing_columns(conn, 'settings', (
+                ('leverage', 'leverage INTEGER DEFAULT 5'),
+                ('api_key', 'api_key TEXT'),
+                ('api_secret', 'api_secret TEXT'),
+            ))
+            _encrypt_stored_secrets(conn)
+            # Накопительная статистика по (запуск, стратегия, пара, день); '*' — итог по измерению.
+            # equity/peak — накопленный чистый результат и его максимум для расчёта просадки
+            conn.execute(f'''
+                CREATE TABLE IF NOT EXISTS trade_stats (
+                    user_id INTEGER NOT NULL,
+                    mode TEXT NOT NULL,
+                    run_id TEXT NOT NULL,
+                    strategy TEXT NOT NULL,
+                    symbol TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    trades INTEGER NOT NULL DEFAULT 0,
+                    wins INTEGER NOT NULL DEFAULT 0,
+                    gross_pnl REAL NOT NULL DEFAULT 0,
+                    net_pnl REAL NOT NULL DEFAULT 0,
+                    fees REAL NOT NULL DEFAULT 0,
+                    equity REAL NOT NULL DEFAULT 0,
+                    peak REAL NOT NULL DEFAULT 0,
+                    max_drawdown REAL NOT NULL DEFAULT 0,
+                    hold_seconds REAL NOT NULL DEFAULT 0,
+                    PRIMARY KEY ({', '.join(_STATS_KEY)})
                 )
             ''')
+            for month in _archive_months():
+                _migrate_archive(month)
+            if not stats_existed:
+                # Первый запуск с rollup-таблицей: один раз пересчитываем закрытые сделки
+                _rebuild_trade_stats(conn)
 
-def add_trade(strategy: str, symbol: str, entry_price: float, volume: float) -> int:
-    """Добавляет новую сделку в базу данных"""
+def add_trade(strategy: str, symbol: str, entry_price: float, volume: float,
+              side: str = None, leverage: int = None, mode: str = 'live', user_id: int = 0,
+              run_id: str = 'live', params_hash: Optional[str] = None, fee: Optional[float] = None) -> int:
+    """Добавляет новую сделку пользователя user_id в базу данных (mode: 'live' или 'paper').
+
+    run_id — запуск стратегии ('live', 'paper-N'), params_hash — отпечаток её
+    параметров на момент входа, fee — комиссия входа (при закрытии сделки она
+    добавляется к комиссии выхода).
+    """
     with closing(sqlite3.connect(DB_NAME)) as conn:
         with conn:
             cursor = conn.execute('''
-                INSERT INTO trades (strategy, symbol, entry_price, volume, entry_time, status)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (strategy, symbol, entry_price, volume, datetime.utcnow().isoformat(), 'open'))
+                INSERT INTO trades (strategy, symbol, entry_price, volume, entry_time, status, side, leverage, mode,
+                                    user_id, run_id, params_hash, fee)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (strategy, symbol, entry_price, volume, datetime.utcnow().isoformat(), 'open', side, leverage, mode,
+                  user_id, run_id, params_hash, fee))
             return cursor.lastrowid
 
-def close_trade(trade_id: int, exit_price: float, profit: float):
-    """Закрывает сделку и записывает результат"""
+def _trade_result(entry_price: float, exit_price: float, volume: float, side: Optional[str],
+                  profit: Optional[float], fee: Optional[float]) -> Tuple[float, float, float]:
+    """(gross, fee, net): результат по цене, комиссия и итог после комиссии"""
+    direction = -1 if side == 'sell' else 1
+    gross = (exit_price - entry_price) * volume * direction
+    if profit is not None:
+        # Исполнитель уже учёл комиссию — её размер восстанавливаем из разницы
+        return gross, gross - profit if fee is None else fee, profit
+    fee = fee or 0.0
+    return gross, fee, gross - fee
+
+def _apply_trade_stats(conn: sqlite3.Connection, user_id: int, mode: str, run_id: str, strategy: str, symbol: str,
+                       day: str, gross: float, fee: float, net: float, hold_seconds: float):
+    """Добавляет закрытую сделку во все сводные строки пользователя, которые её включают"""
+    rows = [
+        (user_id, mode, run, st, sym, d, 1, int(net > 0), gross, net, fee, net, max(net, 0.0), max(-net, 0.0),
+         hold_seconds)
+        for run in (run_id, ALL) for st in (strategy, ALL) for sym in (symbol, ALL) for d in (day, ALL)
+    ]
+    # В UPDATE правые части видят старые значения строки, поэтому equity + net — новая equity
+    key = ', '.join(_STATS_KEY)
+    conn.executemany(f'''
+        INSERT INTO trade_stats ({key}, {', '.join(_STATS_COLUMNS)})
+        VALUES ({', '.join('?' * (len(_STATS_KEY) + len(_STATS_COLUMNS)))})
+        ON CONFLICT ({key}) DO UPDATE SET
+            trades = trades + 1,
+            wins = wins + excluded.wins,
+            gross_pnl = gross_pnl + excluded.gross_pnl,
+            net_pnl = net_pnl + excluded.net_pnl,
+            fees = fees + excluded.fees,
+            equity = equity + excluded.net_pnl,
+            peak = MAX(peak, equity + excluded.net_pnl),
+            max_drawdown = MAX(max_drawdown, MAX(peak, equity + excluded.net_pnl) - (equity + excluded.net_pnl)),
+            hold_seconds = hold_seconds + excluded.hold_seconds
+    ''', rows)
+
+def _rebuild_trade_stats(conn: sqlite3.Connection):
+    conn.execute('DELETE FROM trade_stats')
+    query = '''
+        SELECT user_id, mode, run_id, strategy, symbol, entry_price, exit_price, volume, side, profit, fee,
+               entry_time, exit_time
+        FROM trades WHERE status = 'closed' AND exit_price IS NOT NULL
+    '''
+    rows = conn.execute(query).fetchall()
+    for month in _archive_months():
+        with closing(_connect_archive(month)) as archive:
+            rows += archive.execute(query).fetchall()
+    # Просадка зависит от порядка закрытия сделок
+    rows.sort(key=lambda row: row[-1])
+    for (user_id, mode, run_id, strategy, symbol, entry_price, exit_price, volume, side, profit, fee,
+         entry_time, exit_time) in rows:
+        gross, fee, net = _trade_result(entry_price, exit_price, volume, side, profit, fee)
+        hold = (datetime.fromisoformat(exit_time) - datetime.fromisoformat(entry_time)).total_seconds()
+        _apply_trade_stats(conn, user_id, mode, run_id, strategy, symbol, exit_time[:10], gross, fee, net, hold)
+
+def close_trade(trade_id: int, exit_price: float, profit: Optional[float] = None, fee: Optional[float] = None):
+    """Закрывает сделку, записывает результат и обновляет сводную статистику.
+
+    profit и fee относятся к выходу: если profit не передан, он считается по
+    ценам входа и выхода за вычетом fee. Комиссия входа, записанная при
+    открытии, добавляется к комиссии и вычитается из итога сделки.
+    """
     with closing(sqlite3.connect(DB_NAME)) as conn:
         with conn:
+            row = conn.execute('''
+                SELECT user_id, mode, run_id, strategy, symbol, entry_price, volume, side, entry_time, fee
+                FROM trades WHERE id = ? AND status = 'open'
+            ''', (trade_id,)).fetchone()
+            if row is None:
+                return  # уже закрыта (например, TP/SL и сигнал выхода пришли одновременно)
+            user_id, mode, run_id, strategy, symbol, entry_price, volume, side, entry_time, entry_fee = row
+            gross, fee, net = _trade_result(entry_price, exit_price, volume, side, profit, fee)
+            fee += entry_fee or 0.0
+            net -= entry_fee or 0.0
+            exit_time = datetime.utcnow()
             conn.execute('''
                 UPDATE trades
-                SET exit_price = ?, exit_time = ?, profit = ?, status = 'closed'
+                SET exit_price = ?, exit_time = ?, profit = ?, fee = ?, status = 'closed'
                 WHERE id = ?
-            ''', (exit_price, datetime.utcnow().isoformat(), profit, trade_id))
+            ''', (exit_price, exit_time.isoformat(), net, fee, trade_id))
+            hold = (exit_time - datetime.fromisoformat(entry_time)).total_seconds()
+            _apply_trade_stats(conn, user_id, mode, run_id, strategy, symbol, exit_time.date().isoformat(),
+                               gross, fee, net, hold)
+    _maybe_archive(exit_time)
 
-def get_open_trades() -> List[Tuple]:
-    """Возвращает список открытых сделок"""
+def get_open_trades(user_id: int, mode: str = 'live') -> List[Tuple]:
+    """Возвращает список открытых сделок пользователя"""
     with closing(sqlite3.connect(DB_NAME)) as conn:
         cur = conn.cursor()
-        cur.execute('SELECT * FROM trades WHERE status = "open"')
+        cur.execute('SELECT * FROM trades WHERE user_id = ? AND status = "open" AND mode = ?', (user_id, mode))
         return cur.fetchall()
 
-def get_trade_history(limit: int = 100) -> List[Tuple]:
-    """Возвращает историю сделок"""
+def get_trade_history(user_id: int, limit: int = 100, mode: str = 'live', since: Optional[str] = None) -> List[Tuple]:
+    """История сделок пользователя (колонки TRADE_COLUMNS) от новых к старым.
+
+    Сначала читается основная БД; архивы дочитываются от новых месяцев к
+    старым, пока в них могут найтись сделки новее уже набранных.
+    """
+    query = f"SELECT {', '.join(TRADE_COLUMNS)} FROM trades WHERE user_id = ? AND mode = ?"
+    params: List[Any] = [user_id, mode]
+    if since:
+        query += ' AND entry_time >= ?'
+        params.append(since)
+    query += ' ORDER BY entry_time DESC LIMIT ?'
+    params.append(limit)
     with closing(sqlite3.connect(DB_NAME)) as conn:
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM trades ORDER BY entry_time DESC LIMIT ?', (limit,))
-        return cur.fetchall()
+        rows = conn.execute(query, params).fetchall()
+    entry = TRADE_COLUMNS.index('entry_time')
+    for month in reversed(_archive_months()):
+        # Сделки архива закрыты в этом месяце, значит открыты до начала следующего
+        bound = _next_month(month)
+        if since and bound <= since:
+            break
+        if len(rows) >= limit and rows[limit - 1][entry] >= bound:
+            break
+        with closing(_connect_archive(month)) as archive:
+            rows += archive.execute(query, params).fetchall()
+        rows.sort(key=lambda row: row[entry], reverse=True)
+        del rows[limit:]
+    return rows
 
-def get_user_settings(user_id: int) -> Optional[Tuple]:
-    """Возвращает настройки пользователя"""
+def _next_month(month: str) -> str:
+    year, number = divmod(int(month[:4]) * 12 + int(month[5:7]), 12)
+    return f'{year:04d}-{number + 1:02d}'
+
+def _archive_path(month: str) -> str:
+    return os.path.join(os.path.dirname(os.path.abspath(DB_NAME)), ARCHIVE_DIR, f'trades-{month}.db')
+
+def _archive_months() -> List[str]:
+    """Месяцы, для которых есть архив, по возрастанию"""
+    try:
+        names = os.listdir(os.path.dirname(_archive_path('0000-00')))
+    except FileNotFoundError:
+        return []
+    return sorted(match.group(1) for match in map(_ARCHIVE_FILE.fullmatch, names) if match)
+
+def _connect_archive(month: str) -> sqlite3.Connection:
+    # Только чтение: запрос истории не должен создавать файлы архива
+    return sqlite3.connect(f'file:{_archive_path(month)}?mode=ro', uri=True)
+
+def _migrate_archive(month: str):
+    """Доводит схему архива до текущей: история читает архивы только на чтение"""
+    with closing(sqlite3.connect(_archive_path(month))) as archive:
+        with archive:
+            _add_missing_columns(archive, 'trades', _TRADE_MIGRATIONS)
+            archive.execute('DROP INDEX IF EXISTS idx_trades_entry')
+            archive.execute('CREATE INDEX IF NOT EXISTS idx_trades_user_entry ON trades (user_id, mode, entry_time)')
+
+def archive_trades(hot_months: int = HOT_MONTHS, now: Optional[datetime] = None) -> int:
+    """Переносит закрытые сделки старше hot_months полных месяцев в помесячные архивы.
+
+    Перенос месяца — одна транзакция над основной БД и подключённым архивом,
+    поэтому сделка не теряется и не дублируется при сбое. Возвращает число
+    перенесённых сделок.
+    """
+    now = now or datetime.utcnow()
+    year, month = divmod(now.year * 12 + now.month - 1 - hot_months, 12)
+    cutoff = f'{year:04d}-{month + 1:02d}'  # первый месяц, который остаётся в основной БД
+    columns = ', '.join(TRADE_COLUMNS)
+    moved = 0
     with closing(sqlite3.connect(DB_NAME)) as conn:
-        cur = conn.cursor()
-        cur.execute('SELECT * FROM settings WHERE user_id = ?', (user_id,))
-        return cur.fetchone()
+        months = [row[0] for row in conn.execute(
+            "SELECT DISTINCT substr(exit_time, 1, 7) FROM trades WHERE status = 'closed' AND exit_time < ?",
+            (cutoff,)
+        )]
+        for archive_month in months:
+            path = _archive_path(archive_month)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            bounds = (archive_month, _next_month(archive_month))
+            conn.execute('ATTACH DATABASE ? AS archive', (path,))
+            try:
+                with conn:
+                    conn.execute(f'CREATE TABLE IF NOT EXISTS archive.trades (id INTEGER PRIMARY KEY, {_TRADE_DDL})')
+                    _add_missing_columns(conn, 'archive.trades', _TRADE_MIGRATIONS)
+                    conn.execute(
+                        'CREATE INDEX IF NOT EXISTS archive.idx_trades_user_entry ON trades (user_id, mode, entry_time)'
+                    )
+                    conn.execute(f'''
+                        INSERT OR IGNORE INTO archive.trades ({columns})
+                        SELECT {columns} FROM main.trades
+                        WHERE status = 'closed' AND exit_time >= ? AND exit_time < ?
+                    ''', bounds)
+                    moved += conn.execute(
+                        "DELETE FROM main.trades WHERE status = 'closed' AND exit_time >= ? AND exit_time < ?",
+                        bounds
+                    ).rowcount
+            finally:
+                conn.execute('DETACH DATABASE archive')
+            logger.info(f"Сделки за {archive_month} перенесены в архив {path}")
+    return moved
+
+def _maybe_archive(now: datetime):
+    """Архивация раз в месяц по первой закрытой в нём сделке"""
+    global _archive_checked
+    month = now.strftime('%Y-%m')
+    if _archive_checked == month:
+        return
+    _archive_checked = month
+    try:
+        archive_trades(now=now)
+    except sqlite3.Error as e:
+        _archive_checked = None
+        logger.error(f"Ошибка архивации сделок: {e}")
+
+def get_trade_stats(user_id: int, strategy: str = ALL, symbol: str = ALL, day: str = ALL,
+                    mode: str = 'live', run_id: str = ALL) -> Optional[Dict[str, Any]]:
+    """Сводная статистика пользователя одной строкой по первичному ключу, без просмотра сделок"""
+    with closing(sqlite3.connect(DB_NAME)) as conn:
+        row = conn.execute(
+            f"SELECT {', '.join(_STATS_COLUMNS)} FROM trade_stats "
+            "WHERE user_id = ? AND mode = ? AND run_id = ? AND strategy = ? AND symbol = ? AND day = ?",
+            (user_id, mode, run_id, strategy, symbol, day)
+        ).fetchone()
+    if row is None:
+        return None
+    stats = dict(zip(_STATS_COLUMNS, row))
+    stats['win_rate'] = stats['wins'] / stats['trades']
+    stats['avg_hold_seconds'] = stats['hold_seconds'] / stats['trades']
+    return stats
 
-def update_user_settings(user_id: int, strategy: str = None, symbol: str = None, risk: float = None):
-    """Обновляет настройки пользователя"""
+def get_strategy_stats(user_id: int, mode: str = 'live', run_id: str = ALL) -> Dict[str, Dict[str, Any]]:
+    """Итоги пользователя по каждой стратегии за всё время (или в одном запуске run_id)"""
     with closing(sqlite3.connect(DB_NAME)) as conn:
+        rows = conn.execute(
+            f"SELECT strategy, {', '.join(_STATS_COLUMNS)} FROM trade_stats "
+            "WHERE user_id = ? AND mode = ? AND run_id = ? AND symbol = ? AND day = ? AND strategy != ?",
+            (user_id, mode, run_id, ALL, ALL, ALL)
+        ).fetchall()
+    result = {}
+    for strategy, *values in rows:
+        stats = dict(zip(_STATS_COLUMNS, values))
+        stats['win_rate'] = stats['wins'] / stats['trades']
+        stats['avg_hold_seconds'] = stats['hold_seconds'] / stats['trades']
+        result[strategy] = stats
+    return result
+
+def _load_user_settings(conn: sqlite3.Connection, user_id: int) -> Optional[Tuple]:
+    cur = conn.cursor()
+    cur.execute('SELECT * FROM settings WHERE user_id = ?', (user_id,))
+    return cur.fetchone()
+
+def get_user_settings(user_id: int) -> Optional[Tuple]:
+    """Возвращает настройки пользователя (из кеша после первого чтения)"""
+    with _settings_lock:
+        if user_id in _settings_cache:
+            return _settings_cache[user_id]
+    with closing(sqlite3.connect(DB_NAME)) as conn:
+        settings = _load_user_settings(conn, user_id)
+    with _settings_lock:
+        return _settings_cache.setdefault(user_id, settings)
+
+def get_user_config(user_id: int) -> Dict[str, Any]:
+    """Настройки пользователя словарём, пустые поля заполнены значениями по умолчанию"""
+    config = dict(DEFAULT_SETTINGS)
+    settings = get_user_settings(user_id)
+    if settings:
+        columns = ('user_id',) + tuple(DEFAULT_SETTINGS)
+        for name, value in zip(columns, settings):
+            if value is not None:
+                config[name] = decrypt_secret(value) if name in _SECRET_FIELDS else value
+    config['user_id'] = user_id
+    return config
+
+def update_user_settings(user_id: int, strategy: str = None, symbol: str = None, risk: float = None,
+                         leverage: int = None, api_key: str = None, api_secret: str = None):
+    """Обновляет настройки пользователя; ключи API сохраняются зашифрованными"""
+    api_key, api_secret = encrypt_secret(api_key), encrypt_secret(api_secret)
+    with _settings_lock, closing(sqlite3.connect(DB_NAME)) as conn:
         with conn:
-            settings = get_user_settings(user_id)
+            settings = _load_user_settings(conn, user_id)
             if not settings:
                 conn.execute('''
-                    INSERT INTO settings (user_id, default_strategy, default_symbol, risk_per_trade)
-                    VALUES (?, ?, ?, ?)
-                ''', (user_id, strategy, symbol, risk))
+                    INSERT INTO settings (user_id, default_strategy, default_symbol, risk_per_trade,
+                                          leverage, api_key, api_secret)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (user_id, strategy, symbol, risk, leverage, api_key, api_secret))
             else:
                 updates = []
                 params = []
@@ -95,6 +498,15 @@ def update_user_settings(user_id: int, strategy: str = None, symbol: str = None,
                 if risk:
                     updates.append("risk_per_trade = ?")
                     params.append(risk)
+                if leverage:
+                    updates.append("leverage = ?")
+                    params.append(leverage)
+                if api_key:
+                    updates.append("api_key = ?")
+                    params.append(api_key)
+                if api_secret:
+                    updates.append("api_secret = ?")
+                    params.append(api_secret)
                 
                 if updates:
                     params.append(user_id)
@@ -102,6 +514,7 @@ def update_user_settings(user_id: int, strategy: str = None, symbol: str = None,
                         f"UPDATE settings SET {', '.join(updates)} WHERE user_id = ?",
                         params
                     )
+            _settings_cache[user_id] = _load_user_settings(conn, user_id)
 
 # Инициализация базы при первом запуске
 init_db()
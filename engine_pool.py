@@ -0,0 +1,370 @@
+import os
+import zlib
+import asyncio
+import logging
+import threading
+import itertools
+import collections
+import multiprocessing
+import concurrent.futures
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from profiler import merge_reports
+
+logger = logging.getLogger(__name__)
+
+# Методы TradeEngine, которые можно вызвать через пул
+_ENGINE_METHODS = {'start_strategy', 'stop_strategy', 'stop_all', 'get_status', 'screen', 'profile',
+                   'reconfigure', 'update_credentials'}
+
+def _setup_worker_logging(log_queue, level: int):
+    """Записи воркера уходят в очередь, их пишут обработчики родительского процесса"""
+    root = logging.getLogger()
+    root.handlers[:] = [QueueHandler(log_queue)]
+    root.setLevel(level)
+    for name in ('aiohttp', 'asyncio'):
+        logging.getLogger(name).setLevel(max(level, logging.WARNING))
+
+def _worker_main(conn, worker_id: int, log_queue=None, log_level: int = logging.INFO):
+    """Процесс-воркер: общий цикл событий и общие рыночные данные на все движки"""
+    if log_queue is not None:
+        _setup_worker_logging(log_queue, log_level)
+    # Импорт внутри процесса: модули открывают БД и создают объекты при загрузке
+    from trade_engine import STRATEGIES, TradeEngine
+    from trading import BybitAPI
+    from market_stream import MarketStream
+    from resampler import MarketData
+    from orderbook import OrderBooks
+    from screener import Screener
+    from replay import recorder_from_env
+    from profiler import profiler
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name=f'engine-loop-{worker_id}', daemon=True).start()
+    profiler.watch_loop(loop, 'engine-loop')
+
+    stream = MarketStream()
+    # Публичные данные не требуют ключей — один клиент на всех пользователей воркера
+    public_api = BybitAPI(api_key='', api_secret='')
+    public_api.recorder = stream.recorder = recorder_from_env()
+    market_data = MarketData(public_api, stream)
+    order_books = OrderBooks(stream)
+    screener = Screener(public_api, STRATEGIES)
+    loop.call_soon_threadsafe(lambda: loop.create_task(stream.run()))
+
+    engines: Dict[int, TradeEngine] = {}
+    engines_lock = threading.Lock()
+    send_lock = threading.Lock()
+    # Запросы выполняются в потоках: долгий скан или первый запуск движка не
+    # задерживает ответы другим пользователям воркера. Запросы одного
+    # пользователя идут строго по очереди через его очередь в queues
+    handlers = concurrent.futures.ThreadPoolExecutor(max_workers=16, thread_name_prefix=f'engine-worker-{worker_id}')
+    queues: Dict[int, collections.deque] = {}
+
+    def reply(request_id: int, ok: bool, result: Any, user_id: Optional[int]):
+        with send_lock:
+            conn.send((request_id, ok, result, len(engines), user_id in engines))
+
+    def call_engine(user_id: int, method: str, kwargs: Dict[str, Any]) -> Tuple[bool, Any]:
+        engine = engines.get(user_id)
+        if engine is None:
+            if method != 'start_strategy':
+                return True, ("ℹ <b>Стратегия не запущена</b>" if method == 'get_status' else False)
+            credentials = kwargs.pop('credentials', (None, None))
+            if kwargs.get('mode', 'live') == 'live' and not all(credentials):
+                # Ключи из окружения — счёт оператора: пользователь торгует только своими
+                return False, "Для живой торговли нужны API-ключи пользователя"
+            engine = TradeEngine(
+                *credentials, loop=loop, market_data=market_data, order_books=order_books, screener=screener,
+                user_id=user_id, env_credentials=False
+            )
+            with engines_lock:
+                engines[user_id] = engine
+        else:
+            # Ключи, сохранённые после запуска движка, применяются к нему сразу
+            credentials = kwargs.pop('credentials', None)
+            if credentials and any(credentials) and tuple(credentials) != (engine.api_key, engine.api_secret):
+                engine.update_credentials(*credentials)
+        result = getattr(engine, method)(**kwargs)
+        if not engine.runs:
+            with engines_lock:
+                engines.pop(user_id, None)
+        return True, result
+
+    def handle(request_id: int, user_id: Optional[int], method: str, kwargs: Dict[str, Any]):
+        try:
+            if method not in _ENGINE_METHODS:
+                raise ValueError(f"Недопустимый метод {method}")
+            if method == 'profile':
+                # Профилировщик один на процесс: он снимает все движки воркера
+                reply(request_id, True, profiler.control(**kwargs), user_id)
+            elif method == 'screen':
+                # Скан общий для воркера и не требует движка пользователя
+                future = asyncio.run_coroutine_threadsafe(
+                    screener.screen(kwargs.get('strategy_names'), kwargs.get('top')), loop
+                )
+                reply(request_id, True, future.result(timeout=120), user_id)
+            else:
+                reply(request_id, *call_engine(user_id, method, kwargs), user_id)
+        except Exception as e:
+            logger.error(f"Воркер {worker_id}: ошибка {method} для {user_id}: {e}", exc_info=True)
+            reply(request_id, False, str(e), user_id)
+
+    def drain(user_id: int):
+        while True:
+            with engines_lock:
+                queue = queues[user_id]
+                if not queue:
+                    del queues[user_id]
+                    return
+                message = queue.popleft()
+            handle(*message)
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        request_id, user_id, method, kwargs = message
+        if user_id is None or method == 'screen':
+            handlers.submit(handle, *message)
+            continue
+        with engines_lock:
+            queue = queues.get(user_id)
+            if queue is not None:
+                queue.append(message)  # предыдущий запрос пользователя ещё выполняется
+                continue
+            queues[user_id] = collections.deque([message])
+        handlers.submit(drain, user_id)
+
+    handlers.shutdown(wait=True)
+    for engine in list(engines.values()):
+        engine.stop_all()
+
+    async def close_shared():
+        await stream.close()
+        await public_api.close()
+    asyncio.run_coroutine_threadsafe(close_shared(), loop).result(timeout=10)
+
+class _Worker:
+    """Процесс-воркер со стороны бота: ответы сопоставляются с запросами по request_id"""
+
+    def __init__(self, ctx, worker_id: int, log_queue=None,
+                 on_exit: Optional[Callable[['_Worker'], None]] = None):
+        self.worker_id = worker_id
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+            target=_worker_main, args=(child_conn, worker_id, log_queue, logging.getLogger().getEffectiveLevel()),
+            daemon=True
+        )
+        self.process.start()
+        child_conn.close()  # иначе чтение не увидит конец канала, когда воркер упадёт
+        self.lock = threading.Lock()  # запись в канал
+        self.load = 0  # число пользователей с запущенными движками
+        self.users: Set[int] = set()  # чьи движки работают на воркере
+        self._pending: Dict[int, Tuple[concurrent.futures.Future, Optional[int]]] = {}
+        self._pending_lock = threading.Lock()
+        self._on_exit = on_exit
+        self._reader = threading.Thread(target=self._read, name=f'engine-pool-reader-{worker_id}', daemon=True)
+        self._reader.start()
+
+    def submit(self, request_id: int, user_id: Optional[int], method: str,
+               kwargs: Dict[str, Any]) -> concurrent.futures.Future:
+        future = concurrent.futures.Future()
+        with self._pending_lock:
+            self._pending[request_id] = (future, user_id)
+        try:
+            with self.lock:
+                self.conn.send((request_id, user_id, method, kwargs))
+        except (BrokenPipeError, OSError) as e:
+            self.forget(request_id)
+            future.set_exception(RuntimeError(f"Воркер {self.worker_id} недоступен: {e}"))
+        return future
+
+    def forget(self, request_id: int):
+        with self._pending_lock:
+            self._pending.pop(request_id, None)
+
+    def _read(self):
+        while True:
+            try:
+                request_id, ok, result, load, has_engine = self.conn.recv()
+            except (EOFError, OSError):
+                break
+            self.load = load
+            with self._pending_lock:
+                future, user_id = self._pending.pop(request_id, (None, None))
+            if user_id is not None:
+                if has_engine:
+                    self.users.add(user_id)
+                else:
+                    self.users.discard(user_id)
+            if future is not None:  # None — ответ пришёл после таймаута запроса
+                future.set_result((ok, result, has_engine))
+        with self._pending_lock:
+            pending, self._pending = self._pending, {}
+        for future, _ in pending.values():
+            future.set_exception(RuntimeError(f"Воркер {self.worker_id} остановился"))
+        if self._on_exit is not None:
+            self._on_exit(self)
+
+class EnginePool:
+    """Движки пользователей, распределённые по процессам-воркерам.
+
+    Пользователь закрепляется за воркером по хешу user_id. Если этот воркер
+    заметно загруженнее остальных, новый движок уходит на наименее
+    загруженный. Закрепление сохраняется, пока у пользователя есть движок.
+
+    Упавший воркер перезапускается сразу; пользователи, чьи движки на нём
+    работали, передаются в on_engines_lost — их стратегии остановлены.
+    """
+
+    def __init__(self, workers: Optional[int] = None, max_load_skew: float = 1.5,
+                 request_timeout: float = 180.0):
+        self.size = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.max_load_skew = max_load_skew
+        self.request_timeout = request_timeout  # дольше скана рынка в воркере (120 с)
+        self.on_engines_lost: Optional[Callable[[List[int]], None]] = None
+        self._ctx = multiprocessing.get_context('spawn')
+        self._workers: List[_Worker] = []
+        self._placement: Dict[int, int] = {}
+        self._placement_lock = threading.Lock()
+        self._request_ids = itertools.count(1)
+        self._closing = False
+        # Логи воркеров через очередь попадают в обработчики этого процесса (bot.log)
+        self._log_queue = None
+        self._log_listener: Optional[QueueListener] = None
+
+    def start(self):
+        if not self._workers:
+            if self._log_listener is None:
+                self._log_queue = self._ctx.Queue()
+                self._log_listener = QueueListener(
+                    self._log_queue, *logging.getLogger().handlers, respect_handler_level=True
+                )
+                self._log_listener.start()
+            self._closing = False
+            self._workers = [self._spawn(i) for i in range(self.size)]
+            logger.info(f"Запущено воркеров движков: {self.size}")
+
+    def worker_for(self, user_id: int) -> int:
+        """Воркер пользователя: закреплённый, по хешу или наименее загруженный"""
+        with self._placement_lock:
+            if user_id in self._placement:
+                return self._placement[user_id]
+            preferred = zlib.crc32(str(user_id).encode()) % self.size
+            loads = [worker.load for worker in self._workers]
+            least = min(range(self.size), key=loads.__getitem__)
+            if loads[preferred] > loads[least] * self.max_load_skew + 1:
+                preferred = least
+            self._placement[user_id] = preferred
+            return preferred
+
+    def _spawn(self, index: int) -> _Worker:
+        return _Worker(self._ctx, index, self._log_queue, on_exit=self._worker_exited)
+
+    def _worker_exited(self, worker: _Worker):
+        """Поток чтения увидел конец канала: воркер упал (или пул останавливается)"""
+        if not self._closing:
+            self._respawn(worker)
+
+    def _respawn(self, worker: _Worker):
+        index = worker.worker_id
+        with self._placement_lock:
+            if self._closing or index >= len(self._workers) or self._workers[index] is not worker:
+                return  # уже перезапущен другим потоком
+            logger.error(f"Воркер {index} упал, перезапускаем")
+            self._workers[index] = self._spawn(index)
+            self._placement = {u: w for u, w in self._placement.items() if w != index}
+        lost = sorted(worker.users)
+        if lost:
+            logger.error(f"С воркером {index} остановлены движки пользователей: {lost}")
+            if self.on_engines_lost is not None:
+                try:
+                    self.on_engines_lost(lost)
+                except Exception as e:
+                    logger.error(f"Не удалось сообщить об остановленных движках: {e}")
+
+    def _request(self, index: int, user_id: Optional[int], method: str, kwargs: Dict[str, Any]):
+        worker = self._workers[index]
+        if not worker.process.is_alive():
+            self._respawn(worker)
+            worker = self._workers[index]
+        request_id = next(self._request_ids)
+        future = worker.submit(request_id, user_id, method, kwargs)
+        try:
+            return future.result(timeout=self.request_timeout)
+        except concurrent.futures.TimeoutError:
+            worker.forget(request_id)
+            raise RuntimeError(f"Воркер {index} не ответил на {method} за {self.request_timeout:.0f} с")
+
+    def _call(self, user_id: int, method: str, **kwargs) -> Any:
+        self.start()
+        index = self.worker_for(user_id)
+        ok, result, has_engine = self._request(index, user_id, method, kwargs)
+        with self._placement_lock:
+            if has_engine:
+                # Закрепление могло сброситься, если воркер перезапускался во время запроса
+                self._placement[user_id] = index
+            else:
+                # Без движка пользователь не привязан к воркеру и при следующем запуске размещается заново
+                self._placement.pop(user_id, None)
+        if not ok:
+            raise RuntimeError(result)
+        return result
+
+    def start_strategy(self, user_id: int, credentials: Tuple[Optional[str], Optional[str]] = (None, None),
+                       **params) -> bool:
+        return self._call(user_id, 'start_strategy', credentials=credentials, **params)
+
+    def stop_strategy(self, user_id: int, run_id: str = 'live') -> bool:
+        return self._call(user_id, 'stop_strategy', run_id=run_id)
+
+    def reconfigure(self, user_id: int, run_id: str = 'live', params: Optional[Dict[str, Any]] = None) -> bool:
+        """Параметры передаются одним словарём: их имена задаёт пользователь"""
+        return self._call(user_id, 'reconfigure', run_id=run_id, params=params or {})
+
+    def update_credentials(self, user_id: int, credentials: Tuple[Optional[str], Optional[str]]) -> bool:
+        """Новые ключи для запущенного движка; False — движка нет, ключи возьмёт следующий /run"""
+        return self._call(user_id, 'update_credentials', api_key=credentials[0], api_secret=credentials[1])
+
+    def stop_all(self, user_id: int):
+        return self._call(user_id, 'stop_all')
+
+    def get_status(self, user_id: int) -> str:
+        return self._call(user_id, 'get_status')
+
+    def screen(self, user_id: int, strategy_name: Optional[str] = None, top: Optional[int] = 10):
+        """Кандидаты скринера с воркера пользователя"""
+        names = [strategy_name] if strategy_name else None
+        return self._call(user_id, 'screen', strategy_names=names, top=top)
+
+    def profile(self, action: str = 'report', duration: Optional[float] = 300.0) -> Dict[str, Any]:
+        """Профилировщик всех воркеров: 'start', 'stop' или 'report'; отчёты сводятся в один"""
+        reports = {}
+        for index in range(len(self._workers)):
+            ok, result, _ = self._request(index, None, 'profile', {'action': action, 'duration': duration})
+            if not ok:
+                raise RuntimeError(result)
+            reports[f"worker-{index}"] = result
+        return merge_reports(reports)
+
+    def loads(self) -> List[int]:
+        return [worker.load for worker in self._workers]
+
+    def shutdown(self):
+        self._closing = True
+        for worker in self._workers:
+            try:
+                with worker.lock:
+                    worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for worker in self._workers:
+            worker.process.join(timeout=10)
+        self._workers = []
+        if self._log_listener is not None:
+            self._log_listener.stop()
+            self._log_listener = None
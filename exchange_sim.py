@@ -0,0 +1,514 @@
+"""Локальный симулятор Bybit для нагрузочного и интеграционного тестирования.
+
+Реализует REST-эндпоинты, которыми пользуется BybitAPI, и публичный
+WebSocket (kline.1, orderbook.50). Цена берётся из проигрываемого ряда
+минутных свечей. Бот направляется на симулятор переменными окружения:
+
+    BYBIT_BASE_URL=http://127.0.0.1:8099
+    BYBIT_WS_URL=ws://127.0.0.1:8099/v5/public/linear
+
+Запуск: python exchange_sim.py --candles btc_1m.csv --speed 60
+"""
+import csv
+import hmac
+import json
+import time
+import zlib
+import random
+import asyncio
+import hashlib
+import logging
+import argparse
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Tuple
+import numpy as np
+from aiohttp import web, WSMsgType
+from trading import KLINE_INTERVALS
+
+logger = logging.getLogger(__name__)
+
+# Значения interval в API -> длительность в минутах
+_INTERVAL_MINUTES = {
+    code: (1440 if code == 'D' else int(code)) for code in KLINE_INTERVALS.values()
+}
+
+@dataclass
+class SimConfig:
+    api_key: str = 'sim-key'
+    api_secret: str = 'sim-secret'
+    symbols: List[str] = field(default_factory=lambda: ['BTCUSDT'])
+    initial_balance: float = 10_000.0
+    speed: float = 60.0              # минут истории за минуту реального времени
+    tick_interval: float = 1.0       # период рассылки обновлений в WebSocket, сек
+    latency: float = 0.0             # базовая задержка ответа, сек
+    latency_jitter: float = 0.0
+    error_rate: float = 0.0          # доля запросов, на которые отвечаем 503
+    reject_rate: float = 0.0         # доля запросов с retCode != 0
+    rate_limit: float = 0.0          # запросов в секунду на ключ, 0 — без ограничения
+    fee_rate: float = 0.00055
+    recv_window: int = 5000
+    seed: Optional[int] = None
+
+class PriceReplay:
+    """Проигрываемый ряд минутных свечей на ускоренных часах"""
+
+    def __init__(self, candles: np.ndarray, speed: float, clock=time.time):
+        self.candles = candles  # (N x 6): timestamp, open, high, low, close, volume
+        self.speed = speed
+        self.clock = clock
+        self.started_at = clock()
+
+    @classmethod
+    def from_csv(cls, path: str, speed: float) -> 'PriceReplay':
+        with open(path, newline='') as f:
+            rows = [row[:6] for row in csv.reader(f) if row and row[0][0].isdigit()]
+        return cls(np.asarray(rows, dtype=np.float64), speed)
+
+    @classmethod
+    def random_walk(cls, minutes: int, speed: float, price: float = 30_000.0,
+                    seed: Optional[int] = None) -> 'PriceReplay':
+        rng = np.random.default_rng(seed)
+        start = (int(time.time()) // 60 - minutes // 2) * 60_000
+        close = price * np.exp(np.cumsum(rng.normal(0, 0.001, minutes)))
+        open_ = np.concatenate(([price], close[:-1]))
+        spread = np.abs(rng.normal(0, 0.0008, minutes)) * close
+        candles = np.column_stack([
+            start + np.arange(minutes) * 60_000,
+            open_, np.maximum(open_, close) + spread, np.minimum(open_, close) - spread,
+            close, rng.gamma(2.0, 50.0, minutes)
+        ])
+        return cls(candles, speed)
+
+    def position(self) -> float:
+        """Текущая позиция в ряду в минутах (дробная часть — прогресс свечи)"""
+        elapsed = (self.clock() - self.started_at) * self.speed / 60
+        # Начинаем с середины ряда, чтобы стратегиям хватило истории
+        return min(len(self.candles) // 2 + elapsed, len(self.candles) - 1e-9)
+
+    def current(self) -> List[float]:
+        """Формирующаяся минутная свеча, открытая пропорционально прогрессу"""
+        pos = self.position()
+        i = int(pos)
+        ts, o, _, _, c, v = self.candles[i]
+        progress = pos - i
+        price = o + (c - o) * progress
+        return [ts, o, max(o, price), min(o, price), price, v * progress]
+
+    def price(self) -> float:
+        return self.current()[4]
+
+    def klines(self, minutes: int, limit: int) -> List[List[float]]:
+        """Свечи таймфрейма от старых к новым, последняя — незакрытая"""
+        i = int(self.position())
+        rows = np.vstack([self.candles[:i], [self.current()]])
+        period = minutes * 60_000
+        buckets = rows[:, 0] - rows[:, 0] % period
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])[-limit:]
+        bounds = np.r_[starts, len(rows)]
+        return [
+            [buckets[a], rows[a, 1], rows[a:b, 2].max(), rows[a:b, 3].min(), rows[b - 1, 4], rows[a:b, 5].sum()]
+            for a, b in zip(bounds[:-1], bounds[1:])
+        ]
+
+class SimExchange:
+    """Состояние симулированной биржи: баланс, позиции, заявки"""
+
+    def __init__(self, config: SimConfig, replays: Dict[str, PriceReplay]):
+        self.config = config
+        self.replays = replays
+        self.balance = config.initial_balance
+        self.leverage: Dict[str, int] = {}
+        self.positions: Dict[str, Dict[str, Any]] = {}
+        self.orders: List[Dict[str, Any]] = []
+        self.rng = random.Random(config.seed)
+        self._tokens: Dict[str, float] = {}
+        self._token_time: Dict[str, float] = {}
+        self._order_seq = 0
+        self.stats = {'requests': 0, 'rejected': 0, 'errors': 0, 'rate_limited': 0, 'fills': 0}
+
+    # --- Проверки запроса ---
+
+    def verify_signature(self, params: Dict[str, str]) -> bool:
+        sign = params.get('sign')
+        if not sign or params.get('api_key') != self.config.api_key:
+            return False
+        payload = '&'.join(f"{k}={v}" for k, v in sorted(params.items()) if k != 'sign')
+        expected = hmac.new(
+            self.config.api_secret.encode('utf-8'), payload.encode('utf-8'), hashlib.sha256
+        ).hexdigest()
+        if not hmac.compare_digest(sign, expected):
+            return False
+        return abs(time.time() * 1000 - int(params.get('timestamp', 0))) <= self.config.recv_window
+
+    def take_token(self, key: str) -> bool:
+        """Token bucket на ключ: rate_limit запросов в секунду"""
+        rate = self.config.rate_limit
+        if rate <= 0:
+            return True
+        now = time.monotonic()
+        tokens = min(rate, self._tokens.get(key, rate) + (now - self._token_time.get(key, now)) * rate)
+        self._token_time[key] = now
+        if tokens < 1:
+            self._tokens[key] = tokens
+            return False
+        self._tokens[key] = tokens - 1
+        return True
+
+    # --- Торговля ---
+
+    def place_order(self, params: Dict[str, str]) -> Dict[str, Any]:
+        symbol = params['symbol']
+        if symbol not in self.replays:
+            raise KeyError(f"Unknown symbol {symbol}")
+        self._order_seq += 1
+        order = {
+            'order_id': f"sim-{self._order_seq}",
+            'symbol': symbol,
+            'side': params['side'].capitalize(),
+            'order_type': params.get('order_type', 'Market'),
+            'qty': float(params['qty']),
+            'price': float(params['price']) if 'price' in params else None,
+            'take_profit': float(params['take_profit']) if 'take_profit' in params else None,
+            'stop_loss': float(params['stop_loss']) if 'stop_loss' in params else None,
+            'reduce_only': params.get('reduce_only') == 'true',
+            'order_status': 'New',
+        }
+        if order['order_type'] == 'Market':
+            self._fill(order, self.replays[symbol].price())
+        else:
+            self.orders.append(order)
+        return order
+
+    def cancel_orders(self, symbol: str) -> List[str]:
+        cancelled = [order for order in self.orders if order['symbol'] == symbol]
+        for order in cancelled:
+            order['order_status'] = 'Cancelled'
+            self.orders.remove(order)
+        return [order['order_id'] for order in cancelled]
+
+    def match(self):
+        """Исполняет лимитные заявки и TP/SL по текущей свече"""
+        for order in list(self.orders):
+            _, _, high, low, _, _ = self.replays[order['symbol']].current()
+            if order['side'] == 'Buy' and low <= order['price']:
+                self.orders.remove(order)
+                self._fill(order, order['price'])
+            elif order['side'] == 'Sell' and high >= order['price']:
+                self.orders.remove(order)
+                self._fill(order, order['price'])
+
+        for symbol, pos in list(self.positions.items()):
+            _, _, high, low, _, _ = self.replays[symbol].current()
+            long = pos['side'] == 'Buy'
+            tp, sl = pos.get('take_profit'), pos.get('stop_loss')
+            if sl and ((long and low <= sl) or (not long and high >= sl)):
+                self._close(symbol, sl)
+            elif tp and ((long and high >= tp) or (not long and low <= tp)):
+                self._close(symbol, tp)
+
+    def _fill(self, order: Dict[str, Any], price: float):
+        pos = self.positions.get(order['symbol'])
+        if order['reduce_only'] and (pos is None or pos['side'] == order['side']):
+            order['order_status'] = 'Cancelled'
+            return
+        self.stats['fills'] += 1
+        order['order_status'] = 'Filled'
+        order['avg_price'] = price
+        self.balance -= order['qty'] * price * self.config.fee_rate
+        if pos is None:
+            self.positions[order['symbol']] = {
+                'side': order['side'], 'size': order['qty'], 'entry_price': price,
+                'take_profit': order['take_profit'], 'stop_loss': order['stop_loss'],
+            }
+        elif pos['side'] == order['side']:
+            total = pos['size'] + order['qty']
+            pos['entry_price'] = (pos['entry_price'] * pos['size'] + price * order['qty']) / total
+            pos['size'] = total
+        else:
+            closed = min(pos['size'], order['qty'])
+            self._realize(pos, closed, price)
+            pos['size'] -= closed
+            rest = order['qty'] - closed
+            if pos['size'] <= 1e-12:
+                del self.positions[order['symbol']]
+                if rest > 1e-12 and not order['reduce_only']:
+                    self.positions[order['symbol']] = {
+                        'side': order['side'], 'size': rest, 'entry_price': price,
+                        'take_profit': order['take_profit'], 'stop_loss': order['stop_loss'],
+                    }
+
+    def _close(self, symbol: str, price: float):
+        pos = self.positions.pop(symbol)
+        self.balance -= pos['size'] * price * self.config.fee_rate
+        self._realize(pos, pos['size'], price)
+
+    def _realize(self, pos: Dict[str, Any], qty: float, price: float):
+        direction = 1 if pos['side'] == 'Buy' else -1
+        self.balance += (price - pos['entry_price']) * qty * direction
+
+class ExchangeSimulator:
+    """aiohttp-приложение, изображающее Bybit"""
+
+    def __init__(self, config: SimConfig, replays: Optional[Dict[str, PriceReplay]] = None):
+        self.config = config
+        # Сид зависит от пары: иначе при заданном --seed все пары ходят одинаково
+        replays = replays or {
+            symbol: PriceReplay.random_walk(
+                20_000, config.speed,
+                seed=None if config.seed is None else config.seed ^ zlib.crc32(symbol.encode('utf-8'))
+            )
+            for symbol in config.symbols
+        }
+        self.exchange = SimExchange(config, replays)
+        self._sockets: Dict[web.WebSocketResponse, Set[str]] = {}
+        self._book_seq: Dict[Tuple[Any, str], int] = {}
+        self.runner: Optional[web.AppRunner] = None
+        self.app = web.Application(middlewares=[self._middleware])
+        self.app.router.add_get('/v5/account/wallet-balance', self.wallet_balance)
+        self.app.router.add_get('/v5/market/kline', self.kline)
+        self.app.router.add_get('/v5/market/instruments-info', self.instruments_info)
+        self.app.router.add_get('/v5/position/list', self.position_list)
+        self.app.router.add_post('/private/linear/order/create', self.order_create)
+        self.app.router.add_post('/private/linear/order/cancel-all', self.order_cancel_all)
+        self.app.router.add_post('/private/linear/position/set-leverage', self.set_leverage)
+        self.app.router.add_get('/v5/public/linear', self.public_ws)
+        self.app.on_startup.append(self._start_ticker)
+        self.app.on_cleanup.append(self._stop_ticker)
+
+    # --- REST ---
+
+    @staticmethod
+    def _ok(result: Any) -> web.Response:
+        return web.json_response({'retCode': 0, 'retMsg': 'OK', 'result': result, 'time': int(time.time() * 1000)})
+
+    @staticmethod
+    def _fail(code: int, msg: str) -> web.Response:
+        return web.json_response({'retCode': code, 'retMsg': msg, 'result': {}, 'time': int(time.time() * 1000)})
+
+    @web.middleware
+    async def _middleware(self, request: web.Request, handler):
+        if request.path == '/v5/public/linear':
+            return await handler(request)
+        ex, cfg = self.exchange, self.config
+        ex.stats['requests'] += 1
+        if cfg.latency or cfg.latency_jitter:
+            await asyncio.sleep(cfg.latency + ex.rng.random() * cfg.latency_jitter)
+        if ex.rng.random() < cfg.error_rate:
+            ex.stats['errors'] += 1
+            return web.Response(status=503, text='Service Unavailable (injected)')
+        if ex.rng.random() < cfg.reject_rate:
+            ex.stats['rejected'] += 1
+            return self._fail(10016, 'Internal error (injected)')
+
+        params = dict(request.query)
+        if request.path.startswith(('/private', '/v5/account', '/v5/order', '/v5/position')):
+            if not ex.verify_signature(params):
+                ex.stats['rejected'] += 1
+                return self._fail(10004, 'Error sign, please check your signature generation algorithm.')
+        if not ex.take_token(params.get('api_key', request.remote or '')):
+            ex.stats['rate_limited'] += 1
+            return self._fail(10006, 'Too many visits!')
+        ex.match()
+        return await handler(request)
+
+    async def wallet_balance(self, request: web.Request) -> web.Response:
+        ex = self.exchange
+        margin = sum(
+            pos['size'] * pos['entry_price'] / ex.leverage.get(symbol, 5)
+            for symbol, pos in ex.positions.items()
+        )
+        available = max(0.0, ex.balance - margin)
+        return self._ok({'list': [{
+            'accountType': 'UNIFIED',
+            'totalEquity': str(ex.balance),
+            'coin': [{
+                'coin': 'USDT',
+                'walletBalance': str(ex.balance),
+                'availableToWithdraw': str(available),
+            }],
+        }]})
+
+    async def kline(self, request: web.Request) -> web.Response:
+        symbol = request.query.get('symbol')
+        interval = request.query.get('interval', '1')
+        if symbol not in self.exchange.replays or interval not in _INTERVAL_MINUTES:
+            return self._fail(10001, 'params error')
+        limit = min(int(request.query.get('limit', 200)), 1000)
+        rows = self.exchange.replays[symbol].klines(_INTERVAL_MINUTES[interval], limit)
+        # Как на бирже: от новых к старым, строки, последним столбцом turnover
+        data = [[str(int(r[0]))] + [str(x) for x in r[1:]] + [str(r[4] * r[5])] for r in reversed(rows)]
+        return self._ok({'category': 'linear', 'symbol': symbol, 'list': data})
+
+    async def position_list(self, request: web.Request) -> web.Response:
+        ex = self.exchange
+        symbol = request.query.get('symbol')
+        data = []
+        for sym, pos in ex.positions.items():
+            if symbol and sym != symbol:
+                continue
+            direction = 1 if pos['side'] == 'Buy' else -1
+            pnl = (ex.replays[sym].price() - pos['entry_price']) * pos['size'] * direction
+            data.append({
+                'symbol': sym, 'side': pos['side'], 'size': str(pos['size']),
+                'avgPrice': str(pos['entry_price']), 'leverage': str(ex.leverage.get(sym, 5)),
+                'unrealisedPnl': str(pnl),
+                'takeProfit': str(pos['take_profit'] or ''), 'stopLoss': str(pos['stop_loss'] or ''),
+            })
+        return self._ok({'category': 'linear', 'list': data, 'nextPageCursor': ''})
+
+    async def instruments_info(self, request: web.Request) -> web.Response:
+        data = [
+            {'symbol': symbol, 'contractType': 'LinearPerpetual', 'status': 'Trading',
+             'baseCoin': symbol[:-4], 'quoteCoin': 'USDT'}
+            for symbol in self.exchange.replays
+        ]
+        return self._ok({'category': 'linear', 'list': data, 'nextPageCursor': ''})
+
+    async def order_create(self, request: web.Request) -> web.Response:
+        try:
+            order = self.exchange.place_order(dict(request.query))
+        except (KeyError, ValueError) as e:
+            return self._fail(10001, f'params error: {e}')
+        return self._ok(order)
+
+    async def order_cancel_all(self, request: web.Request) -> web.Response:
+        return self._ok(self.exchange.cancel_orders(request.query.get('symbol', '')))
+
+    async def set_leverage(self, request: web.Request) -> web.Response:
+        symbol = request.query.get('symbol')
+        self.exchange.leverage[symbol] = int(float(request.query.get('buy_leverage', 5)))
+        return self._ok({})
+
+    # --- WebSocket ---
+
+    async def public_ws(self, request: web.Request) -> web.WebSocketResponse:
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        topics: Set[str] = set()
+        self._sockets[ws] = topics
+        try:
+            async for msg in ws:
+                if msg.type != WSMsgType.TEXT:
+                    continue
+                payload = json.loads(msg.data)
+                op = payload.get('op')
+                if op == 'ping':
+                    await ws.send_json({'success': True, 'ret_msg': 'pong', 'op': 'ping'})
+                elif op in ('subscribe', 'unsubscribe'):
+                    args = payload.get('args', [])
+                    if op == 'subscribe':
+                        topics.update(args)
+                        for topic in args:
+                            if topic.startswith('orderbook.'):
+                                await ws.send_json(self._book_message(ws, topic, 'snapshot'))
+                    else:
+                        topics.difference_update(args)
+                    await ws.send_json({'success': True, 'ret_msg': '', 'op': op})
+        finally:
+            self._sockets.pop(ws, None)
+            for topic in topics:
+                self._book_seq.pop((ws, topic), None)
+        return ws
+
+    def _kline_message(self, topic: str) -> Optional[Dict[str, Any]]:
+        symbol = topic.rsplit('.', 1)[-1]
+        replay = self.exchange.replays.get(symbol)
+        if replay is None:
+            return None
+        ts, o, h, l, c, v = replay.current()
+        previous = replay.candles[int(replay.position()) - 1]
+        now = int(time.time() * 1000)
+        def item(row, confirm):
+            return {
+                'start': int(row[0]), 'end': int(row[0]) + 59_999, 'interval': '1',
+                'open': str(row[1]), 'high': str(row[2]), 'low': str(row[3]), 'close': str(row[4]),
+                'volume': str(row[5]), 'turnover': str(row[4] * row[5]),
+                'confirm': confirm, 'timestamp': now,
+            }
+        return {'topic': topic, 'type': 'snapshot', 'ts': now,
+                'data': [item(previous, True), item([ts, o, h, l, c, v], False)]}
+
+    def _book_message(self, ws, topic: str, kind: str) -> Dict[str, Any]:
+        """Синтетический стакан вокруг текущей цены; нумерация дельт — своя у каждого соединения"""
+        _, depth, symbol = topic.split('.')
+        replay = self.exchange.replays[symbol]
+        price = replay.price()
+        tick = max(round(price * 0.0001, 8), 1e-8)
+        rng = self.exchange.rng
+        levels = int(depth) if kind == 'snapshot' else 5
+        bids = [[f"{price - tick * (i + 1):.8f}", f"{rng.uniform(0.01, 5):.4f}"] for i in range(levels)]
+        asks = [[f"{price + tick * (i + 1):.8f}", f"{rng.uniform(0.01, 5):.4f}"] for i in range(levels)]
+        key = (ws, topic)
+        if kind == 'snapshot':
+            self._book_seq[key] = 1
+        else:
+            self._book_seq[key] = self._book_seq.get(key, 0) + 1
+        seq = self._book_seq[key]
+        return {'topic': topic, 'type': kind, 'ts': int(time.time() * 1000),
+                'data': {'s': symbol, 'b': bids, 'a': asks, 'u': seq, 'seq': seq},
+                'cts': int(time.time() * 1000)}
+
+    async def _tick(self):
+        while True:
+            await asyncio.sleep(self.config.tick_interval)
+            self.exchange.match()
+            for ws, topics in list(self._sockets.items()):
+                for topic in list(topics):
+                    if topic.startswith('kline.'):
+                        message = self._kline_message(topic)
+                    elif topic.startswith('orderbook.'):
+                        message = self._book_message(ws, topic, 'delta')
+                    else:
+                        continue
+                    if message is not None and not ws.closed:
+                        await ws.send_json(message)
+
+    async def _start_ticker(self, app: web.Application):
+        app['ticker'] = asyncio.create_task(self._tick())
+
+    async def _stop_ticker(self, app: web.Application):
+        app['ticker'].cancel()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+async def start_simulator(config: SimConfig, host: str = '127.0.0.1', port: int = 8099,
+                          replays: Optional[Dict[str, PriceReplay]] = None) -> ExchangeSimulator:
+    """Запускает симулятор в текущем цикле событий (для тестов и бенчмарков)"""
+    simulator = ExchangeSimulator(config, replays)
+    simulator.runner = web.AppRunner(simulator.app)
+    await simulator.runner.setup()
+    await web.TCPSite(simulator.runner, host, port).start()
+    logger.info(f"Симулятор Bybit слушает http://{host}:{port}")
+    return simulator
+
+def main():
+    parser = argparse.ArgumentParser(description='Локальный симулятор Bybit')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--symbols', default='BTCUSDT', help='через запятую')
+    parser.add_argument('--candles', help='CSV минутных свечей: timestamp,open,high,low,close,volume')
+    parser.add_argument('--speed', type=float, default=60.0)
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--latency-jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--reject-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--balance', type=float, default=10_000.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    config = SimConfig(
+        symbols=args.symbols.split(','), initial_balance=args.balance, speed=args.speed,
+        latency=args.latency, latency_jitter=args.latency_jitter, error_rate=args.error_rate,
+        reject_rate=args.reject_rate, rate_limit=args.rate_limit, seed=args.seed
+    )
+    replays = None
+    if args.candles:
+        replays = {symbol: PriceReplay.from_csv(args.candles, args.speed) for symbol in config.symbols}
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    web.run_app(ExchangeSimulator(config, replays).app, host=args.host, port=args.port)
+
+if __name__ == '__main__':
+    main()
@@ -1,15 +1,26 @@
 import os
+import gzip
+import html
+import shutil
+import asyncio
 import logging
 from logging.handlers import RotatingFileHandler
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 from telegram import Update, ReplyKeyboardMarkup
 from telegram.ext import (
     ApplicationBuilder, CommandHandler, MessageHandler,
     filters, ContextTypes, ConversationHandler, CallbackContext, TypeHandler
 )
 from dotenv import load_dotenv
-from trade_engine import TradeEngine
-from db import get_user_settings, update_user_settings, get_open_trades, get_trade_history
+# .env читается до импорта модулей проекта: db шифрует ключи API ещё при загрузке
+load_dotenv()
+from engine_pool import EnginePool
+from profiler import collapsed, format_report
+from datetime import datetime
+from db import (
+    get_user_settings, get_user_config, update_user_settings, get_open_trades, get_trade_history,
+    get_trade_stats, get_strategy_stats, TRADE_COLUMNS, ALL
+)
 
 import subprocess
 
@@ -20,23 +31,29 @@ def test_connection():
     except Exception as e:
         print("CURL Error:", e)
 
-# Вызовем тест перед запуском бота
-test_connection()
-
 
 # Настройка логирования
+def _gzip_rotator(source: str, dest: str):
+    """Ротированный лог сжимается: bot.log.1.gz, bot.log.2.gz, ..."""
+    with open(source, 'rb') as src, gzip.open(dest, 'wb') as dst:
+        shutil.copyfileobj(src, dst)
+    os.remove(source)
+
 def setup_logging():
     log_format = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    file_handler = RotatingFileHandler(
+        'bot.log',
+        maxBytes=5*1024*1024,
+        backupCount=3,
+        encoding='utf-8'
+    )
+    file_handler.namer = lambda name: f"{name}.gz"
+    file_handler.rotator = _gzip_rotator
     logging.basicConfig(
         level=logging.INFO,
         format=log_format,
         handlers=[
-            RotatingFileHandler(
-                'bot.log',
-                maxBytes=5*1024*1024,
-                backupCount=3,
-                encoding='utf-8'
-            ),
+            file_handler,
             logging.StreamHandler()
         ]
     )
@@ -44,28 +61,30 @@ def setup_logging():
     logging.getLogger('aiohttp').setLevel(logging.WARNING)
     logging.getLogger('asyncio').setLevel(logging.WARNING)
 
-# Инициализация
-load_dotenv()
-setup_logging()
+# Инициализация. Воркеры EnginePool (spawn) заново импортируют этот модуль,
+# поэтому всё, что имеет побочные эффекты, выполняется только в run_bot()
 logger = logging.getLogger(__name__)
 
-# Проверка переменных окружения
-required_env_vars = ['TELEGRAM_API_KEY', 'WEBHOOK_URL', 'WEBHOOK_SECRET']
-for var in required_env_vars:
-    if not os.getenv(var):
-        logger.critical(f"Missing environment variable: {var}")
-        raise ValueError(f"Необходимо установить переменную окружения {var}")
+def check_environment():
+    """Проверка переменных окружения"""
+    required_env_vars = ['TELEGRAM_API_KEY', 'WEBHOOK_URL', 'WEBHOOK_SECRET']
+    for var in required_env_vars:
+        if not os.getenv(var):
+            logger.critical(f"Missing environment variable: {var}")
+            raise ValueError(f"Необходимо установить переменную окружения {var}")
 
 TELEGRAM_API_KEY = os.getenv('TELEGRAM_API_KEY')
 WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')
 PORT = int(os.getenv('PORT', '5000'))
+# Telegram id администраторов через запятую: им доступны служебные команды (/profile)
+ADMIN_IDS = {int(user_id) for user_id in os.getenv('ADMIN_IDS', '').split(',') if user_id.strip()}
 
 # Состояния диалога
 CHOOSE_STRATEGY, CHOOSE_SYMBOL, SET_RISK, SET_LEVERAGE, CONFIRM_RUN = range(5)
 
-# Глобальные объекты
-trade_engine = TradeEngine()
+# Глобальные объекты: движки пользователей распределены по процессам-воркерам (создаётся в run_bot)
+engine_pool: Optional[EnginePool] = None
 user_sessions: Dict[int, Dict[str, Any]] = {}
 
 # Клавиатуры
@@ -91,13 +110,224 @@ async def start(update: Update, context: CallbackContext):
     except Exception as e:
         logger.error(f"Error in start: {e}", exc_info=True)
 
+async def run_strategy(update: Update, context: CallbackContext):
+    """Запуск стратегии с сохранёнными настройками: /run [SYMBOL|AUTO]"""
+    try:
+        user_id = update.effective_user.id
+        config = get_user_config(user_id)
+        if not (config['api_key'] and config['api_secret']):
+            # Без своих ключей торговать нечем: ключи окружения принадлежат оператору бота
+            await update.message.reply_text(
+                "🔑 Для живой торговли сохраните ключи API: /keys <api_key> <api_secret>",
+                reply_markup=main_menu_keyboard()
+            )
+            return
+        symbol = context.args[0].upper() if context.args else config['default_symbol']
+        user_sessions[user_id] = {'symbol': symbol, 'strategy': config['default_strategy']}
+        started = await asyncio.to_thread(
+            engine_pool.start_strategy, user_id,
+            credentials=(config['api_key'], config['api_secret']),
+            symbol=symbol,
+            strategy_name=config['default_strategy'],
+            risk=config['risk_per_trade'],
+            leverage=config['leverage']
+        )
+        text = f"✅ Стратегия запущена для {symbol}" if started else "⚠ Стратегия не запущена"
+        await update.message.reply_text(text, reply_markup=main_menu_keyboard())
+    except Exception as e:
+        logger.error(f"Error in run_strategy: {e}", exc_info=True)
+
+async def tune_strategy(update: Update, context: CallbackContext):
+    """Перенастройка работающей стратегии без перезапуска: /tune risk=0.02 leverage=3 symbol=ETHUSDT"""
+    try:
+        params = dict(arg.split('=', 1) for arg in context.args or [] if '=' in arg)
+        if not params:
+            await update.message.reply_text(
+                "Использование: /tune параметр=значение ...\n"
+                "Например: risk=0.02 leverage=3 symbol=ETHUSDT exit_check_interval=60 rsi_period=10"
+            )
+            return
+        run_id = params.pop('run', 'live')
+        if 'strategy' in params:
+            # strategy=1 — «Стратегия 1»: в аргументах команды нет пробелов
+            name = params.pop('strategy')
+            params['strategy_name'] = f"Стратегия {name}" if name.isdigit() else name
+        if params.get('exit_check_interval') == 'off':
+            params['exit_check_interval'] = None
+        user_id = update.effective_user.id
+        try:
+            applied = await asyncio.to_thread(engine_pool.reconfigure, user_id, run_id, params)
+        except RuntimeError as e:
+            await update.message.reply_text(f"⚠ Параметры не применены: {e}")
+            return
+        if applied and run_id == 'live' and 'symbol' in params:
+            user_sessions.setdefault(user_id, {})['symbol'] = params['symbol'].upper()
+        text = "🔧 Параметры применены" if applied else "⚠ Стратегия не запущена (см. /status)"
+        await update.message.reply_text(text)
+    except Exception as e:
+        logger.error(f"Error in tune_strategy: {e}", exc_info=True)
+
+async def stop_trading(update: Update, context: CallbackContext):
+    try:
+        user_id = update.effective_user.id
+        await asyncio.to_thread(engine_pool.stop_all, user_id)
+        user_sessions.pop(user_id, None)
+        await update.message.reply_text("🛑 Торговля остановлена", reply_markup=main_menu_keyboard())
+    except Exception as e:
+        logger.error(f"Error in stop_trading: {e}", exc_info=True)
+
+async def show_status(update: Update, context: CallbackContext):
+    try:
+        status = await asyncio.to_thread(engine_pool.get_status, update.effective_user.id)
+        await update.message.reply_text(status, parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error in show_status: {e}", exc_info=True)
+
+async def screen_market(update: Update, context: CallbackContext):
+    """Лучшие сигналы входа по всем USDT-контрактам: /screen [N]"""
+    try:
+        top = int(context.args[0]) if context.args else 10
+        candidates = await asyncio.to_thread(engine_pool.screen, update.effective_user.id, None, top)
+        if not candidates:
+            await update.message.reply_text("🔎 Сигналов входа сейчас нет")
+            return
+        lines = [
+            f"<code>{c.symbol}</code> {'🟢' if c.side == 'buy' else '🔴'} {c.strategy}, объём x{c.score:.2f}"
+            for c in candidates
+        ]
+        await update.message.reply_text("🔎 <b>Кандидаты</b>:\n" + "\n".join(lines), parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error in screen_market: {e}", exc_info=True)
+
+def format_stats(title: str, stats) -> str:
+    if not stats:
+        return f"<b>{title}</b>: сделок нет"
+    return (
+        f"<b>{title}</b>: {stats['trades']} сделок, винрейт {stats['win_rate']*100:.1f}%\n"
+        f"   PnL: <code>{stats['net_pnl']:+.2f}</code> (до комиссий <code>{stats['gross_pnl']:+.2f}</code>), "
+        f"макс. просадка <code>{stats['max_drawdown']:.2f}</code>, "
+        f"среднее удержание {stats['avg_hold_seconds'] / 60:.0f} мин"
+    )
+
+async def show_stats(update: Update, context: CallbackContext):
+    """Статистика из сводных таблиц: /stats [paper] [запуск, например paper-2]"""
+    try:
+        user_id = update.effective_user.id
+        args = context.args or []
+        run_id = next((arg for arg in args if arg != 'paper'), ALL)
+        mode = 'paper' if 'paper' in args or run_id.startswith('paper-') else 'live'
+        today = datetime.utcnow().date().isoformat()
+        lines = [
+            format_stats("Всего", get_trade_stats(user_id, mode=mode, run_id=run_id)),
+            format_stats("Сегодня", get_trade_stats(user_id, day=today, mode=mode, run_id=run_id)),
+        ]
+        lines += [format_stats(name, stats) for name, stats in get_strategy_stats(user_id, mode, run_id).items()]
+        title = f"📊 <b>{html.escape(run_id)}</b>\n" if run_id != ALL else "📊 "
+        await update.message.reply_text(title + "\n".join(lines), parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error in show_stats: {e}", exc_info=True)
+
+def format_trade(trade) -> str:
+    t = dict(zip(TRADE_COLUMNS, trade))
+    icon = '🟢' if t['side'] == 'buy' else '🔴'
+    if t['status'] == 'open':
+        result = "открыта"
+    else:
+        result = f"{t['exit_price']:.4f}, PnL <code>{t['profit']:+.2f}</code>" if t['profit'] is not None \
+            else f"{t['exit_price']:.4f}"
+    return (
+        f"{t['entry_time'][:16].replace('T', ' ')} {icon} <code>{t['symbol']}</code> "
+        f"{t['volume']:g} @ {t['entry_price']:.4f} → {result}"
+    )
+
+async def show_history(update: Update, context: CallbackContext):
+    """Последние сделки, включая архивные: /history [N] [paper]"""
+    try:
+        args = context.args or []
+        mode = 'paper' if 'paper' in args else 'live'
+        limit = next((int(arg) for arg in args if arg.isdigit()), 10)
+        trades = await asyncio.to_thread(get_trade_history, update.effective_user.id, min(limit, 50), mode)
+        if not trades:
+            await update.message.reply_text("📋 Сделок нет")
+            return
+        lines = [format_trade(trade) for trade in trades]
+        await update.message.reply_text("📋 <b>История сделок</b>:\n" + "\n".join(lines), parse_mode='HTML')
+    except Exception as e:
+        logger.error(f"Error in show_history: {e}", exc_info=True)
+
+async def profile_engines(update: Update, context: CallbackContext):
+    """Профилировщик воркеров движков: /profile start [секунд] | stop [N] | report [N]"""
+    try:
+        if update.effective_user.id not in ADMIN_IDS:
+            return
+        args = context.args or []
+        action = args[0] if args else 'report'
+        if action not in ('start', 'stop', 'report'):
+            await update.message.reply_text("Использование: /profile start [секунд] | stop [N] | report [N]")
+            return
+        number = int(args[1]) if len(args) > 1 and args[1].isdigit() else None
+        if action == 'start':
+            report = await asyncio.to_thread(engine_pool.profile, 'start', number or 300)
+            await update.message.reply_text(f"🔬 Профилировщик включён\n{format_report(report, 0)}")
+            return
+        report = await asyncio.to_thread(engine_pool.profile, action)
+        await update.message.reply_text(f"<pre>{html.escape(format_report(report, number or 15))}</pre>", parse_mode='HTML')
+        if report['stacks']:
+            # Свёрнутые стеки: flamegraph.pl profile.folded > profile.svg или speedscope
+            await update.message.reply_document(
+                document=collapsed(report['stacks']).encode('utf-8'), filename='profile.folded'
+            )
+    except Exception as e:
+        logger.error(f"Error in profile_engines: {e}", exc_info=True)
+
+async def set_keys(update: Update, context: CallbackContext):
+    """Сохраняет API-ключи Bybit пользователя: /keys <api_key> <api_secret>"""
+    try:
+        if len(context.args) != 2:
+            await update.message.reply_text("Использование: /keys <api_key> <api_secret>")
+            return
+        user_id = update.effective_user.id
+        api_key, api_secret = context.args
+        # Ключи не должны оставаться в истории чата
+        await update.message.delete()
+        try:
+            update_user_settings(user_id, api_key=api_key, api_secret=api_secret)
+        except RuntimeError as e:
+            logger.error(f"Ключи пользователя {user_id} не сохранены: {e}")
+            await update.effective_chat.send_message(f"⚠ Ключи не сохранены: {e}")
+            return
+        applied = await asyncio.to_thread(engine_pool.update_credentials, user_id, (api_key, api_secret))
+        text = "🔑 Ключи сохранены и применены к запущенной стратегии" if applied else "🔑 Ключи сохранены"
+        await update.effective_chat.send_message(text)
+    except Exception as e:
+        logger.error(f"Error in set_keys: {e}", exc_info=True)
+
 async def handle_webhook_error(update: Update, context: CallbackContext):
     """Обработчик ошибок вебхука"""
     logger.error(f"Webhook error: {context.error}")
 
+async def watch_engine_pool(application):
+    """Пользователи узнают об остановке стратегий, если упал воркер с их движками"""
+    loop = asyncio.get_running_loop()
+
+    async def notify(user_id: int):
+        try:
+            await application.bot.send_message(
+                user_id, "⚠ Торговый движок перезапущен после сбоя, стратегии остановлены. Запустите их снова: /run",
+                reply_markup=main_menu_keyboard()
+            )
+        except Exception as e:
+            logger.error(f"Не удалось уведомить пользователя {user_id}: {e}")
+
+    def on_engines_lost(user_ids):
+        # Вызывается из потока пула: отправка — в цикле событий бота
+        for user_id in user_ids:
+            asyncio.run_coroutine_threadsafe(notify(user_id), loop)
+    engine_pool.on_engines_lost = on_engines_lost
+
 def create_application():
     """Создает и настраивает приложение"""
-    application = ApplicationBuilder().token(TELEGRAM_API_KEY).build()
+    application = ApplicationBuilder().token(TELEGRAM_API_KEY).post_init(watch_engine_pool).build()
     
     # Базовые обработчики
     application.add_handler(TypeHandler(Update, log_update))
@@ -105,6 +335,18 @@ def create_application():
 
     # Обработчики команд
     application.add_handler(CommandHandler("start", start))
+    application.add_handler(CommandHandler("run", run_strategy))
+    application.add_handler(CommandHandler("stop", stop_trading))
+    application.add_handler(CommandHandler("tune", tune_strategy))
+    application.add_handler(CommandHandler("status", show_status))
+    application.add_handler(CommandHandler("keys", set_keys))
+    application.add_handler(CommandHandler("screen", screen_market))
+    application.add_handler(CommandHandler("stats", show_stats))
+    application.add_handler(CommandHandler("history", show_history))
+    application.add_handler(CommandHandler("profile", profile_engines))
+    application.add_handler(MessageHandler(filters.Regex("^🛑 Остановить торги$"), stop_trading))
+    application.add_handler(MessageHandler(filters.Regex("^📈 Статус$"), show_status))
+    application.add_handler(MessageHandler(filters.Regex("^📋 История сделок$"), show_history))
     
     # Здесь добавьте остальные обработчики...
     
@@ -130,16 +372,25 @@ async def setup_webhook(application):
 
 def run_bot():
     """Запуск бота в режиме вебхука"""
-    application = create_application()
-    
-    # Настройка вебхука
-    application.run_webhook(
-        listen="0.0.0.0",
-        port=PORT,
-        webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_SECRET}",
-        secret_token=WEBHOOK_SECRET,
-        drop_pending_updates=True
-    )
+    global engine_pool
+    setup_logging()
+    check_environment()
+    # Вызовем тест перед запуском бота
+    test_connection()
+    engine_pool = EnginePool(workers=int(os.getenv('ENGINE_WORKERS', '0')) or None)
+    try:
+        application = create_application()
+
+        # Настройка вебхука
+        application.run_webhook(
+            listen="0.0.0.0",
+            port=PORT,
+            webhook_url=f"{WEBHOOK_URL}/{WEBHOOK_SECRET}",
+            secret_token=WEBHOOK_SECRET,
+            drop_pending_updates=True
+        )
+    finally:
+        engine_pool.shutdown()
 
 if __name__ == "__main__":
     run_bot()
@@ -0,0 +1,104 @@
+import os
+import json
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[Dict[str, Any]], None]
+
+class MarketStream:
+    """Публичный WebSocket Bybit v5: одна сессия на все подписки с переподключением"""
+
+    URL = 'wss://stream.bybit.com/v5/public/linear'
+
+    def __init__(self, url: Optional[str] = None, ping_interval: float = 20.0, reconnect_delay: float = 5.0):
+        self.url = url or os.getenv('BYBIT_WS_URL') or self.URL
+        self.ping_interval = ping_interval
+        self.reconnect_delay = reconnect_delay
+        self.connected = False
+        self._handlers: Dict[str, List[Handler]] = {}
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._closing = False
+        self.recorder = None  # replay.Recorder: запись входящих кадров для воспроизведения
+
+    async def subscribe(self, topic: str, handler: Handler):
+        """Подписывает обработчик на топик (например, kline.1.BTCUSDT)"""
+        handlers = self._handlers.setdefault(topic, [])
+        handlers.append(handler)
+        if len(handlers) == 1 and self.connected:
+            await self._send({'op': 'subscribe', 'args': [topic]})
+
+    async def unsubscribe(self, topic: str, handler: Handler):
+        handlers = self._handlers.get(topic, [])
+        if handler in handlers:
+            handlers.remove(handler)
+        if not handlers:
+            self._handlers.pop(topic, None)
+            if self.connected:
+                await self._send({'op': 'unsubscribe', 'args': [topic]})
+
+    async def _send(self, payload: Dict[str, Any]):
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.send_str(json.dumps(payload))
+
+    async def run(self):
+        """Держит соединение открытым до вызова close()"""
+        self._session = aiohttp.ClientSession()
+        try:
+            while not self._closing:
+                try:
+                    await self._connect_and_listen()
+                except Exception as e:
+                    logger.error(f"Ошибка WebSocket: {e}")
+                self.connected = False
+                if not self._closing:
+                    await asyncio.sleep(self.reconnect_delay)
+        finally:
+            await self._session.close()
+
+    async def _connect_and_listen(self):
+        async with self._session.ws_connect(self.url, heartbeat=None) as ws:
+            self._ws = ws
+            self.connected = True
+            logger.info(f"WebSocket подключен: {self.url}")
+            if self._handlers:
+                await self._send({'op': 'subscribe', 'args': list(self._handlers)})
+            pinger = asyncio.create_task(self._ping_loop())
+            try:
+                async for msg in ws:
+                    if msg.type == aiohttp.WSMsgType.TEXT:
+                        if self.recorder is not None:
+                            self.recorder.ws(msg.data)
+                        self._dispatch(msg.data)
+                    elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                        break
+            finally:
+                pinger.cancel()
+                self._ws = None
+
+    async def _ping_loop(self):
+        while True:
+            await asyncio.sleep(self.ping_interval)
+            await self._send({'op': 'ping'})
+
+    def _dispatch(self, raw: str):
+        message = json.loads(raw)
+        topic = message.get('topic')
+        if topic is None:
+            if message.get('success') is False:
+                logger.error(f"WebSocket отказ: {message.get('ret_msg')}")
+            return
+        for handler in list(self._handlers.get(topic, ())):
+            try:
+                handler(message)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика {topic}: {e}", exc_info=True)
+
+    async def close(self):
+        self._closing = True
+        if self._ws is not None and not self._ws.closed:
+            await self._ws.close()
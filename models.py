@@ -0,0 +1,108 @@
+import json
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Sequence
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # orjson необязателен: без него работает стандартный json
+    orjson = None
+
+def loads(body: bytes) -> Any:
+    """JSON из байтов ответа без промежуточной строки"""
+    if orjson is not None:
+        return orjson.loads(body)
+    return json.loads(body)
+
+def _float(value: Any, default: float = 0.0) -> float:
+    # Bybit отдаёт числа строками, пустая строка означает «нет значения»
+    return float(value) if value not in (None, '') else default
+
+def _optional_float(value: Any) -> Optional[float]:
+    return float(value) if value not in (None, '') and float(value) != 0 else None
+
+def parse_klines(rows: Sequence[Sequence[Any]]) -> np.ndarray:
+    """Строки kline Bybit (от новых к старым) -> float64-массив (N x 6) по возрастанию времени"""
+    if not rows:
+        return np.empty((0, 6), dtype=np.float64)
+    return np.array(rows, dtype=np.float64)[::-1, :6].copy()
+
+@dataclass(slots=True)
+class WalletBalance:
+    account_type: str
+    coin: str
+    wallet_balance: float
+    available: float
+    total_equity: float
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any], coin: str = 'USDT',
+                    account_type: str = 'UNIFIED') -> Optional['WalletBalance']:
+        """Баланс монеты из ответа /v5/account/wallet-balance; None, если её нет"""
+        for account in result.get('list', ()):
+            if account.get('accountType') != account_type:
+                continue
+            for item in account.get('coin', ()):
+                if item.get('coin') == coin:
+                    wallet = _float(item.get('walletBalance'))
+                    return cls(
+                        account_type, coin, wallet,
+                        _float(item.get('availableToWithdraw')),
+                        _float(account.get('totalEquity'), wallet),
+                    )
+        return None
+
+@dataclass(slots=True)
+class OrderResult:
+    order_id: str
+    symbol: str
+    side: str
+    qty: float
+    price: Optional[float] = None
+    status: str = 'New'
+    avg_price: Optional[float] = None
+    fee: Optional[float] = None  # комиссия исполненной части, если исполнитель её сообщает
+
+    @classmethod
+    def from_result(cls, result: Dict[str, Any]) -> 'OrderResult':
+        """Ответ создания заявки: поддерживает и v5 (camelCase), и старый формат"""
+        get = result.get
+        return cls(
+            order_id=str(get('orderId') or get('order_id') or ''),
+            symbol=get('symbol', ''),
+            side=get('side', ''),
+            qty=_float(get('qty')),
+            price=_optional_float(get('price')),
+            status=get('orderStatus') or get('order_status') or 'New',
+            avg_price=_optional_float(get('avgPrice') or get('avg_price')),
+            fee=_optional_float(get('cumExecFee') or get('cum_exec_fee')),
+        )
+
+@dataclass(slots=True)
+class PositionInfo:
+    symbol: str
+    side: str  # 'Buy', 'Sell' или '' для пустой позиции
+    size: float
+    entry_price: float
+    leverage: float
+    unrealised_pnl: float = 0.0
+    take_profit: Optional[float] = None
+    stop_loss: Optional[float] = None
+
+    @classmethod
+    def from_result(cls, item: Dict[str, Any]) -> 'PositionInfo':
+        return cls(
+            symbol=item['symbol'],
+            side=item.get('side', ''),
+            size=_float(item.get('size')),
+            entry_price=_float(item.get('avgPrice')),
+            leverage=_float(item.get('leverage'), 1.0),
+            unrealised_pnl=_float(item.get('unrealisedPnl')),
+            take_profit=_optional_float(item.get('takeProfit')),
+            stop_loss=_optional_float(item.get('stopLoss')),
+        )
+
+    @classmethod
+    def list_from_result(cls, result: Dict[str, Any]) -> List['PositionInfo']:
+        """Открытые позиции из ответа /v5/position/list (нулевые отбрасываются)"""
+        return [cls.from_result(item) for item in result.get('list', ()) if _float(item.get('size'))]
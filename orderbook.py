@@ -0,0 +1,243 @@
+import bisect
+import asyncio
+import logging
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class FillEstimate(NamedTuple):
+    avg_price: float
+    worst_price: float
+    filled_qty: float       # меньше запрошенного, если глубины стакана не хватило
+    slippage_bps: float     # отклонение средней цены от лучшей, в базисных пунктах
+
+class _BookSide:
+    """Одна сторона стакана: отсортированные цены + объёмы по цене.
+
+    Префиксные суммы объёма и оборота пересобираются лениво за O(n) при
+    первом запросе после изменения стакана; O(log n) стоят только повторные
+    запросы к неизменному стакану. На живом потоке между запросами почти
+    всегда приходит дельта, поэтому оценка заявки фактически O(n) — при
+    глубине в 50 уровней это единицы микросекунд, а запрос один на заявку.
+    """
+
+    __slots__ = ('descending', 'prices', 'sizes', '_dirty', '_levels', '_cum_qty', '_cum_notional')
+
+    def __init__(self, descending: bool):
+        self.descending = descending  # биды — от большей цены к меньшей
+        self.prices: List[float] = []  # всегда по возрастанию
+        self.sizes: Dict[float, float] = {}
+        self._dirty = True
+        self._levels = self._cum_qty = self._cum_notional = np.empty(0)
+
+    def clear(self):
+        self.prices.clear()
+        self.sizes.clear()
+        self._dirty = True
+
+    def update(self, price: float, size: float):
+        if size <= 0:
+            if self.sizes.pop(price, None) is not None:
+                i = bisect.bisect_left(self.prices, price)
+                del self.prices[i]
+        else:
+            if price not in self.sizes:
+                bisect.insort(self.prices, price)
+            self.sizes[price] = size
+        self._dirty = True
+
+    def best(self) -> Optional[float]:
+        if not self.prices:
+            return None
+        return self.prices[-1] if self.descending else self.prices[0]
+
+    def _prefix(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        if self._dirty:
+            ordered = self.prices[::-1] if self.descending else self.prices
+            self._levels = np.fromiter(ordered, dtype=np.float64, count=len(ordered))
+            sizes = np.fromiter((self.sizes[p] for p in ordered), dtype=np.float64, count=len(ordered))
+            self._cum_qty = np.cumsum(sizes)
+            self._cum_notional = np.cumsum(sizes * self._levels)
+            self._dirty = False
+        return self._levels, self._cum_qty, self._cum_notional
+
+    def estimate(self, qty: float) -> FillEstimate:
+        levels, cum_qty, cum_notional = self._prefix()
+        if not len(levels) or qty <= 0:
+            return FillEstimate(0.0, 0.0, 0.0, 0.0)
+        k = int(np.searchsorted(cum_qty, qty))  # последний затрагиваемый уровень
+        if k >= len(levels):
+            filled, notional, worst = cum_qty[-1], cum_notional[-1], levels[-1]
+        else:
+            before_qty = cum_qty[k - 1] if k else 0.0
+            before_notional = cum_notional[k - 1] if k else 0.0
+            filled, worst = qty, levels[k]
+            notional = before_notional + (qty - before_qty) * worst
+        avg = notional / filled
+        return FillEstimate(
+            float(avg), float(worst), float(filled), float(abs(avg - levels[0]) / levels[0] * 10_000)
+        )
+
+    def max_qty(self, max_slippage_bps: float) -> float:
+        """Наибольший объём, средняя цена которого не хуже лучшей на max_slippage_bps"""
+        levels, cum_qty, cum_notional = self._prefix()
+        if not len(levels):
+            return 0.0
+        sign = -1 if self.descending else 1
+        limit = levels[0] * (1 + sign * max_slippage_bps / 10_000)
+        # Средняя цена монотонна по числу съеденных уровней — ищем бинарным поиском
+        avg = cum_notional / cum_qty
+        ok = (avg <= limit) if sign > 0 else (avg >= limit)
+        k = int(np.searchsorted(~ok, True))  # число уровней, целиком укладывающихся в лимит
+        if k >= len(levels):
+            return float(cum_qty[-1])
+        if k == 0:
+            return 0.0
+        q, n, p = cum_qty[k - 1], cum_notional[k - 1], levels[k]
+        # Часть уровня k: (n + p*x) / (q + x) = limit
+        return float(q + max(0.0, (limit * q - n) / (p - limit)))
+
+class OrderBook:
+    """Локальный L2-стакан по снапшотам и дельтам orderbook.N WebSocket Bybit"""
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = _BookSide(descending=True)
+        self.asks = _BookSide(descending=False)
+        self.update_id = 0
+        self.seq = 0
+        self.ts = 0
+        self.valid = False  # False до снапшота и после обнаружения разрыва
+
+    def apply(self, message: Dict[str, Any]) -> bool:
+        """Применяет сообщение; False — обнаружен разрыв, нужен новый снапшот"""
+        data = message['data']
+        update_id = int(data['u'])
+        # u == 1 в дельте означает перезапуск сервиса биржи — это снапшот
+        if message.get('type') == 'snapshot' or update_id == 1:
+            self.bids.clear()
+            self.asks.clear()
+        elif not self.valid:
+            return False
+        elif update_id != self.update_id + 1:
+            logger.warning(f"Разрыв стакана {self.symbol}: {self.update_id} -> {update_id}")
+            self.valid = False
+            return False
+
+        for price, size in data.get('b', ()):
+            self.bids.update(float(price), float(size))
+        for price, size in data.get('a', ()):
+            self.asks.update(float(price), float(size))
+        self.update_id = update_id
+        self.seq = int(data.get('seq', self.seq))
+        self.ts = message.get('ts', self.ts)
+        self.valid = True
+        return True
+
+    def best_bid(self) -> Optional[float]:
+        return self.bids.best()
+
+    def best_ask(self) -> Optional[float]:
+        return self.asks.best()
+
+    def mid(self) -> Optional[float]:
+        bid, ask = self.best_bid(), self.best_ask()
+        if bid is None or ask is None:
+            return None
+        return (bid + ask) / 2
+
+    def _side(self, side: str) -> _BookSide:
+        # Покупка съедает аски, продажа — биды
+        return self.asks if side.lower() == 'buy' else self.bids
+
+    def estimate_fill(self, side: str, qty: float) -> FillEstimate:
+        """Ожидаемая средняя цена и проскальзывание рыночной заявки"""
+        return self._side(side).estimate(qty)
+
+    def max_qty(self, side: str, max_slippage_bps: float) -> float:
+        return self._side(side).max_qty(max_slippage_bps)
+
+    def guard_order(self, side: str, qty: float, max_slippage_bps: float,
+                    min_fill_ratio: float = 0.5) -> Tuple[float, Optional[float]]:
+        """Подбирает объём и тип заявки: (объём, лимитная цена или None для рыночной).
+
+        Если рыночная заявка укладывается в допустимое проскальзывание — она
+        остаётся как есть. Если урезанный объём не меньше min_fill_ratio от
+        исходного — отправляем урезанную рыночную. Иначе переходим на лимитную
+        заявку полного объёма по цене с допустимым проскальзыванием.
+        """
+        book = self._side(side)
+        best = book.best()
+        if not self.valid or best is None:
+            return qty, None
+        estimate = book.estimate(qty)
+        if estimate.filled_qty >= qty and estimate.slippage_bps <= max_slippage_bps:
+            return qty, None
+        capped = book.max_qty(max_slippage_bps)
+        if capped >= qty * min_fill_ratio:
+            return capped, None
+        sign = 1 if side.lower() == 'buy' else -1
+        return qty, best * (1 + sign * max_slippage_bps / 10_000)
+
+class OrderBooks:
+    """Стаканы по парам поверх MarketStream с автоматической пересинхронизацией"""
+
+    def __init__(self, stream, depth: int = 50):
+        self.stream = stream
+        self.depth = depth
+        self.books: Dict[str, OrderBook] = {}
+        self._resyncing: set = set()
+        self._refs: Dict[str, int] = {}  # число запусков стратегий на паре
+
+    async def track(self, symbol: str) -> OrderBook:
+        self._refs[symbol] = self._refs.get(symbol, 0) + 1
+        book = self.books.get(symbol)
+        if book is None:
+            book = self.books[symbol] = OrderBook(symbol)
+            await self.stream.subscribe(self._topic(symbol), self._on_message)
+        return book
+
+    async def untrack(self, symbol: str):
+        """Парный вызов к track: после последнего стакан пары больше не ведётся"""
+        refs = self._refs.get(symbol, 0) - 1
+        if refs > 0:
+            self._refs[symbol] = refs
+            return
+        self._refs.pop(symbol, None)
+        self._resyncing.discard(symbol)
+        if self.books.pop(symbol, None) is not None:
+            await self.stream.unsubscribe(self._topic(symbol), self._on_message)
+
+    def get(self, symbol: str) -> Optional[OrderBook]:
+        return self.books.get(symbol)
+
+    def _topic(self, symbol: str) -> str:
+        return f"orderbook.{self.depth}.{symbol}"
+
+    def _on_message(self, message: Dict[str, Any]):
+        symbol = message['topic'].rsplit('.', 1)[-1]
+        book = self.books.get(symbol)
+        if book is None:
+            return
+        if symbol in self._resyncing:
+            # До нового снапшота дельты старой подписки бесполезны: отбрасываем
+            if message.get('type') != 'snapshot' and int(message['data']['u']) != 1:
+                return
+            self._resyncing.discard(symbol)
+        if not book.apply(message):
+            # Переподписка заставляет биржу прислать свежий снапшот
+            self._resyncing.add(symbol)
+            asyncio.ensure_future(self._resync(symbol))
+
+    async def _resync(self, symbol: str):
+        """Переподписка; пара остаётся в _resyncing, пока не придёт снапшот"""
+        topic = self._topic(symbol)
+        try:
+            await self.stream.unsubscribe(topic, self._on_message)
+            if symbol in self.books:  # стакан не сняли с учёта, пока шла переподписка
+                await self.stream.subscribe(topic, self._on_message)
+        except Exception as e:
+            logger.error(f"Не удалось переподписаться на стакан {symbol}: {e}")
+            # Следующая дельта снова обнаружит разрыв и повторит попытку
+            self._resyncing.discard(symbol)
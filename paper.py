@@ -0,0 +1,287 @@
+import time
+import random
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from models import OrderResult, PositionInfo, WalletBalance
+
+logger = logging.getLogger(__name__)
+
+# Вызывается при закрытии позиции по TP/SL: (symbol, цена выхода, прибыль)
+CloseListener = Callable[[str, float, float], None]
+
+@dataclass
+class PaperConfig:
+    initial_balance: float = 10_000.0
+    latency: float = 0.15        # задержка исполнения заявки, сек
+    latency_jitter: float = 0.1
+    slippage_bps: float = 2.0    # проскальзывание рыночной заявки
+    fee_rate: float = 0.00055    # комиссия тейкера
+    seed: Optional[int] = None
+
+@dataclass
+class PaperPosition:
+    side: str  # 'Buy' или 'Sell'
+    size: float
+    entry_price: float
+    leverage: int
+    take_profit: Optional[float] = None
+    stop_loss: Optional[float] = None
+
+class PaperBroker:
+    """Общий для всех бумажных счетов источник цен.
+
+    Цены берутся из минутного ряда MarketData (живой поток или повтор),
+    поэтому сотни бумажных стратегий не добавляют запросов к бирже.
+    """
+
+    def __init__(self, api, market_data=None, kline_ttl: float = 5.0, clock: Callable[[], float] = time.time):
+        self.api = api
+        self.market_data = market_data
+        self.kline_ttl = kline_ttl
+        self.clock = clock
+        self.accounts: List['PaperExecutor'] = []
+        self._prices: Dict[str, float] = {}
+        self._klines: Dict[Tuple[str, str, int], Tuple[float, Any]] = {}
+        if market_data is not None:
+            market_data.resampler.add_listener(self.on_kline)
+
+    def account(self, config: Optional[PaperConfig] = None) -> 'PaperExecutor':
+        executor = PaperExecutor(self, config or PaperConfig())
+        self.accounts.append(executor)
+        return executor
+
+    def close(self):
+        if self.market_data is not None:
+            self.market_data.resampler.remove_listener(self.on_kline)
+        self.accounts.clear()
+
+    def release(self, executor: 'PaperExecutor'):
+        if executor in self.accounts:
+            self.accounts.remove(executor)
+
+    def on_kline(self, symbol: str, row, confirmed: bool):
+        """Новая цена: проверяем лимитные заявки и TP/SL всех бумажных счетов"""
+        price = float(row[4])
+        self._prices[symbol] = price
+        for executor in self.accounts:
+            executor.on_price(symbol, price)
+
+    async def price(self, symbol: str) -> float:
+        price = self._prices.get(symbol)
+        if price is None:
+            klines = await self.get_klines(symbol, '1m', 1)
+            price = float(klines[-1][4])
+        return price
+
+    async def get_klines(self, symbol: str, interval: str = '5m', limit: int = 100):
+        """Свечи через общий кеш: одна выборка на всех подписчиков в пределах kline_ttl"""
+        key = (symbol, interval, limit)
+        now = self.clock()
+        cached = self._klines.get(key)
+        if cached is not None and now - cached[0] < self.kline_ttl:
+            result = cached[1]
+            return await result if isinstance(result, asyncio.Future) else result
+        future = asyncio.ensure_future(self.api.get_klines(symbol=symbol, interval=interval, limit=limit))
+        self._klines[key] = (now, future)
+        try:
+            klines = await future
+        except Exception:
+            self._klines.pop(key, None)
+            raise
+        self._klines[key] = (now, klines)
+        if len(klines):
+            self.on_kline(symbol, [float(x) for x in klines[-1][:6]], False)
+        return klines
+
+class PaperExecutor:
+    """Бумажный счёт с интерфейсом BybitAPI: задержка, проскальзывание, комиссии, TP/SL"""
+
+    mode = 'paper'
+
+    def __init__(self, broker: PaperBroker, config: PaperConfig):
+        self.broker = broker
+        self.config = config
+        self.cash = config.initial_balance
+        self.leverage = 5
+        self.positions: Dict[str, PaperPosition] = {}
+        self.orders: List[Dict[str, Any]] = []
+        self.listeners: List[CloseListener] = []
+        self.fees_paid = 0.0
+        self.realized_pnl = 0.0
+        self._rng = random.Random(config.seed)
+        self._order_seq = 0
+
+    async def initialize(self):
+        pass
+
+    async def close(self):
+        self.broker.release(self)
+
+    # --- Интерфейс BybitAPI ---
+
+    async def get_balance(self, params: Optional[Dict] = None) -> Optional[WalletBalance]:
+        return WalletBalance('UNIFIED', 'USDT', self.cash, self.available(), self.cash)
+
+    async def get_positions(self, symbol: Optional[str] = None) -> List[PositionInfo]:
+        return [
+            PositionInfo(sym, pos.side, pos.size, pos.entry_price, pos.leverage,
+                         take_profit=pos.take_profit, stop_loss=pos.stop_loss)
+            for sym, pos in self.positions.items() if symbol is None or sym == symbol
+        ]
+
+    async def get_klines(self, symbol: str, interval: str = '5m', limit: int = 100):
+        return await self.broker.get_klines(symbol, interval, limit)
+
+    async def set_leverage(self, symbol: str, leverage: int) -> Dict[str, Any]:
+        if leverage < 2 or leverage > 10:
+            raise ValueError("Leverage must be between 2x and 10x")
+        self.leverage = leverage
+        return {}
+
+    async def place_order(
+        self,
+        symbol: str,
+        side: str,
+        quantity: float,
+        price: Optional[float] = None,
+        order_type: str = 'Market',
+        take_profit: Optional[float] = None,
+        stop_loss: Optional[float] = None,
+        leverage: Optional[int] = None
+    ) -> OrderResult:
+        await self._latency()
+        self._order_seq += 1
+        order = {
+            'order_id': f"paper-{self._order_seq}",
+            'symbol': symbol,
+            'side': side.capitalize(),
+            'qty': quantity,
+            'price': price,
+            'order_type': 'Limit' if price is not None else order_type,
+            'take_profit': take_profit,
+            'stop_loss': stop_loss,
+            'leverage': leverage or self.leverage,
+            'reduce_only': False,
+        }
+        market = await self.broker.price(symbol)
+        if price is None or self._crosses(order, market):
+            self._fill(order, self._market_fill_price(order['side'], market) if price is None else price)
+        else:
+            order['order_status'] = 'New'
+            self.orders.append(order)
+        return OrderResult.from_result(order)
+
+    async def close_position(self, symbol: str, side: str, quantity: float) -> OrderResult:
+        await self._latency()
+        # Закрытие снимает и ждущие заявки пары, иначе они откроют позицию позже
+        self._cancel(symbol)
+        market = await self.broker.price(symbol)
+        self._order_seq += 1
+        order = {
+            'order_id': f"paper-{self._order_seq}",
+            'symbol': symbol, 'side': side.capitalize(), 'qty': quantity,
+            'price': None, 'order_type': 'Market', 'reduce_only': True,
+        }
+        self._fill(order, self._market_fill_price(order['side'], market))
+        return OrderResult.from_result(order)
+
+    async def cancel_orders(self, symbol: str) -> int:
+        await self._latency()
+        return self._cancel(symbol)
+
+    # --- Модель исполнения ---
+
+    def available(self) -> float:
+        margin = sum(pos.size * pos.entry_price / pos.leverage for pos in self.positions.values())
+        return max(0.0, self.cash - margin)
+
+    async def _latency(self):
+        delay = self.config.latency + self._rng.random() * self.config.latency_jitter
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def _market_fill_price(self, side: str, price: float) -> float:
+        sign = 1 if side == 'Buy' else -1
+        return price * (1 + sign * self.config.slippage_bps / 10_000)
+
+    @staticmethod
+    def _crosses(order: Dict[str, Any], price: float) -> bool:
+        return price <= order['price'] if order['side'] == 'Buy' else price >= order['price']
+
+    def _cancel(self, symbol: str) -> int:
+        cancelled = [order for order in self.orders if order['symbol'] == symbol]
+        for order in cancelled:
+            order['order_status'] = 'Cancelled'
+            self.orders.remove(order)
+        return len(cancelled)
+
+    def on_price(self, symbol: str, price: float):
+        for order in [o for o in self.orders if o['symbol'] == symbol and self._crosses(o, price)]:
+            self.orders.remove(order)
+            self._fill(order, order['price'])
+
+        pos = self.positions.get(symbol)
+        if pos is None:
+            return
+        long = pos.side == 'Buy'
+        if pos.stop_loss and (price <= pos.stop_loss if long else price >= pos.stop_loss):
+            self._trigger(symbol, pos, pos.stop_loss)
+        elif pos.take_profit and (price >= pos.take_profit if long else price <= pos.take_profit):
+            self._trigger(symbol, pos, pos.take_profit)
+
+    def _trigger(self, symbol: str, pos: PaperPosition, trigger_price: float):
+        """Срабатывание TP/SL: закрываем рыночной заявкой по цене триггера"""
+        exit_side = 'Sell' if pos.side == 'Buy' else 'Buy'
+        fill_price = self._market_fill_price(exit_side, trigger_price)
+        profit = self._fill({
+            'symbol': symbol, 'side': exit_side, 'qty': pos.size, 'reduce_only': True,
+        }, fill_price)
+        for listener in self.listeners:
+            try:
+                listener(symbol, fill_price, profit)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика закрытия {symbol}: {e}", exc_info=True)
+
+    def _fill(self, order: Dict[str, Any], price: float) -> float:
+        """Исполняет заявку и возвращает реализованный результат (за вычетом комиссии)"""
+        symbol = order['symbol']
+        pos = self.positions.get(symbol)
+        if order['reduce_only'] and (pos is None or pos.side == order['side']):
+            # Уменьшать нечего: как и биржа, отклоняем заявку без комиссии
+            order['order_status'] = 'Cancelled'
+            return 0.0
+        order['order_status'] = 'Filled'
+        order['avg_price'] = price
+        fee = order['qty'] * price * self.config.fee_rate
+        order['cum_exec_fee'] = fee
+        self.cash -= fee
+        self.fees_paid += fee
+        if pos is None:
+            self.positions[symbol] = PaperPosition(
+                order['side'], order['qty'], price, order.get('leverage') or self.leverage,
+                order.get('take_profit'), order.get('stop_loss')
+            )
+            return -fee
+        if pos.side == order['side']:
+            total = pos.size + order['qty']
+            pos.entry_price = (pos.entry_price * pos.size + price * order['qty']) / total
+            pos.size = total
+            return -fee
+
+        closed = min(pos.size, order['qty'])
+        direction = 1 if pos.side == 'Buy' else -1
+        pnl = (price - pos.entry_price) * closed * direction
+        self.cash += pnl
+        self.realized_pnl += pnl
+        pos.size -= closed
+        rest = order['qty'] - closed
+        if pos.size <= 1e-12:
+            del self.positions[symbol]
+            if rest > 1e-12 and not order['reduce_only']:
+                self.positions[symbol] = PaperPosition(
+                    order['side'], rest, price, order.get('leverage') or self.leverage,
+                    order.get('take_profit'), order.get('stop_loss')
+                )
+        return pnl - fee
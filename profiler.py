@@ -0,0 +1,238 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter, deque
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Кадры, в которых поток ждёт, а не считает: такие сэмплы не попадают в профиль
+_IDLE_FRAMES = {
+    ('selectors.py', 'select'), ('threading.py', 'wait'), ('queue.py', 'get'),
+    ('connection.py', '_recv'), ('connection.py', '_poll'), ('connection.py', 'poll'),
+    ('thread.py', '_worker'),  # поток ThreadPoolExecutor без задачи
+}
+
+class SamplingProfiler:
+    """Сэмплирующий профилировщик потоков и задач asyncio, включаемый на лету.
+
+    Во включённом состоянии отдельный поток раз в interval снимает стеки всех
+    потоков процесса через sys._current_frames(), а в каждом наблюдаемом цикле
+    событий работает задача, измеряющая задержку цикла. Выключенный
+    профилировщик не держит ни потока, ни задач и ничего не стоит.
+    """
+
+    def __init__(self, interval: float = 0.005, lag_interval: float = 0.1, max_depth: int = 64):
+        self.interval = interval
+        self.lag_interval = lag_interval
+        self.max_depth = max_depth
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.stopped_at = 0.0
+        self._loops: Dict[asyncio.AbstractEventLoop, str] = {}
+        self._loop_threads: Dict[int, asyncio.AbstractEventLoop] = {}
+        self._lag: Dict[str, deque] = {}
+        self._lag_futures: List[Any] = []
+        self._labels: Dict[Any, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._deadline: Optional[float] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def watch_loop(self, loop: asyncio.AbstractEventLoop, name: str):
+        """Цикл событий, для которого меряется лаг и подписываются имена задач"""
+        with self._lock:
+            self._loops[loop] = name
+            if self.running:
+                self._start_lag(loop, name)
+
+    def unwatch_loop(self, loop: asyncio.AbstractEventLoop):
+        with self._lock:
+            self._loops.pop(loop, None)
+            for ident in [ident for ident, watched in self._loop_threads.items() if watched is loop]:
+                del self._loop_threads[ident]
+
+    def start(self, duration: Optional[float] = 300.0) -> bool:
+        """Включает сбор; через duration секунд профилировщик выключится сам"""
+        with self._lock:
+            if self.running:
+                return False
+            self.stacks.clear()
+            self.samples = 0
+            self._lag = {}
+            self.started_at = time.time()
+            self.stopped_at = 0.0
+            self._deadline = time.monotonic() + duration if duration else None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._sample_forever, name='profiler', daemon=True)
+            self._thread.start()
+            for loop, name in self._loops.items():
+                self._start_lag(loop, name)
+        logger.info(f"Профилировщик включён (интервал {self.interval * 1000:.0f} мс)")
+        return True
+
+    def stop(self) -> bool:
+        with self._lock:
+            if self._thread is None:
+                return False
+            self._stop.set()
+            thread, self._thread = self._thread, None
+            futures, self._lag_futures = self._lag_futures, []
+        thread.join(timeout=5)
+        for future in futures:
+            future.cancel()
+        self._loop_threads.clear()
+        self.stopped_at = time.time()
+        logger.info(f"Профилировщик выключен, сэмплов: {self.samples}")
+        return True
+
+    def control(self, action: str, duration: Optional[float] = 300.0) -> Dict[str, Any]:
+        """Команда 'start', 'stop' или 'report'; в ответ — текущий отчёт"""
+        if action == 'start':
+            self.start(duration)
+        elif action == 'stop':
+            self.stop()
+        elif action != 'report':
+            raise ValueError(f"Неизвестное действие профилировщика: {action}")
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        """Собранные данные в виде, пригодном для передачи между процессами"""
+        end = self.stopped_at or time.time()
+        return {
+            'running': self.running,
+            'samples': self.samples,
+            'seconds': end - self.started_at if self.started_at else 0.0,
+            'stacks': dict(self.stacks),
+            'lag': {name: lag_stats(values) for name, values in self._lag.items()},
+        }
+
+    # --- Сбор ---
+
+    def _start_lag(self, loop: asyncio.AbstractEventLoop, name: str):
+        if loop.is_running() and not loop.is_closed():
+            values = self._lag.setdefault(name, deque(maxlen=100_000))
+            self._lag_futures.append(asyncio.run_coroutine_threadsafe(self._watch_lag(loop, values), loop))
+
+    async def _watch_lag(self, loop: asyncio.AbstractEventLoop, values: deque):
+        # Запоминаем поток цикла, чтобы подписывать его стеки именем текущей задачи
+        self._loop_threads[threading.get_ident()] = loop
+        interval = self.lag_interval
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            values.append(max(0.0, loop.time() - started - interval))
+
+    def _sample_forever(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            if self._deadline is not None and time.monotonic() >= self._deadline:
+                threading.Thread(target=self.stop, daemon=True).start()
+                return
+            try:
+                self._sample(own)
+            except Exception as e:
+                logger.error(f"Профилировщик: ошибка сэмплирования: {e}")
+
+    def _sample(self, own: int):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            code = frame.f_code
+            if (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES:
+                continue
+            stack = []
+            while frame is not None and len(stack) < self.max_depth:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(self._task_name(ident) or names.get(ident, str(ident)))
+            self.stacks[';'.join(reversed(stack))] += 1
+        self.samples += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            module = os.path.splitext(os.path.basename(code.co_filename))[0]
+            label = self._labels[code] = f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+        return label
+
+    def _task_name(self, ident: int) -> Optional[str]:
+        loop = self._loop_threads.get(ident)
+        if loop is None:
+            return None
+        task = asyncio.current_task(loop)
+        name = self._loops.get(loop, 'loop')
+        return f"{name};task:{task.get_name()}" if task is not None else name
+
+def lag_stats(values) -> Dict[str, float]:
+    """Задержка цикла событий в миллисекундах"""
+    if not values:
+        return {'count': 0, 'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    ordered = sorted(values)
+    return {
+        'count': len(ordered),
+        'mean_ms': sum(ordered) / len(ordered) * 1000,
+        'p99_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+        'max_ms': ordered[-1] * 1000,
+    }
+
+def merge_reports(reports: Dict[str, Dict[str, Any]]) -> Dict[str, Any]:
+    """Отчёты нескольких процессов в один; стеки и лаг помечаются именем процесса"""
+    merged = {'running': False, 'samples': 0, 'seconds': 0.0, 'stacks': {}, 'lag': {}}
+    for name, report in reports.items():
+        merged['running'] |= report['running']
+        merged['samples'] += report['samples']
+        merged['seconds'] = max(merged['seconds'], report['seconds'])
+        for stack, count in report['stacks'].items():
+            merged['stacks'][f"{name};{stack}"] = count
+        for loop, stats in report['lag'].items():
+            merged['lag'][f"{name}/{loop}"] = stats
+    return merged
+
+def collapsed(stacks: Dict[str, int]) -> str:
+    """Свёрнутые стеки для flamegraph.pl / speedscope: 'кадр;кадр;... число'"""
+    return '\n'.join(f"{stack} {count}" for stack, count in sorted(stacks.items())) + '\n'
+
+def hotspots(stacks: Dict[str, int], top: int = 20) -> Tuple[List[Tuple[str, int]], List[Tuple[str, int]]]:
+    """Самые частые функции: по собственному времени и с учётом вызванных"""
+    own: Counter = Counter()
+    total: Counter = Counter()
+    for stack, count in stacks.items():
+        frames = [frame for frame in stack.split(';') if ':' in frame and not frame.startswith('task:')]
+        if not frames:
+            continue
+        own[frames[-1]] += count
+        for frame in set(frames):
+            total[frame] += count
+    return own.most_common(top), total.most_common(top)
+
+def format_report(report: Dict[str, Any], top: int = 15) -> str:
+    samples = sum(report['stacks'].values())
+    lines = [
+        f"{'▶ идёт сбор' if report['running'] else '⏹ остановлен'}: "
+        f"{report['samples']} сэмплов за {report['seconds']:.0f} с, активных стеков {samples}"
+    ]
+    for loop, stats in sorted(report['lag'].items()):
+        lines.append(
+            f"Лаг {loop}: среднее {stats['mean_ms']:.1f} мс, p99 {stats['p99_ms']:.1f} мс, "
+            f"макс. {stats['max_ms']:.1f} мс"
+        )
+    if samples:
+        own, total = hotspots(report['stacks'], top)
+        lines.append("Собственное время:")
+        lines += [f"  {count / samples * 100:5.1f}%  {frame}" for frame, count in own]
+        lines.append("С вызовами:")
+        lines += [f"  {count / samples * 100:5.1f}%  {frame}" for frame, count in total]
+    return '\n'.join(lines)
+
+# Один профилировщик на процесс: его включают команды администратора
+profiler = SamplingProfiler()
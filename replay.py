@@ -0,0 +1,359 @@
+"""Запись и воспроизведение обмена с биржей.
+
+Запись: BYBIT_RECORD=путь.jsonl.gz (можно с {pid}) — каждый ответ REST и
+каждый кадр WebSocket пишется строкой JSON со временем получения.
+
+Воспроизведение: python replay.py запись.jsonl.gz --symbol BTCUSDT
+Движок работает на цикле событий с виртуальным временем: asyncio.sleep не
+ждёт, а переводит часы к следующему событию, поэтому сутки торговли
+проигрываются за секунды и одинаково при каждом запуске.
+"""
+import os
+import gzip
+import json
+import time
+import atexit
+import bisect
+import asyncio
+import logging
+import argparse
+import tempfile
+import selectors
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Collection, Dict, List, Optional, Sequence, Tuple
+from trading import BybitAPI
+from market_stream import MarketStream
+
+logger = logging.getLogger(__name__)
+
+RECORD_ENV = 'BYBIT_RECORD'
+
+# Параметры, которые меняются от запроса к запросу и не определяют ответ
+_VOLATILE_PARAMS = {'api_key', 'timestamp', 'sign', 'recvWindow'}
+# Параметры окна выборки: при их несовпадении подходит ответ на тот же запрос
+# с другим окном, но пара, таймфрейм и категория должны совпасть
+_WINDOW_PARAMS = {'limit', 'start', 'end', 'cursor'}
+_PRIVATE_PREFIXES = ('/private', '/v5/account', '/v5/order', '/v5/position')
+
+def _public_params(params: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    return {
+        k: str(v).lower() if isinstance(v, bool) else str(v)
+        for k, v in (params or {}).items() if k not in _VOLATILE_PARAMS
+    }
+
+class Recorder:
+    """Пишет ответы REST и кадры WebSocket в gzip JSONL, одна строка — одно событие"""
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time, flush_every: int = 200):
+        self.path = path
+        self.clock = clock
+        self.flush_every = flush_every
+        self.events = 0
+        self._file = gzip.open(path, 'at', encoding='utf-8')
+        self._lock = threading.Lock()
+
+    def rest(self, method: str, endpoint: str, params: Optional[Dict[str, Any]], status: int, body: bytes):
+        self._write({
+            't': self.clock(), 'k': 'rest', 'm': method, 'e': endpoint,
+            'p': _public_params(params), 's': status, 'b': body.decode('utf-8', 'replace'),
+        })
+
+    def ws(self, frame: str):
+        self._write({'t': self.clock(), 'k': 'ws', 'f': frame})
+
+    def _write(self, event: Dict[str, Any]):
+        line = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(line + '\n')
+            self.events += 1
+            if self.events % self.flush_every == 0:
+                self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+
+_recorder: Optional[Recorder] = None
+
+def recorder_from_env() -> Optional[Recorder]:
+    """Общий на процесс рекордер, если задана переменная BYBIT_RECORD"""
+    global _recorder
+    path = os.getenv(RECORD_ENV)
+    if not path:
+        return None
+    if _recorder is None:
+        _recorder = Recorder(path.format(pid=os.getpid()))
+        atexit.register(_recorder.close)
+        logger.info(f"Запись обмена с биржей в {_recorder.path}")
+    return _recorder
+
+class Recording:
+    """Загруженная запись: ответы REST по запросам и кадры WebSocket по времени"""
+
+    def __init__(self, events: Sequence[Dict[str, Any]]):
+        self.frames: List[Tuple[float, str]] = []
+        # ключ запроса -> (времена ответов, ответы); второй индекс — без параметров окна
+        self._exact: Dict[Tuple, Tuple[List[float], List[Tuple[int, str]]]] = {}
+        self._relaxed: Dict[Tuple, Tuple[List[float], List[Tuple[int, str]]]] = {}
+        for event in sorted(events, key=lambda e: e['t']):
+            if event['k'] == 'ws':
+                self.frames.append((event['t'], event['f']))
+                continue
+            response = (event['s'], event['b'])
+            for index, key in ((self._exact, self._key(event['m'], event['e'], event['p'])),
+                               (self._relaxed, self._key(event['m'], event['e'], event['p'], _WINDOW_PARAMS))):
+                times, responses = index.setdefault(key, ([], []))
+                times.append(event['t'])
+                responses.append(response)
+        times = [e['t'] for e in events]
+        self.start = min(times) if times else time.time()
+        self.end = max(times) if times else self.start
+
+    @classmethod
+    def load(cls, path: str) -> 'Recording':
+        events = []
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            try:
+                for line in f:
+                    if line.strip():
+                        events.append(json.loads(line))
+            except (EOFError, json.JSONDecodeError):
+                # Запись оборвана вместе с процессом — используем то, что успело записаться
+                logger.warning(f"Запись {path} обрезана, загружено событий: {len(events)}")
+        return cls(events)
+
+    @staticmethod
+    def _key(method: str, endpoint: str, params: Dict[str, str], ignore: Collection[str] = ()) -> Tuple:
+        return method, endpoint, tuple(sorted((k, v) for k, v in params.items() if k not in ignore))
+
+    def response(self, method: str, endpoint: str, params: Optional[Dict[str, Any]],
+                  now: float) -> Optional[Tuple[int, str]]:
+        """Последний ответ, полученный к моменту now (или самый ранний, если раньше ответов не было).
+
+        Если точного запроса в записи нет, подходит тот же запрос с другим
+        окном выборки (limit, start, end); иначе None — промах.
+        """
+        public = _public_params(params)
+        entry = self._exact.get(self._key(method, endpoint, public))
+        if entry is None:
+            entry = self._relaxed.get(self._key(method, endpoint, public, _WINDOW_PARAMS))
+        if entry is None:
+            return None
+        times, responses = entry
+        return responses[max(bisect.bisect_right(times, now) - 1, 0)]
+
+class VirtualClock:
+    """Виртуальное время. Пока часы на паузе, цикл событий ждёт по-настоящему"""
+
+    def __init__(self, start: float):
+        self.start = start
+        self.elapsed = 0.0
+        self.paused = True
+
+    def time(self) -> float:
+        return self.start + self.elapsed
+
+    def monotonic(self) -> float:
+        # Цикл событий считает таймеры от нуля: у эпохи (~1.7e9) не хватает
+        # точности float для разрешения часов asyncio, и таймер «сейчас» не срабатывает
+        return self.elapsed
+
+    def advance(self, delay: float):
+        self.elapsed += delay
+
+class _VirtualSelector(selectors.DefaultSelector):
+    def __init__(self, clock: VirtualClock):
+        super().__init__()
+        self.clock = clock
+
+    def select(self, timeout: Optional[float] = None):
+        if timeout is None:
+            # Таймеров нет — ждём вызовов из других потоков
+            return super().select(None)
+        if self.clock.paused:
+            return super().select(min(timeout, 0.01))
+        events = super().select(0)
+        if not events and timeout > 0:
+            self.clock.advance(timeout)
+        return events
+
+class VirtualEventLoop(asyncio.SelectorEventLoop):
+    """Цикл событий, в котором ожидание таймера мгновенно переводит виртуальные часы"""
+
+    def __init__(self, clock: VirtualClock):
+        super().__init__(_VirtualSelector(clock))
+        self.clock = clock
+
+    def time(self) -> float:
+        return self.clock.monotonic()
+
+class ReplayAPI(BybitAPI):
+    """BybitAPI, отвечающий записанными ответами на момент виртуального времени"""
+
+    def __init__(self, recording: Recording, clock: VirtualClock):
+        super().__init__(api_key='replay', api_secret='replay', base_url='replay://')
+        self.recording = recording
+        self.clock = clock
+        self.stats = {'requests': 0, 'misses': 0}
+
+    async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, signed: bool = False) -> Dict:
+        await asyncio.sleep(0)  # как и сетевой запрос, отдаёт управление другим задачам
+        self.stats['requests'] += 1
+        response = self.recording.response(method, endpoint, params, self.clock.time())
+        if response is None:
+            self.stats['misses'] += 1
+            if endpoint.startswith(_PRIVATE_PREFIXES):
+                # Заявки воспроизводимой версии стратегии могут отличаться от записанных
+                return {}
+            raise Exception(f"Нет записанного ответа для {method} {endpoint}")
+        status, body = response
+        return self._decode(status, body.encode('utf-8'))
+
+class ReplayStream(MarketStream):
+    """MarketStream, проигрывающий записанные кадры по виртуальному времени"""
+
+    def __init__(self, recording: Recording, clock: VirtualClock):
+        super().__init__(url='replay://')
+        self.recording = recording
+        self.clock = clock
+        self.frames_dispatched = 0
+
+    async def run(self):
+        self.connected = True
+        try:
+            for t, frame in self.recording.frames:
+                if self._closing:
+                    break
+                delay = t - self.clock.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._dispatch(frame)
+                self.frames_dispatched += 1
+        finally:
+            self.connected = False
+
+@dataclass
+class ReplayResult:
+    virtual_seconds: float
+    wall_seconds: float
+    frames: int
+    api_requests: int
+    api_misses: int
+    runs: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+
+    @property
+    def speedup(self) -> float:
+        return self.virtual_seconds / self.wall_seconds if self.wall_seconds else float('inf')
+
+def replay(path: str, runs: Sequence[Dict[str, Any]], database: Optional[str] = None) -> ReplayResult:
+    """Проигрывает запись через TradeEngine с заданными запусками стратегий.
+
+    runs — аргументы TradeEngine.start_strategy. Бумажные запуски получают
+    фиксированный seed, чтобы результат повторялся. Сделки пишутся в
+    database (по умолчанию во временную БД, а не в рабочую).
+    """
+    import db
+
+    # БД модуля db общая на процесс: после воспроизведения возвращаем рабочую
+    saved = db.DB_NAME, db._archive_checked
+    db.DB_NAME = database or os.path.join(tempfile.mkdtemp(prefix='replay-'), 'replay.db')
+    db._archive_checked = None
+    try:
+        db.init_db()
+        return _play(path, runs)
+    finally:
+        db.DB_NAME, db._archive_checked = saved
+
+def _play(path: str, runs: Sequence[Dict[str, Any]]) -> ReplayResult:
+    from trade_engine import TradeEngine
+    from resampler import MarketData
+    from orderbook import OrderBooks
+    from paper import PaperConfig
+
+    recording = Recording.load(path)
+    clock = VirtualClock(recording.start)
+    loop = VirtualEventLoop(clock)
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+
+    api = ReplayAPI(recording, clock)
+    stream = ReplayStream(recording, clock)
+    market_data = MarketData(api, stream, clock=clock.time)
+    # Ключи те же, что у ReplayAPI: живой запуск воспроизведения не требует настоящих
+    engine = TradeEngine('replay', 'replay', loop=loop, market_data=market_data, order_books=OrderBooks(stream))
+    engine.clock = clock.time
+    engine.api = api
+    engine.recorder = None
+    try:
+        for params in runs:
+            params = dict(params)
+            if params.get('mode') == 'paper' and params.get('paper_config') is None:
+                params['paper_config'] = PaperConfig(seed=0)
+            if not engine.start_strategy(**params):
+                raise RuntimeError(f"Не удалось запустить {params}")
+        # Все запуски должны встать на таймеры до того, как пойдёт время
+        while any(run.task is None for run in engine.runs.values()):
+            time.sleep(0.01)
+
+        async def play():
+            try:
+                await stream.run()
+            finally:
+                # Останавливаем часы внутри цикла, иначе они уйдут вперёд, пока основной поток проснётся
+                clock.paused = True
+
+        started = time.perf_counter()
+        done = asyncio.run_coroutine_threadsafe(play(), loop)
+        clock.paused = False
+        done.result()
+        wall = time.perf_counter() - started
+
+        result = ReplayResult(
+            virtual_seconds=clock.time() - recording.start,
+            wall_seconds=wall,
+            frames=stream.frames_dispatched,
+            api_requests=api.stats['requests'],
+            api_misses=api.stats['misses'],
+        )
+        for run_id, run in engine.runs.items():
+            summary = {'symbol': run.symbol, 'strategy': run.name, **run.scheduler.stats}
+            executor = run.executor
+            if run.mode == 'paper':
+                summary.update(
+                    cash=executor.cash, realized_pnl=executor.realized_pnl,
+                    fees=executor.fees_paid, orders=executor._order_seq,
+                    positions=len(executor.positions),
+                )
+            result.runs[run_id] = summary
+        return result
+    finally:
+        engine.stop_all()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Воспроизведение записи обмена с биржей через TradeEngine")
+    parser.add_argument('path', help="файл записи .jsonl.gz")
+    parser.add_argument('--symbol', action='append', help="пара (можно несколько раз)")
+    parser.add_argument('--strategy', default="Стратегия 2")
+    parser.add_argument('--mode', default='paper', choices=('paper', 'live'))
+    parser.add_argument('--database', help="БД для сделок (по умолчанию временная)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    runs = [{'symbol': symbol, 'strategy_name': args.strategy, 'mode': args.mode}
+            for symbol in args.symbol or ['BTCUSDT']]
+    result = replay(args.path, runs, args.database)
+    print(f"Виртуальное время: {result.virtual_seconds / 3600:.2f} ч, реальное: {result.wall_seconds:.2f} с "
+          f"(x{result.speedup:.0f}), кадров: {result.frames}, запросов: {result.api_requests} "
+          f"(без записи: {result.api_misses})")
+    for run_id, summary in result.runs.items():
+        print(f"{run_id}: {summary}")
+
+if __name__ == '__main__':
+    main()
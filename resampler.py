@@ -0,0 +1,248 @@
+import time
+import logging
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from series import OHLCVSeries
+from utils import interval_to_seconds
+
+logger = logging.getLogger(__name__)
+
+BASE_INTERVAL = '1m'
+BASE_MS = 60_000
+
+BarCallback = Callable[[str, str, OHLCVSeries], None]
+KlineListener = Callable[[str, Sequence[float], bool], None]
+
+class _Bucket:
+    """Накопленная часть формирующейся свечи старшего таймфрейма"""
+
+    __slots__ = ('start', 'open', 'high', 'low', 'close', 'volume', 'minutes', 'last_minute')
+
+    def __init__(self, start: float):
+        self.start = start
+        self.minutes = 0  # сколько закрытых минутных свечей уже учтено
+        self.last_minute = -1.0
+
+    def add(self, row: Sequence[float]):
+        if row[0] <= self.last_minute:
+            return  # повтор уже учтённой минуты
+        self.last_minute = row[0]
+        if self.minutes == 0:
+            self.open, self.high, self.low = row[1], row[2], row[3]
+            self.volume = 0.0
+        else:
+            self.high = max(self.high, row[2])
+            self.low = min(self.low, row[3])
+        self.close = row[4]
+        self.volume += row[5]
+        self.minutes += 1
+
+    def merged(self, forming: Optional[Sequence[float]]) -> List[float]:
+        """Бар с учётом текущей незакрытой минутной свечи"""
+        if forming is None:
+            return [self.start, self.open, self.high, self.low, self.close, self.volume]
+        if self.minutes == 0:
+            return [self.start, forming[1], forming[2], forming[3], forming[4], forming[5]]
+        return [
+            self.start, self.open,
+            max(self.high, forming[2]), min(self.low, forming[3]),
+            forming[4], self.volume + forming[5]
+        ]
+
+class CandleResampler:
+    """Строит свечи старших таймфреймов из минутного ряда инкрементально.
+
+    Границы баров выровнены по UTC от эпохи, как на бирже: 5m начинаются
+    в :00, :05, ..., 1h — в начале часа, 1d — в 00:00 UTC.
+    """
+
+    def __init__(self, capacity: int = 200, base_capacity: int = 300):
+        self.capacity = capacity
+        self.base_capacity = base_capacity  # минуток должно хватать на текущий бар старшего таймфрейма
+        self._base: Dict[str, OHLCVSeries] = {}
+        self._series: Dict[Tuple[str, str], OHLCVSeries] = {}
+        self._buckets: Dict[Tuple[str, str], _Bucket] = {}
+        self._callbacks: Dict[Tuple[str, str], List[BarCallback]] = {}
+        self._listeners: List[KlineListener] = []
+
+    def subscribe(self, symbol: str, interval: str, indicators: Sequence[str] = (),
+                  capacity: Optional[int] = None, callback: Optional[BarCallback] = None) -> OHLCVSeries:
+        """Возвращает ряд таймфрейма, создавая его при первой подписке"""
+        key = (symbol, interval)
+        if symbol not in self._base:
+            self._base[symbol] = OHLCVSeries(self.base_capacity)
+        if interval == BASE_INTERVAL:
+            series = self._base[symbol]
+        else:
+            series = self._series.get(key)
+            capacity = capacity or self.capacity
+            if series is None or series.capacity < capacity:
+                series = self._series[key] = OHLCVSeries(capacity, indicators)
+        for name in indicators:
+            series.add_indicator(name)
+        if callback is not None:
+            self._callbacks.setdefault(key, []).append(callback)
+        return series
+
+    def add_listener(self, listener: KlineListener):
+        """Подписка на каждое обновление минутной свечи (например, для бумажной торговли)"""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener: KlineListener):
+        if listener in self._listeners:
+            self._listeners.remove(listener)
+
+    def series(self, symbol: str, interval: str) -> Optional[OHLCVSeries]:
+        if interval == BASE_INTERVAL:
+            return self._base.get(symbol)
+        return self._series.get((symbol, interval))
+
+    def symbols(self) -> List[str]:
+        return list(self._base)
+
+    def drop(self, symbol: str):
+        """Забывает все ряды пары"""
+        self._base.pop(symbol, None)
+        for table in (self._series, self._buckets, self._callbacks):
+            for key in [key for key in table if key[0] == symbol]:
+                del table[key]
+
+    def intervals(self, symbol: str) -> List[str]:
+        return [interval for (sym, interval) in self._series if sym == symbol]
+
+    def seed_base(self, symbol: str, klines: Sequence[Sequence[Any]]):
+        """Загружает историю минутных свечей (последняя может быть незакрытой)"""
+        base = self._base.setdefault(symbol, OHLCVSeries(self.base_capacity))
+        base.load(klines)
+
+    def seed(self, symbol: str, interval: str, klines: Sequence[Sequence[Any]]):
+        """Загружает историю таймфрейма с биржи и достраивает текущий бар из минуток"""
+        key = (symbol, interval)
+        series = self._series.get(key) or self.subscribe(symbol, interval)
+        period_ms = interval_to_seconds(interval) * 1000
+        # Последний бар с биржи может быть незакрытым — собираем его сами из минуток
+        series.load(klines[:-1])
+        next_start = series.last('timestamp') + period_ms if len(series) else None
+        self._buckets.pop(key, None)
+
+        base = self._base.get(symbol)
+        if base is None or not len(base):
+            return
+        if next_start is not None and base.last('timestamp', len(base)) > next_start:
+            logger.warning(f"Минутной истории {symbol} не хватает для бара {interval}")
+        rows = base.ohlcv()
+        for i, row in enumerate(rows):
+            if next_start is None or row[0] >= next_start:
+                self._apply(key, series, period_ms, row.tolist(), confirmed=i < len(rows) - 1)
+
+    def on_kline(self, symbol: str, row: Sequence[float], confirmed: bool):
+        """Обновление минутной свечи: [start_ms, open, high, low, close, volume]"""
+        base = self._base.get(symbol)
+        if base is None:
+            return
+        base.upsert(row)
+        for listener in self._listeners:
+            listener(symbol, row, confirmed)
+        for interval in self.intervals(symbol):
+            key = (symbol, interval)
+            period_ms = interval_to_seconds(interval) * 1000
+            self._apply(key, self._series[key], period_ms, row, confirmed)
+
+    def _apply(self, key: Tuple[str, str], series: OHLCVSeries, period_ms: int,
+               row: Sequence[float], confirmed: bool):
+        start = row[0] - row[0] % period_ms
+        if len(series) and start < series.last('timestamp'):
+            return  # запоздавшая минута уже закрытого бара
+        bucket = self._buckets.get(key)
+        if bucket is None or bucket.start != start:
+            bucket = self._buckets[key] = _Bucket(start)
+        if confirmed:
+            bucket.add(row)
+            series.upsert(bucket.merged(None))
+            if row[0] + BASE_MS >= start + period_ms:
+                self._notify(key, series)
+        else:
+            series.upsert(bucket.merged(row))
+
+    def _notify(self, key: Tuple[str, str], series: OHLCVSeries):
+        for callback in self._callbacks.get(key, ()):
+            try:
+                callback(key[0], key[1], series)
+            except Exception as e:
+                logger.error(f"Ошибка подписчика {key}: {e}", exc_info=True)
+
+class MarketData:
+    """Единый источник свечей: один минутный поток на пару для всех таймфреймов и стратегий"""
+
+    def __init__(self, api, stream=None, capacity: int = 200, poll_interval: float = 5.0,
+                 clock: Callable[[], float] = time.time):
+        self.api = api
+        self.stream = stream
+        self.resampler = CandleResampler(capacity)
+        self.poll_interval = poll_interval
+        self.clock = clock
+        self._seeded: Dict[Tuple[str, str], int] = {}
+        self._last_poll: Dict[str, float] = {}
+        self._refs: Dict[str, int] = {}  # число запусков стратегий на паре
+
+    def track(self, symbol: str):
+        """Пара нужна запущенной стратегии; поток свечей откроется при первом запросе ряда"""
+        self._refs[symbol] = self._refs.get(symbol, 0) + 1
+
+    async def untrack(self, symbol: str):
+        """Стратегия ушла с пары; после последней отписываемся от потока и забываем ряды"""
+        refs = self._refs.get(symbol, 0) - 1
+        if refs > 0:
+            self._refs[symbol] = refs
+            return
+        self._refs.pop(symbol, None)
+        if self._last_poll.pop(symbol, None) is not None and self.stream is not None:
+            await self.stream.unsubscribe(f"kline.1.{symbol}", self._on_stream_kline)
+        for key in [key for key in self._seeded if key[0] == symbol]:
+            del self._seeded[key]
+        self.resampler.drop(symbol)
+
+    async def get_series(self, symbol: str, interval: str, limit: int = 100,
+                         indicators: Sequence[str] = ()) -> OHLCVSeries:
+        """Актуальный ряд таймфрейма; история с биржи загружается один раз"""
+        await self._ensure_symbol(symbol)
+        key = (symbol, interval)
+        series = self.resampler.subscribe(symbol, interval, indicators, capacity=max(limit, self.resampler.capacity))
+        if interval != BASE_INTERVAL and self._seeded.get(key, 0) < limit:
+            klines = await self.api.get_klines(symbol=symbol, interval=interval, limit=limit)
+            self.resampler.seed(symbol, interval, klines)
+            self._seeded[key] = limit
+        if self.stream is None or not self.stream.connected:
+            await self._poll(symbol)
+        return self.resampler.series(symbol, interval)
+
+    async def _ensure_symbol(self, symbol: str):
+        if symbol in self._last_poll:
+            return
+        klines = await self.api.get_klines(
+            symbol=symbol, interval=BASE_INTERVAL, limit=self.resampler.base_capacity
+        )
+        self.resampler.seed_base(symbol, klines)
+        self._last_poll[symbol] = self.clock()
+        if self.stream is not None:
+            await self.stream.subscribe(f"kline.1.{symbol}", self._on_stream_kline)
+
+    async def _poll(self, symbol: str):
+        """Резервный опрос REST без WebSocket: не чаще poll_interval на пару"""
+        now = self.clock()
+        if now - self._last_poll.get(symbol, 0) < self.poll_interval:
+            return
+        self._last_poll[symbol] = now
+        # Забираем все минуты с последней известной, чтобы не потерять закрытые свечи
+        base = self.resampler.series(symbol, BASE_INTERVAL)
+        missed = int((now * 1000 - base.last('timestamp')) // BASE_MS) if len(base) else 0
+        limit = min(max(missed + 1, 2), self.resampler.base_capacity)
+        klines = await self.api.get_klines(symbol=symbol, interval=BASE_INTERVAL, limit=limit)
+        for i, kline in enumerate(klines):
+            self.resampler.on_kline(symbol, [float(x) for x in kline[:6]], confirmed=i < len(klines) - 1)
+
+    def _on_stream_kline(self, message: Dict[str, Any]):
+        symbol = message['topic'].rsplit('.', 1)[-1]
+        for k in message.get('data', ()):
+            row = [float(k['start']), float(k['open']), float(k['high']),
+                   float(k['low']), float(k['close']), float(k['volume'])]
+            self.resampler.on_kline(symbol, row, bool(k.get('confirm')))
@@ -0,0 +1,196 @@
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Пары, движущиеся вместе: лимит экспозиции действует на корзину целиком.
+# Неизвестные пары попадают в общую корзину альткоинов.
+CORRELATION_BUCKETS = {
+    'BTCUSDT': 'majors', 'ETHUSDT': 'majors',
+    'SOLUSDT': 'l1', 'AVAXUSDT': 'l1', 'ADAUSDT': 'l1', 'DOTUSDT': 'l1',
+    'NEARUSDT': 'l1', 'APTUSDT': 'l1', 'SUIUSDT': 'l1', 'TONUSDT': 'l1',
+    'DOGEUSDT': 'meme', '1000PEPEUSDT': 'meme', 'SHIB1000USDT': 'meme',
+    'WIFUSDT': 'meme', '1000BONKUSDT': 'meme',
+}
+DEFAULT_BUCKET = 'alts'
+# Владелец позиций, открытых на счёте не стратегиями бота (вручную или до запуска)
+EXTERNAL_OWNER = 'external'
+
+@dataclass
+class RiskLimits:
+    """Лимиты счёта; экспозиция задаётся в долях капитала (номинал / капитал)"""
+    max_gross_exposure: float = 3.0    # сумма номиналов всех позиций
+    max_symbol_exposure: float = 1.5   # чистый номинал одной пары
+    max_bucket_exposure: float = 2.0   # чистый номинал корзины коррелированных пар
+    max_margin_usage: float = 0.5      # доля капитала в марже
+    max_positions: int = 5
+    min_fill_ratio: float = 0.25       # меньшую часть заявки не выставляем вовсе
+
+class RiskDecision(NamedTuple):
+    quantity: float  # допустимый объём; 0 — заявка отклонена
+    reason: str
+
+class _SymbolExposure:
+    __slots__ = ('bucket', 'net_qty', 'gross_qty', 'price')
+
+    def __init__(self, bucket: str, price: float):
+        self.bucket = bucket
+        self.net_qty = 0.0    # лонги минус шорты
+        self.gross_qty = 0.0  # лонги плюс шорты
+        self.price = price    # последняя цена оценки
+
+class RiskBook:
+    """Экспозиция одного счёта по всем его стратегиям.
+
+    Состояние обновляется инкрементально при открытии и закрытии позиций
+    и при переоценке пары по цене очередной заявки, поэтому проверка
+    заявки — несколько операций со словарями, без запросов к бирже.
+    """
+
+    def __init__(self, limits: RiskLimits):
+        self.limits = limits
+        self.gross = 0.0   # сумма номиналов по последним ценам
+        self.margin = 0.0  # маржа по ценам входа
+        self.buckets: Dict[str, float] = {}  # чистый номинал корзины
+        self.symbols: Dict[str, _SymbolExposure] = {}
+        # (стратегия, пара) -> (объём со знаком, маржа)
+        self.positions: Dict[Tuple[str, str], Tuple[float, float]] = {}
+        self._leverage: Dict[str, int] = {}  # плечо, уже выставленное на бирже
+        self.stats = {'checks': 0, 'rejected': 0, 'reduced': 0, 'last_check_us': 0.0}
+
+    def mark(self, symbol: str, price: float):
+        """Переоценка экспозиции пары по новой цене"""
+        exposure = self.symbols.get(symbol)
+        if exposure is None or price == exposure.price:
+            return
+        delta = price - exposure.price
+        self.gross += exposure.gross_qty * delta
+        self.buckets[exposure.bucket] += exposure.net_qty * delta
+        exposure.price = price
+
+    def check(self, owner: str, symbol: str, side: str, quantity: float, price: float,
+              leverage: float, available: float) -> RiskDecision:
+        """Допустимый объём новой позиции: заявка урезается до ближайшего лимита"""
+        started = time.perf_counter()
+        self.stats['checks'] += 1
+        decision = self._check(owner, symbol, side, quantity, price, leverage, available)
+        if decision.quantity <= 0:
+            self.stats['rejected'] += 1
+            logger.warning(f"Риск: заявка {side} {quantity:g} {symbol} ({owner}) отклонена: {decision.reason}")
+        elif decision.quantity < quantity:
+            self.stats['reduced'] += 1
+            logger.info(f"Риск: объём {symbol} ({owner}) урезан {quantity:g} -> {decision.quantity:g}: {decision.reason}")
+        self.stats['last_check_us'] = (time.perf_counter() - started) * 1e6
+        return decision
+
+    def _check(self, owner: str, symbol: str, side: str, quantity: float, price: float,
+               leverage: float, available: float) -> RiskDecision:
+        limits = self.limits
+        if quantity <= 0 or price <= 0:
+            return RiskDecision(0.0, 'нулевой объём')
+        if (owner, symbol) not in self.positions and len(self.positions) >= limits.max_positions:
+            return RiskDecision(0.0, f'открыто {len(self.positions)} позиций из {limits.max_positions}')
+        self.mark(symbol, price)
+
+        # Капитал — свободные средства плюс маржа уже открытых позиций
+        equity = available + self.margin
+        sign = 1.0 if side.lower() == 'buy' else -1.0
+        exposure = self.symbols.get(symbol)
+        symbol_net = exposure.net_qty * price if exposure is not None else 0.0
+        bucket = exposure.bucket if exposure is not None else CORRELATION_BUCKETS.get(symbol, DEFAULT_BUCKET)
+        # Встречная позиция уменьшает чистую экспозицию пары и корзины, но не суммарную
+        headroom = (
+            (limits.max_gross_exposure * equity - self.gross, 'суммарная экспозиция'),
+            (limits.max_symbol_exposure * equity - sign * symbol_net, f'экспозиция {symbol}'),
+            (limits.max_bucket_exposure * equity - sign * self.buckets.get(bucket, 0.0), f'корзина {bucket}'),
+            ((limits.max_margin_usage * equity - self.margin) * leverage, 'маржа'),
+        )
+        notional = quantity * price
+        allowed, reason = min(headroom)
+        if allowed >= notional:
+            return RiskDecision(quantity, 'ok')
+        if allowed < notional * limits.min_fill_ratio:
+            return RiskDecision(0.0, f'лимит: {reason}')
+        return RiskDecision(allowed / price, f'лимит: {reason}')
+
+    def on_open(self, owner: str, symbol: str, side: str, quantity: float, price: float, leverage: float):
+        """Учёт открытой позиции; повторное открытие заменяет прежнюю"""
+        key = (owner, symbol)
+        if key in self.positions:
+            self.on_close(owner, symbol)
+        exposure = self.symbols.get(symbol)
+        if exposure is None:
+            bucket = CORRELATION_BUCKETS.get(symbol, DEFAULT_BUCKET)
+            exposure = self.symbols[symbol] = _SymbolExposure(bucket, price)
+            self.buckets.setdefault(bucket, 0.0)
+        else:
+            self.mark(symbol, price)
+        signed = quantity if side.lower() == 'buy' else -quantity
+        margin = quantity * price / leverage
+        exposure.net_qty += signed
+        exposure.gross_qty += quantity
+        self.gross += quantity * price
+        self.buckets[exposure.bucket] += signed * price
+        self.margin += margin
+        self.positions[key] = (signed, margin)
+
+    def on_close(self, owner: str, symbol: str):
+        position = self.positions.pop((owner, symbol), None)
+        if position is None:
+            return
+        signed, margin = position
+        exposure = self.symbols[symbol]
+        exposure.net_qty -= signed
+        exposure.gross_qty -= abs(signed)
+        self.gross -= abs(signed) * exposure.price
+        self.buckets[exposure.bucket] -= signed * exposure.price
+        self.margin -= margin
+        if not any(key[1] == symbol for key in self.positions):
+            del self.symbols[symbol]
+        if not self.positions:
+            # Сбрасываем накопленную погрешность сумм
+            self.gross = self.margin = 0.0
+            self.buckets.clear()
+
+    def release(self, owner: str):
+        """Забываем позиции остановленной стратегии"""
+        for key in [key for key in self.positions if key[0] == owner]:
+            self.on_close(*key)
+
+    async def ensure_leverage(self, api, symbol: str, leverage: int):
+        """Плечо выставляется на бирже один раз на пару, а не перед каждой заявкой"""
+        if self._leverage.get(symbol) == leverage:
+            return
+        try:
+            await api.set_leverage(symbol, leverage)
+        except Exception as e:
+            # Bybit отвечает ошибкой, если плечо уже такое
+            if 'not modified' not in str(e).lower():
+                raise
+        self._leverage[symbol] = leverage
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'positions': len(self.positions),
+            'gross': self.gross,
+            'margin': self.margin,
+            'buckets': {name: value for name, value in self.buckets.items() if value},
+        }
+
+class RiskEngine:
+    """Предторговые проверки движка: отдельная книга экспозиции на каждый счёт"""
+
+    def __init__(self, limits: Optional[RiskLimits] = None):
+        self.limits = limits or RiskLimits()
+        self.books: Dict[str, RiskBook] = {}
+
+    def book(self, account: str) -> RiskBook:
+        book = self.books.get(account)
+        if book is None:
+            book = self.books[account] = RiskBook(self.limits)
+        return book
+
+    def drop(self, account: str):
+        self.books.pop(account, None)
@@ -0,0 +1,85 @@
+import time
+import zlib
+import logging
+from typing import Callable, Dict, Hashable, NamedTuple, Optional
+from utils import interval_to_seconds
+
+logger = logging.getLogger(__name__)
+
+class Wakeup(NamedTuple):
+    delay: float          # сколько спать до пробуждения
+    exits_only: bool      # внутрисвечная проверка только на выход
+    candle_close: float   # время закрытия свечи, к которой относится пробуждение
+
+class CandleScheduler:
+    """Планировщик, пробуждающий стратегию сразу после закрытия свечи"""
+
+    def __init__(
+        self,
+        interval: str,
+        offset: float = 2.0,
+        jitter: float = 3.0,
+        exit_check_interval: Optional[float] = None,
+        poll_interval: float = 15.0,
+        clock: Callable[[], float] = time.time
+    ):
+        self.interval = interval
+        self.period = interval_to_seconds(interval)
+        self.offset = offset
+        self.jitter = jitter
+        self.exit_check_interval = exit_check_interval
+        self.poll_interval = poll_interval  # период старого опроса, для подсчёта экономии
+        self.clock = clock
+        self.started_at = clock()
+        self._handled_close = 0.0
+        self._fingerprints: Dict[str, Hashable] = {}
+        self.stats = {
+            'wakeups': 0,
+            'evaluations': 0,
+            'exit_checks': 0,
+            'skipped_unchanged': 0,
+        }
+
+    def symbol_jitter(self, symbol: str) -> float:
+        """Детерминированный сдвиг пробуждения для пары, чтобы разнести запросы"""
+        if self.jitter <= 0:
+            return 0.0
+        return (zlib.crc32(symbol.encode('utf-8')) % 1000) / 1000 * self.jitter
+
+    def next_wake(self, symbol: str, has_position: bool = False) -> Wakeup:
+        """Рассчитывает ближайшее пробуждение: закрытие свечи или проверка выхода"""
+        now = self.clock()
+        last_close = (now // self.period) * self.period
+        # Закрытие, которое ещё не обработано (например, сразу после запуска)
+        close = last_close if self._handled_close < last_close else last_close + self.period
+        candle_wake = close + self.offset + self.symbol_jitter(symbol)
+
+        if has_position and self.exit_check_interval:
+            exit_wake = now + self.exit_check_interval
+            if exit_wake < candle_wake:
+                return Wakeup(self.exit_check_interval, True, close)
+
+        return Wakeup(max(0.0, candle_wake - now), False, close)
+
+    def acknowledge(self, wake: Wakeup):
+        """Отмечает пробуждение как успешно обработанное"""
+        self.stats['wakeups'] += 1
+        if wake.exits_only:
+            self.stats['exit_checks'] += 1
+        else:
+            self._handled_close = max(self._handled_close, wake.candle_close)
+
+    def is_fresh(self, key: str, fingerprint: Hashable) -> bool:
+        """Проверяет, изменились ли входные данные с прошлого анализа"""
+        if self._fingerprints.get(key) == fingerprint:
+            self.stats['skipped_unchanged'] += 1
+            return False
+        self._fingerprints[key] = fingerprint
+        self.stats['evaluations'] += 1
+        return True
+
+    def saved_evaluations(self) -> int:
+        """Сколько анализов сэкономлено относительно опроса с фиксированным периодом"""
+        elapsed = self.clock() - self.started_at
+        polled = int(elapsed // self.poll_interval)
+        return max(0, polled - self.stats['evaluations'])
@@ -0,0 +1,203 @@
+import time
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Set
+import numpy as np
+from series import BASE_COLUMNS
+from utils import interval_to_seconds
+
+logger = logging.getLogger(__name__)
+
+class Candidate(NamedTuple):
+    symbol: str
+    strategy: str
+    side: str      # 'buy' или 'sell'
+    score: float   # объём последней закрытой свечи относительно среднего
+    price: float
+
+class SymbolMatrix:
+    """Последние window свечей всех пар одной матрицей (колонка x пара x время).
+
+    Столбцы времени выровнены по общей сетке таймфрейма: последний столбец —
+    текущая (формирующаяся) свеча. Колонки индикаторов выделены заранее,
+    поэтому индикаторы стратегий считаются по всем парам сразу, как по
+    OHLCVSeries одной пары.
+    """
+
+    __slots__ = ('interval', 'period_ms', 'window', 'columns', 'symbols', 'pending', 'end',
+                 '_index', '_rows', '_data')
+
+    def __init__(self, interval: str, window: int = 100, indicators: Sequence[str] = ()):
+        self.interval = interval
+        self.period_ms = interval_to_seconds(interval) * 1000
+        self.window = window
+        self.columns = BASE_COLUMNS + tuple(indicators)
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.columns)}
+        self.symbols: List[str] = []
+        self.pending: Set[str] = set()  # пары без истории: им нужна загрузка всего окна
+        self._rows: Dict[str, int] = {}
+        self._data = np.full((len(self.columns), 0, window), np.nan, dtype=np.float64)
+        self.end = 0  # время открытия последней свечи сетки, мс
+
+    def __len__(self) -> int:
+        return len(self.symbols)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Колонка (пара x время) — представление без копирования"""
+        return self._data[self._index[name]]
+
+    def set_symbols(self, symbols: Sequence[str]):
+        """Меняет состав пар, сохраняя уже загруженные свечи"""
+        data = np.full((len(self.columns), len(symbols), self.window), np.nan, dtype=np.float64)
+        for row, symbol in enumerate(symbols):
+            old = self._rows.get(symbol)
+            if old is not None:
+                data[:, row] = self._data[:, old]
+        kept = set(symbols) & self._rows.keys()
+        self.pending = set(symbols) - (kept - self.pending)
+        self.symbols = list(symbols)
+        self._rows = {symbol: row for row, symbol in enumerate(self.symbols)}
+        self._data = data
+
+    def advance(self, end: int) -> int:
+        """Сдвигает сетку так, чтобы последней была свеча end; возвращает число новых свечей"""
+        shift = (end - self.end) // self.period_ms if self.end else self.window
+        if shift <= 0:
+            return 0
+        if shift >= self.window:
+            self._data.fill(np.nan)
+            self.pending = set(self.symbols)
+        else:
+            self._data[..., :-shift] = self._data[..., shift:]
+            self._data[..., -shift:] = np.nan
+        self.end = end
+        return min(shift, self.window)
+
+    def write(self, symbol: str, klines: Sequence[Sequence]):
+        """Раскладывает свечи пары по столбцам сетки по их времени открытия"""
+        row = self._rows.get(symbol)
+        rows = np.asarray(klines, dtype=np.float64)
+        if row is None or rows.ndim != 2 or rows.shape[0] == 0:
+            return
+        rows = rows[:, :len(BASE_COLUMNS)]
+        cols = (rows[:, 0] - self.end) // self.period_ms + self.window - 1
+        inside = (cols >= 0) & (cols < self.window)
+        self._data[:len(BASE_COLUMNS), row, cols[inside].astype(np.intp)] = rows[inside].T
+        self.pending.discard(symbol)
+
+    def complete(self, bars: int) -> np.ndarray:
+        """Маска пар, у которых есть все последние bars свечей"""
+        return ~np.isnan(self['close'][:, -bars:]).any(axis=1)
+
+class Screener:
+    """Векторный скан всего рынка на условия входа стратегий.
+
+    Пары одного таймфрейма хранятся в одной SymbolMatrix, индикаторы и
+    условия входа считаются одним проходом NumPy по всем парам. Между
+    сканами догружаются только свечи, появившиеся после прошлого скана.
+    """
+
+    def __init__(self, api, strategies: Dict[str, Any], window: int = 100, concurrency: int = 10,
+                 universe_ttl: float = 3600.0, clock: Callable[[], float] = time.time):
+        self.api = api
+        self.window = window
+        self.concurrency = concurrency
+        self.universe_ttl = universe_ttl
+        self.clock = clock
+        # Экземпляры стратегий служат только источником параметров и условий
+        self.strategies = {name: cls(None) for name, cls in strategies.items()}
+        self.matrices: Dict[str, SymbolMatrix] = {}
+        for strategy in self.strategies.values():
+            matrix = self.matrices.get(strategy.interval)
+            indicators = tuple(matrix.columns[len(BASE_COLUMNS):]) if matrix else ()
+            indicators += tuple(name for name in strategy.indicators if name not in indicators)
+            self.matrices[strategy.interval] = SymbolMatrix(strategy.interval, window, indicators)
+        self.universe: List[str] = []
+        self._universe_at = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self.stats = {'scans': 0, 'requests': 0, 'last_refresh_ms': 0.0, 'last_scan_ms': 0.0}
+
+    def set_universe(self, symbols: Sequence[str]):
+        """Фиксированный список пар вместо всех контрактов биржи"""
+        self.universe = list(symbols)
+        self._universe_at = float('inf')
+        for matrix in self.matrices.values():
+            matrix.set_symbols(self.universe)
+
+    async def _load_universe(self):
+        if self.clock() - self._universe_at < self.universe_ttl:
+            return
+        symbols = await self.api.get_symbols()
+        self.stats['requests'] += 1
+        self.universe = sorted(symbols)
+        self._universe_at = self.clock()
+        for matrix in self.matrices.values():
+            matrix.set_symbols(self.universe)
+        logger.info(f"Скринер: {len(self.universe)} пар")
+
+    async def refresh(self):
+        """Догружает свечи, появившиеся с прошлого обновления"""
+        started = time.perf_counter()
+        await self._load_universe()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(matrix: SymbolMatrix, symbol: str, limit: int):
+            async with semaphore:
+                try:
+                    klines = await self.api.get_klines(symbol=symbol, interval=matrix.interval, limit=limit)
+                    self.stats['requests'] += 1
+                except Exception as e:
+                    logger.warning(f"Скринер: не удалось получить свечи {symbol} {matrix.interval}: {e}")
+                    # Пропущенные свечи догрузятся только вместе со всем окном
+                    matrix.pending.add(symbol)
+                    return
+                matrix.write(symbol, klines)
+
+        now_ms = int(self.clock() * 1000)
+        jobs = []
+        for matrix in self.matrices.values():
+            end = now_ms - now_ms % matrix.period_ms
+            # +1: прошлая формирующаяся свеча уже закрылась и должна быть перечитана
+            limit = min(matrix.window, matrix.advance(end) + 1)
+            jobs.extend(
+                fetch(matrix, symbol, matrix.window if symbol in matrix.pending else limit)
+                for symbol in matrix.symbols
+            )
+        await asyncio.gather(*jobs)
+        self.stats['last_refresh_ms'] = (time.perf_counter() - started) * 1000
+
+    def scan(self, strategy_names: Optional[Sequence[str]] = None) -> List[Candidate]:
+        """Условия входа по всем парам сразу; кандидаты по убыванию силы сигнала"""
+        started = time.perf_counter()
+        candidates: List[Candidate] = []
+        for name in strategy_names or self.strategies:
+            strategy = self.strategies[name]
+            matrix = self.matrices[strategy.interval]
+            if not len(matrix):
+                continue
+            strategy.calculate_indicators(matrix)
+            # Последний столбец сетки — формирующаяся свеча: сигналы ищем на закрытой
+            long, short = strategy.entry_conditions(matrix, offset=2)
+            complete = matrix.complete(strategy.min_bars)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                score = matrix['volume'][:, -2] / matrix['volume_ma'][:, -2]
+            price = matrix['close'][:, -1]
+            for side, mask in (('buy', long), ('sell', short)):
+                for row in np.flatnonzero(mask & complete):
+                    candidates.append(Candidate(
+                        matrix.symbols[row], name, side, float(score[row]), float(price[row])
+                    ))
+        candidates.sort(key=lambda c: c.score, reverse=True)
+        self.stats['scans'] += 1
+        self.stats['last_scan_ms'] = (time.perf_counter() - started) * 1000
+        return candidates
+
+    async def screen(self, strategy_names: Optional[Sequence[str]] = None,
+                     top: Optional[int] = None) -> List[Candidate]:
+        """Обновление данных и скан; параллельные вызовы не дублируют загрузку"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            await self.refresh()
+            candidates = self.scan(strategy_names)
+        return candidates[:top] if top else candidates
@@ -0,0 +1,110 @@
+import numpy as np
+from typing import Dict, Optional, Sequence
+
+BASE_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+
+class OHLCVSeries:
+    """Компактный ряд свечей на непрерывном float64-массиве с колонками индикаторов.
+
+    Все колонки лежат в одной матрице (колонка x время), под хранилище
+    выделено вдвое больше места, чем capacity: новые свечи дописываются в
+    конец, а сдвиг окна происходит один раз на capacity добавлений.
+    """
+
+    __slots__ = ('capacity', 'columns', '_index', '_data', '_start', '_length')
+
+    def __init__(self, capacity: int = 200, indicators: Sequence[str] = ()):
+        self.capacity = capacity
+        self.columns = BASE_COLUMNS + tuple(indicators)
+        self._index: Dict[str, int] = {name: i for i, name in enumerate(self.columns)}
+        self._data = np.full((len(self.columns), capacity * 2), np.nan, dtype=np.float64)
+        self._start = 0
+        self._length = 0
+
+    @classmethod
+    def from_klines(cls, klines: Sequence[Sequence], indicators: Sequence[str] = (),
+                    capacity: Optional[int] = None) -> 'OHLCVSeries':
+        series = cls(capacity or max(len(klines), 1), indicators)
+        series.load(klines)
+        return series
+
+    def __len__(self) -> int:
+        return self._length
+
+    def load(self, klines: Sequence[Sequence]):
+        """Перезаписывает ряд свечами [timestamp, open, high, low, close, volume]"""
+        rows = np.asarray(klines, dtype=np.float64)
+        if rows.ndim != 2 or rows.shape[0] == 0:
+            self._start = self._length = 0
+            return
+        rows = rows[-self.capacity:, :len(BASE_COLUMNS)]
+        n = rows.shape[0]
+        self._start = 0
+        self._length = n
+        self._data[:len(BASE_COLUMNS), :n] = rows.T
+        self._data[len(BASE_COLUMNS):, :n] = np.nan
+
+    def append(self, row: Sequence[float]):
+        """Добавляет закрытую свечу, вытесняя самую старую при заполнении"""
+        if self._length == self.capacity:
+            self._start += 1
+            self._length -= 1
+        end = self._start + self._length
+        if end == self._data.shape[1]:
+            # Переносим окно в начало буфера: O(capacity) раз на capacity добавлений
+            self._data[:, :self._length] = self._data[:, self._start:end]
+            self._start = 0
+            end = self._length
+        self._data[:len(BASE_COLUMNS), end] = row[:len(BASE_COLUMNS)]
+        self._data[len(BASE_COLUMNS):, end] = np.nan
+        self._length += 1
+
+    def update_last(self, row: Sequence[float]):
+        """Обновляет незакрытую (последнюю) свечу"""
+        if self._length == 0:
+            self.append(row)
+            return
+        self._data[:len(BASE_COLUMNS), self._start + self._length - 1] = row[:len(BASE_COLUMNS)]
+
+    def upsert(self, row: Sequence[float]):
+        """Обновляет последнюю свечу с тем же timestamp или добавляет новую"""
+        if self._length and self.last('timestamp') == float(row[0]):
+            self.update_last(row)
+        else:
+            self.append(row)
+
+    def add_indicator(self, name: str):
+        """Добавляет колонку индикатора (перевыделяет хранилище, вызывать при настройке)"""
+        if name in self._index:
+            return
+        extra = np.full((1, self._data.shape[1]), np.nan, dtype=np.float64)
+        self._data = np.vstack([self._data, extra])
+        self.columns = self.columns + (name,)
+        self._index[name] = len(self.columns) - 1
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        """Представление колонки без копирования; индикаторы пишут в него через out="""
+        return self._data[self._index[name], self._start:self._start + self._length]
+
+    def last(self, name: str, offset: int = 1) -> float:
+        """Значение колонки в offset-й с конца свече (1 — последняя)"""
+        return float(self._data[self._index[name], self._start + self._length - offset])
+
+    def ohlcv(self) -> np.ndarray:
+        """Представление базовых колонок в виде (время x 6) без копирования"""
+        return self._data[:len(BASE_COLUMNS), self._start:self._start + self._length].T
+
+    def row(self, offset: int = 1) -> Dict[str, float]:
+        """Все колонки offset-й с конца свечи в виде словаря"""
+        values = self._data[:, self._start + self._length - offset].tolist()
+        return dict(zip(self.columns, values))
+
+    def to_pandas(self):
+        """DataFrame-представление поверх тех же массивов (для отладки)"""
+        import pandas as pd
+        view = self._data[:, self._start:self._start + self._length]
+        return pd.DataFrame(view.T, columns=list(self.columns), copy=False)
+
+    @property
+    def nbytes(self) -> int:
+        return self._data.nbytes
@@ -0,0 +1,285 @@
+import time
+import numpy as np
+from typing import Optional, Tuple, Dict, Any
+from dataclasses import dataclass
+from trading import BybitAPI
+from scheduler import CandleScheduler
+from series import OHLCVSeries
+from resampler import MarketData
+from orderbook import OrderBooks
+from risk import RiskBook
+from models import OrderResult
+from db import add_trade, close_trade
+from utils import interval_to_seconds, log_trade_entry, log_trade_exit, params_hash
+
+@dataclass
+class TradeSignal:
+    action: str  # 'buy', 'sell', 'hold'
+    price: float
+    volume: float
+    reason: str
+
+class BaseStrategy:
+    """Общая часть стратегий: данные, стакан, риск, заявки и учёт сделок.
+
+    Стратегия задаёт только таймфрейм, индикаторы (calculate_indicators),
+    условия входа (entry_conditions) и выхода (exit_conditions). Условия
+    считаются по offset-й с конца свече OHLCVSeries или по всем парам
+    SymbolMatrix скринера сразу, поэтому пишутся через индексы [..., -offset].
+    """
+
+    name = ''       # название стратегии в БД
+    log_name = ''   # и в журнале сделок
+    interval = '5m'
+    indicators: Tuple[str, ...] = ()  # колонки, под которые заранее выделяется место в OHLCVSeries
+    min_bars = 50  # меньше свечей — индикаторы ещё не прогреты
+    take_profit = 0.02  # TP и SL от цены сигнала
+    stop_loss = 0.01
+    # Причины сигналов: вход по стороне заявки, выход по стороне позиции
+    entry_reasons = {'buy': '', 'sell': ''}
+    exit_reasons = {'long': '', 'short': ''}
+    # Параметры, которые можно менять на ходу через apply_config, и их типы
+    PARAMS = {'risk_per_trade': float, 'leverage': int, 'max_slippage_bps': float}
+
+    def __init__(self, api: BybitAPI, risk_per_trade: float = 0.01, leverage: int = 5):
+        self.position: Optional[str] = None
+        self.api = api
+        self.risk_per_trade = risk_per_trade
+        self.leverage = leverage
+        self.current_trade_id: Optional[int] = None
+        self.position_qty = 0.0  # объём открытой позиции: выход закрывает её целиком
+        # Лимитная заявка на вход, ещё не исполненная: (order_id, сторона, объём, цена)
+        self.pending_order: Optional[Tuple[str, str, float, float]] = None
+        self.scheduler: Optional[CandleScheduler] = None
+        self.market_data: Optional[MarketData] = None
+        self.order_books: Optional[OrderBooks] = None
+        self.max_slippage_bps = 10.0  # Допустимое проскальзывание рыночной заявки
+        self.mode = 'live'  # 'paper' — сделки пишутся в БД с пометкой бумажной торговли
+        self.run_id = 'live'
+        self.user_id = 0  # владелец сделок в БД
+        self.risk_book: Optional[RiskBook] = None  # экспозиция счёта по всем его стратегиям
+        self._series: Dict[str, OHLCVSeries] = {}
+
+    # --- Что задаёт стратегия ---
+
+    def calculate_indicators(self, series: OHLCVSeries) -> OHLCVSeries:
+        raise NotImplementedError
+
+    def entry_conditions(self, data, offset: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Условия входа в лонг и шорт на offset-й с конца свече (1 — последняя)"""
+        raise NotImplementedError
+
+    def exit_conditions(self, data, offset: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Условия выхода из лонга и из шорта на offset-й с конца свече"""
+        raise NotImplementedError
+
+    def validate_params(self, values: Dict[str, Any]):
+        """Проверка новых параметров вместе с текущими; ValueError — не применять"""
+
+    def calculate_position_size(self, price: float, balance: float) -> float:
+        risk_amount = balance * self.risk_per_trade * self.leverage
+        return risk_amount / price
+
+    # --- Данные и анализ ---
+
+    async def fetch_data(self, symbol: str, interval: Optional[str] = None, limit: int = 100) -> OHLCVSeries:
+        interval = interval or self.interval
+        if self.market_data is not None:
+            # Общий минутный поток, старшие таймфреймы собираются локально
+            return await self.market_data.get_series(symbol, interval, limit, self.indicators)
+        klines = await self.api.get_klines(symbol=symbol, interval=interval, limit=limit)
+        series = self._series.get(symbol)
+        if series is None or series.capacity < limit:
+            series = self._series[symbol] = OHLCVSeries(limit, self.indicators)
+        series.load(klines)
+        return series
+
+    def apply_config(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        """Меняет параметры на ходу: всё проверяется до первого изменения.
+
+        Свечи и колонки индикаторов не сбрасываются — индикаторы и так
+        пересчитываются по всему окну на каждом анализе. Возвращает прежние значения.
+        """
+        unknown = set(params) - self.PARAMS.keys()
+        if unknown:
+            raise ValueError(f"Неизвестные параметры: {', '.join(sorted(unknown))}")
+        values = {name: self.PARAMS[name](value) for name, value in params.items()}
+        if any(value <= 0 for value in values.values()):
+            raise ValueError("Параметры должны быть положительными")
+        if not 2 <= values.get('leverage', self.leverage) <= 10:
+            raise ValueError("Leverage must be between 2x and 10x")
+        self.validate_params(values)
+        previous = {name: getattr(self, name) for name in values}
+        for name, value in values.items():
+            setattr(self, name, value)
+        return previous
+
+    def _closed_offset(self, series: OHLCVSeries) -> int:
+        """Смещение последней закрытой свечи: 2, если последняя в ряду ещё формируется"""
+        now = self.scheduler.clock() if self.scheduler is not None else time.time()
+        period_ms = interval_to_seconds(self.interval) * 1000
+        return 2 if series.last('timestamp') + period_ms > now * 1000 else 1
+
+    def _data_changed(self, symbol: str, series: OHLCVSeries, offset: int = 1) -> bool:
+        """Пропускаем анализ, если анализируемая свеча не изменилась"""
+        if self.scheduler is None:
+            return True
+        return self.scheduler.is_fresh(symbol, (
+            series.last('timestamp', offset), series.last('close', offset), series.last('volume', offset)
+        ))
+
+    async def analyze(self, symbol: str, balance: float, exits_only: bool = False) -> TradeSignal:
+        series = await self.fetch_data(symbol)
+        if len(series) < self.min_bars:
+            return TradeSignal('hold', 0, 0, 'Not enough data')
+        # По закрытию свечи анализируем её, а не только что открывшуюся с парой
+        # секунд объёма; внутрисвечная проверка выхода смотрит на текущую свечу
+        offset = 1 if exits_only else self._closed_offset(series)
+        if not self._data_changed(symbol, series, offset):
+            return TradeSignal('hold', 0, 0, 'Data unchanged')
+
+        series = self.calculate_indicators(series)
+        price = series.last('close')
+        position_size = self.calculate_position_size(price, balance)
+
+        if not exits_only:
+            long_entry, short_entry = self.entry_conditions(series, offset)
+            if self.position != 'long' and long_entry:
+                return TradeSignal('buy', price, position_size, self.entry_reasons['buy'])
+            if self.position != 'short' and short_entry:
+                return TradeSignal('sell', price, position_size, self.entry_reasons['sell'])
+
+        if self.position is not None:
+            long_exit, short_exit = self.exit_conditions(series, offset)
+            if self.position == 'long' and long_exit:
+                return TradeSignal('sell', price, position_size, self.exit_reasons['long'])
+            if self.position == 'short' and short_exit:
+                return TradeSignal('buy', price, position_size, self.exit_reasons['short'])
+
+        return TradeSignal('hold', 0, 0, 'No trading conditions met')
+
+    # --- Исполнение ---
+
+    def _book_guard(self, symbol: str, side: str, quantity: float, price: float) -> Tuple[float, Optional[float]]:
+        """Сверяем объём с глубиной стакана: урезаем его или переходим на лимитную заявку"""
+        book = self.order_books.get(symbol) if self.order_books is not None else None
+        if book is None or not book.valid:
+            return quantity, price
+        return book.guard_order(side, quantity, self.max_slippage_bps)
+
+    async def _pre_trade(self, symbol: str, side: str, quantity: float, price: float, balance: float) -> float:
+        """Проверка лимитов счёта и однократная установка плеча по паре; 0 — входа не будет"""
+        if self.risk_book is None:
+            return quantity
+        decision = self.risk_book.check(self.run_id, symbol, side, quantity, price, self.leverage, balance)
+        quantity = decision.quantity
+        if quantity > 0:
+            await self.risk_book.ensure_leverage(self.api, symbol, self.leverage)
+        return quantity
+
+    def on_position_closed(self, symbol: str, price: float, profit: Optional[float]):
+        """Позиция закрыта на стороне исполнителя (TP/SL)"""
+        if self.current_trade_id:
+            close_trade(self.current_trade_id, price, profit)
+            log_trade_exit(self.current_trade_id, price, profit)
+        self._forget_position(symbol)
+        self.pending_order = None
+
+    def _forget_position(self, symbol: str):
+        self.position = None
+        self.position_qty = 0.0
+        self.current_trade_id = None
+        if self.risk_book is not None:
+            self.risk_book.on_close(self.run_id, symbol)
+
+    def _record_entry(self, symbol: str, side: str, quantity: float, price: float, fee: Optional[float] = None):
+        """Позиция открыта: учитываем её в книге риска и в БД вместе с комиссией входа"""
+        self.position = 'long' if side == 'buy' else 'short'
+        self.position_qty = quantity
+        if self.risk_book is not None:
+            self.risk_book.on_open(self.run_id, symbol, side, quantity, price, self.leverage)
+        self.current_trade_id = add_trade(
+            strategy=self.name,
+            symbol=symbol,
+            entry_price=price,
+            volume=quantity,
+            side=side,
+            leverage=self.leverage,
+            mode=self.mode,
+            user_id=self.user_id,
+            run_id=self.run_id,
+            params_hash=params_hash({name: getattr(self, name) for name in self.PARAMS}),
+            fee=fee
+        )
+        log_trade_entry(self.log_name, symbol, price, quantity, self.leverage)
+
+    def _on_order(self, symbol: str, side: str, result: OrderResult, quantity: float,
+                  order_price: Optional[float], price: float):
+        """Рыночная или сразу исполненная заявка — позиция; лимитная в стакане — ждём исполнения"""
+        if order_price is None or result.status == 'Filled':
+            self._record_entry(symbol, side, quantity, result.avg_price or order_price or price, result.fee)
+        else:
+            self.pending_order = (result.order_id, side, quantity, order_price)
+
+    async def _check_pending(self, symbol: str):
+        """Лимитная заявка на вход исполнилась, если на счёте появилась позиция её стороны"""
+        order_id, side, quantity, price = self.pending_order
+        for position in await self.api.get_positions(symbol):
+            if position.size > 0 and position.side.lower() == side:
+                self.pending_order = None
+                self._record_entry(symbol, side, quantity, position.entry_price or price)
+                return
+
+    async def _close(self, symbol: str, side: str, signal: TradeSignal):
+        """Выход по сигналу: закрываем позицию встречной заявкой side.
+
+        В сделку пишется цена и комиссия исполнения, а не цена сигнала: у
+        бумажного счёта они уже учитывают задержку и проскальзывание.
+        """
+        result = await self.api.close_position(symbol, side.capitalize(), self.position_qty or signal.volume)
+        price = result.avg_price or signal.price
+        close_trade(self.current_trade_id, price, None, fee=result.fee)
+        log_trade_exit(self.current_trade_id, price, None)
+        self._forget_position(symbol)
+
+    async def execute_trade(self, symbol: str, balance: float, exits_only: bool = False):
+        if self.pending_order is not None:
+            await self._check_pending(symbol)
+        signal = await self.analyze(symbol, balance, exits_only)
+
+        if signal.action == 'hold':
+            return
+
+        if self.pending_order is not None:
+            if signal.action == self.pending_order[1]:
+                return  # заявка на вход ещё в стакане
+            # Сигнал развернулся: неисполненный вход больше не нужен
+            await self.api.cancel_orders(symbol)
+            self.pending_order = None
+
+        side = signal.action
+        if self.position == ('short' if side == 'buy' else 'long') and self.current_trade_id:
+            await self._close(symbol, side, signal)
+
+        if exits_only:
+            return
+
+        # Для шорта TP ниже цены, SL выше
+        sign = 1 if side == 'buy' else -1
+        tp_price = signal.price * (1 + sign * self.take_profit)
+        sl_price = signal.price * (1 - sign * self.stop_loss)
+
+        quantity, order_price = self._book_guard(symbol, side, signal.volume, signal.price)
+        quantity = await self._pre_trade(symbol, side, quantity, signal.price, balance)
+        if quantity <= 0:
+            return
+        result = await self.api.place_order(
+            symbol=symbol,
+            side=side,
+            quantity=quantity,
+            price=order_price,
+            take_profit=tp_price,
+            stop_loss=sl_price,
+            leverage=self.leverage
+        )
+        self._on_order(symbol, side, result, quantity, order_price, signal.price)
@@ -1,206 +1,88 @@
 import numpy as np
-import pandas as pd
-from typing import Optional, Tuple, Dict, Any
-from dataclasses import dataclass
+from typing import Tuple
+from strategy_base import BaseStrategy, TradeSignal
 from trading import BybitAPI
-from db import add_trade, close_trade
-from utils import log_trade_entry, log_trade_exit
+from series import OHLCVSeries
+from utils import rolling_mean, rolling_std, rsi, atr, supertrend_direction
 
-@dataclass
-class TradeSignal:
-    action: str  # 'buy', 'sell', 'hold'
-    price: float
-    volume: float
-    reason: str
+# Колонки индикаторов, под которые заранее выделяется место в OHLCVSeries
+INDICATORS = ('bb_mid', 'bb_upper', 'bb_lower', 'rsi', 'supertrend_upper',
+              'supertrend_lower', 'supertrend_direction', 'volume_ma')
+
+class StrategyOne(BaseStrategy):
+    name = 'Strategy 1 (Bollinger)'
+    log_name = 'Strategy 1'
+    interval = '5m'
+    indicators = INDICATORS
+    min_bars = 50  # меньше свечей — индикаторы ещё не прогреты
+    entry_reasons = {
+        'buy': 'Bollinger touch lower + Supertrend UP + RSI >30 + Volume spike',
+        'sell': 'Bollinger touch upper + Supertrend DOWN + RSI <70 + Volume spike',
+    }
+    exit_reasons = {
+        'long': 'Supertrend reversed or price reached middle BB',
+        'short': 'Supertrend reversed or price reached middle BB',
+    }
+    PARAMS = {
+        **BaseStrategy.PARAMS,
+        'bb_period': int, 'bb_std': float, 'rsi_period': int, 'atr_period': int,
+        'supertrend_multiplier': float, 'volume_ma_period': int,
+    }
 
-class StrategyOne:
     def __init__(self, api: BybitAPI, risk_per_trade: float = 0.01, leverage: int = 5):
-        self.position: Optional[str] = None
-        self.api = api
-        self.risk_per_trade = risk_per_trade
-        self.leverage = leverage
+        super().__init__(api, risk_per_trade, leverage)
         self.bb_period = 20
         self.bb_std = 2
         self.rsi_period = 14
         self.atr_period = 10
         self.supertrend_multiplier = 3
         self.volume_ma_period = 20
-        self.current_trade_id: Optional[int] = None
 
-    async def fetch_data(self, symbol: str, interval: str = '5m', limit: int = 100) -> pd.DataFrame:
-        klines = await self.api.get_klines(symbol=symbol, interval=interval, limit=limit)
-        df = pd.DataFrame(klines, columns=[
-            'timestamp', 'open', 'high', 'low', 'close', 'volume'
-        ])
-        return df.astype({
-            'open': float, 'high': float, 'low': float, 
-            'close': float, 'volume': float
-        })
+    def calculate_indicators(self, series: OHLCVSeries) -> OHLCVSeries:
+        close, high, low = series['close'], series['high'], series['low']
 
-    def calculate_indicators(self, df: pd.DataFrame) -> pd.DataFrame:
         # Bollinger Bands
-        rolling_mean = df['close'].rolling(window=self.bb_period).mean()
-        rolling_std = df['close'].rolling(window=self.bb_period).std()
-        df['bb_mid'] = rolling_mean
-        df['bb_upper'] = rolling_mean + (rolling_std * self.bb_std)
-        df['bb_lower'] = rolling_mean - (rolling_std * self.bb_std)
-        
+        bb_mid = rolling_mean(close, self.bb_period, out=series['bb_mid'])
+        bb_width = rolling_std(close, self.bb_period) * self.bb_std
+        np.add(bb_mid, bb_width, out=series['bb_upper'])
+        np.subtract(bb_mid, bb_width, out=series['bb_lower'])
+
         # RSI
-        delta = df['close'].diff()
-        gain = delta.clip(lower=0)
-        loss = -delta.clip(upper=0)
-        avg_gain = gain.rolling(window=self.rsi_period).mean()
-        avg_loss = loss.rolling(window=self.rsi_period).mean()
-        rs = avg_gain / avg_loss
-        df['rsi'] = 100 - (100 / (1 + rs))
-        
+        rsi(close, self.rsi_period, out=series['rsi'])
+
         # Supertrend
-        high_low = df['high'] - df['low']
-        high_close_prev = (df['high'] - df['close'].shift(1)).abs()
-        low_close_prev = (df['low'] - df['close'].shift(1)).abs()
-        tr = pd.concat([high_low, high_close_prev, low_close_prev], axis=1).max(axis=1)
-        atr = tr.rolling(window=self.atr_period).mean()
-        hl2 = (df['high'] + df['low']) / 2
-        df['supertrend_upper'] = hl2 + (self.supertrend_multiplier * atr)
-        df['supertrend_lower'] = hl2 - (self.supertrend_multiplier * atr)
-        
+        band = atr(high, low, close, self.atr_period) * self.supertrend_multiplier
+        hl2 = (high + low) / 2
+        np.add(hl2, band, out=series['supertrend_upper'])
+        np.subtract(hl2, band, out=series['supertrend_lower'])
+
         # Supertrend direction
-        df['supertrend_direction'] = 1
-        for i in range(1, len(df)):
-            if df['close'].iloc[i] > df['supertrend_upper'].iloc[i-1]:
-                df['supertrend_direction'].iloc[i] = 1
-            elif df['close'].iloc[i] < df['supertrend_lower'].iloc[i-1]:
-                df['supertrend_direction'].iloc[i] = -1
-            else:
-                df['supertrend_direction'].iloc[i] = df['supertrend_direction'].iloc[i-1]
-        
+        supertrend_direction(
+            close, series['supertrend_upper'], series['supertrend_lower'],
+            out=series['supertrend_direction']
+        )
+
         # Volume MA
-        df['volume_ma'] = df['volume'].rolling(window=self.volume_ma_period).mean()
-        
-        return df
+        rolling_mean(series['volume'], self.volume_ma_period, out=series['volume_ma'])
+
+        return series
 
-    def calculate_position_size(self, price: float, balance: float) -> float:
-        risk_amount = balance * self.risk_per_trade * self.leverage
-        return risk_amount / price
+    def entry_conditions(self, data, offset: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Условия входа в лонг и шорт на offset-й с конца свече.
 
-    async def analyze(self, symbol: str, balance: float) -> TradeSignal:
-        df = await self.fetch_data(symbol)
-        if len(df) < 50:
-            return TradeSignal('hold', 0, 0, 'Not enough data')
-            
-        df = self.calculate_indicators(df)
-        last = df.iloc[-1]
-        
-        price = last['close']
-        position_size = self.calculate_position_size(price, balance)
-        
-        # Long entry
-        if self.position != 'long':
-            if (last['close'] <= last['bb_lower'] and 
-                last['supertrend_direction'] == 1 and
-                30 < last['rsi'] <= 70 and
-                last['volume'] > last['volume_ma']):
-                
-                return TradeSignal(
-                    'buy', price, position_size,
-                    'Bollinger touch lower + Supertrend UP + RSI >30 + Volume spike'
-                )
-        
-        # Short entry
-        if self.position != 'short':
-            if (last['close'] >= last['bb_upper'] and 
-                last['supertrend_direction'] == -1 and
-                30 <= last['rsi'] < 70 and
-                last['volume'] > last['volume_ma']):
-                
-                return TradeSignal(
-                    'sell', price, position_size,
-                    'Bollinger touch upper + Supertrend DOWN + RSI <70 + Volume spike'
-                )
-        
-        # Exit conditions
-        if self.position == 'long' and (
-            last['supertrend_direction'] == -1 or 
-            last['close'] >= last['bb_mid']
-        ):
-            return TradeSignal(
-                'sell', price, position_size,
-                'Supertrend reversed or price reached middle BB'
-            )
-            
-        if self.position == 'short' and (
-            last['supertrend_direction'] == 1 or 
-            last['close'] <= last['bb_mid']
-        ):
-            return TradeSignal(
-                'buy', price, position_size,
-                'Supertrend reversed or price reached middle BB'
-            )
-        
-        return TradeSignal('hold', 0, 0, 'No trading conditions met')
+        data — OHLCVSeries одной пары или SymbolMatrix скринера: для матрицы
+        возвращаются булевы массивы по всем парам сразу.
+        """
+        i = -offset
+        close, volume, r = data['close'][..., i], data['volume'][..., i], data['rsi'][..., i]
+        direction = data['supertrend_direction'][..., i]
+        volume_spike = volume > data['volume_ma'][..., i]
+        long = (close <= data['bb_lower'][..., i]) & (direction == 1) & (30 < r) & (r <= 70) & volume_spike
+        short = (close >= data['bb_upper'][..., i]) & (direction == -1) & (30 <= r) & (r < 70) & volume_spike
+        return long, short
 
-    async def execute_trade(self, symbol: str, balance: float):
-        signal = await self.analyze(symbol, balance)
-        
-        if signal.action == 'hold':
-            return
-            
-        if signal.action == 'buy':
-            tp_price = signal.price * 1.02  # TP +2%
-            sl_price = signal.price * 0.99  # SL -1%
-            
-            if self.position == 'short' and self.current_trade_id:
-                await self.api.close_position(symbol, 'Buy', signal.volume)
-                close_trade(self.current_trade_id, signal.price, None)
-                log_trade_exit(self.current_trade_id, signal.price, None)
-                self.position = None
-                self.current_trade_id = None
-                
-            await self.api.place_order(
-                symbol=symbol,
-                side='buy',
-                quantity=signal.volume,
-                price=signal.price,
-                take_profit=tp_price,
-                stop_loss=sl_price,
-                leverage=self.leverage
-            )
-            self.position = 'long'
-            self.current_trade_id = add_trade(
-                strategy='Strategy 1 (Bollinger)',
-                symbol=symbol,
-                entry_price=signal.price,
-                volume=signal.volume,
-                leverage=self.leverage
-            )
-            log_trade_entry('Strategy 1', symbol, signal.price, signal.volume, self.leverage)
-            
-        elif signal.action == 'sell':
-            tp_price = signal.price * 0.98  # TP -2% (для шорта)
-            sl_price = signal.price * 1.01  # SL +1% (для шорта)
-            
-            if self.position == 'long' and self.current_trade_id:
-                await self.api.close_position(symbol, 'Sell', signal.volume)
-                close_trade(self.current_trade_id, signal.price, None)
-                log_trade_exit(self.current_trade_id, signal.price, None)
-                self.position = None
-                self.current_trade_id = None
-                
-            await self.api.place_order(
-                symbol=symbol,
-                side='sell',
-                quantity=signal.volume,
-                price=signal.price,
-                take_profit=tp_price,
-                stop_loss=sl_price,
-                leverage=self.leverage
-            )
-            self.position = 'short'
-            self.current_trade_id = add_trade(
-                strategy='Strategy 1 (Bollinger)',
-                symbol=symbol,
-                entry_price=signal.price,
-                volume=signal.volume,
-                leverage=self.leverage
-            )
-            log_trade_entry('Strategy 1', symbol, signal.price, signal.volume, self.leverage)
+    def exit_conditions(self, data, offset: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Выход по развороту Supertrend или по возврату цены к средней линии Боллинджера"""
+        close, mid = data['close'][..., -offset], data['bb_mid'][..., -offset]
+        direction = data['supertrend_direction'][..., -offset]
+        return (direction == -1) | (close >= mid), (direction == 1) | (close <= mid)
@@ -0,0 +1,22 @@
+import os
+import tempfile
+
+import pytest
+
+# db открывает trading_bot.db в текущем каталоге уже при импорте:
+# первый импорт делаем во временном каталоге, чтобы не трогать рабочую БД
+_cwd = os.getcwd()
+os.chdir(tempfile.mkdtemp(prefix='bot-tests-'))
+try:
+    import db as _db
+    _db.DB_NAME = os.path.abspath(_db.DB_NAME)
+finally:
+    os.chdir(_cwd)
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    """Пустая БД во временном каталоге; архивы ложатся рядом с ней"""
+    monkeypatch.setattr(_db, 'DB_NAME', str(tmp_path / 'trading_bot.db'))
+    monkeypatch.setattr(_db, '_archive_checked', None)
+    _db.init_db()
+    return _db
@@ -0,0 +1,68 @@
+import sqlite3
+from contextlib import closing
+from datetime import datetime
+
+import pytest
+
+# (пользователь, стратегия, пара, вход, выход, цена входа, цена выхода, объём, сторона)
+TRADES = [
+    (1, 'strategy_one', 'BTCUSDT', '2026-01-10T10:00:00', '2026-01-10T12:00:00', 100.0, 110.0, 1.0, 'buy'),
+    (1, 'strategy_one', 'ETHUSDT', '2026-01-31T23:00:00', '2026-02-01T01:00:00', 50.0, 45.0, 2.0, 'buy'),
+    (1, 'strategy_two', 'BTCUSDT', '2026-02-15T08:00:00', '2026-02-15T09:30:00', 120.0, 100.0, 0.5, 'sell'),
+    (1, 'strategy_two', 'BTCUSDT', '2026-03-05T08:00:00', '2026-03-05T08:10:00', 100.0, 90.0, 1.0, 'buy'),
+    (2, 'strategy_one', 'BTCUSDT', '2026-01-20T00:00:00', '2026-01-20T06:00:00', 100.0, 130.0, 1.0, 'buy'),
+]
+
+def _fill(db):
+    for user_id, strategy, symbol, entry_time, exit_time, entry, exit_, volume, side in TRADES:
+        trade_id = db.add_trade(strategy, symbol, entry, volume, side=side, user_id=user_id)
+        db.close_trade(trade_id, exit_, fee=0.1)
+        with closing(sqlite3.connect(db.DB_NAME)) as conn, conn:
+            conn.execute('UPDATE trades SET entry_time = ?, exit_time = ? WHERE id = ?',
+                         (entry_time, exit_time, trade_id))
+    # Сводка по подставленным датам закрытия
+    with closing(sqlite3.connect(db.DB_NAME)) as conn, conn:
+        db._rebuild_trade_stats(conn)
+
+def _stats(db, user_id):
+    keys = [(strategy, symbol, day)
+            for strategy in (db.ALL, 'strategy_one', 'strategy_two')
+            for symbol in (db.ALL, 'BTCUSDT', 'ETHUSDT')
+            for day in (db.ALL, '2026-01-10', '2026-02-01', '2026-02-15', '2026-03-05')]
+    return {key: db.get_trade_stats(user_id, *key) for key in keys}
+
+def test_archive_round_trip(db):
+    _fill(db)
+    history = {user_id: db.get_trade_history(user_id) for user_id in (1, 2)}
+    stats = {user_id: _stats(db, user_id) for user_id in (1, 2)}
+
+    assert db.archive_trades(hot_months=1, now=datetime(2026, 4, 15)) == 4
+    assert db._archive_months() == ['2026-01', '2026-02']
+    with closing(sqlite3.connect(db.DB_NAME)) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM trades').fetchone()[0] == 1
+    # Повторный перенос ничего не делает
+    assert db.archive_trades(hot_months=1, now=datetime(2026, 4, 15)) == 0
+
+    for user_id in (1, 2):
+        assert db.get_trade_history(user_id) == history[user_id]
+        assert _stats(db, user_id) == stats[user_id]
+    assert db.get_trade_history(1, limit=2) == history[1][:2]
+    assert db.get_trade_history(1, since='2026-02-01') == [
+        row for row in history[1] if row[db.TRADE_COLUMNS.index('entry_time')] >= '2026-02-01'
+    ]
+
+    # Сводка, пересобранная из основной БД и архивов, совпадает с исходной
+    with closing(sqlite3.connect(db.DB_NAME)) as conn, conn:
+        db._rebuild_trade_stats(conn)
+    for user_id in (1, 2):
+        assert _stats(db, user_id) == stats[user_id]
+
+def test_stats_totals(db):
+    _fill(db)
+    totals = db.get_trade_stats(1)
+    assert totals['trades'] == 4
+    assert totals['wins'] == 2
+    # 10 - 10 + 10 - 10 по ценам, минус комиссия 0.1 за каждую сделку
+    assert totals['net_pnl'] == pytest.approx(-0.4)
+    assert db.get_trade_stats(2)['net_pnl'] == pytest.approx(29.9)
+    assert db.get_trade_stats(3) is None
@@ -0,0 +1,135 @@
+import os
+import queue
+import threading
+import multiprocessing
+import zlib
+from multiprocessing.connection import Connection
+from types import SimpleNamespace
+
+import pytest
+
+from engine_pool import EnginePool
+
+class FakeProcess:
+    """Воркер в потоке этого процесса: канал тот же, что у настоящего"""
+
+    def __init__(self, ctx, target, args, daemon):
+        self.ctx = ctx
+        self.conn = args[0]
+        self.alive = True
+
+    def start(self):
+        conn = Connection(os.dup(self.conn.fileno()))  # родитель закрывает свою копию после start
+        self.ctx.spawned.append(self)
+        threading.Thread(target=self._run, args=(conn,), daemon=True).start()
+
+    def _run(self, conn):
+        try:
+            self.ctx.serve(conn)
+        finally:
+            self.alive = False
+            conn.close()
+
+    def is_alive(self):
+        return self.alive
+
+    def join(self, timeout=None):
+        pass
+
+class FakeContext:
+    Pipe = staticmethod(multiprocessing.Pipe)
+    Queue = queue.Queue
+
+    def __init__(self, *serves):
+        self.serves = list(serves)
+        self.spawned = []
+
+    def Process(self, target, args, daemon):
+        return FakeProcess(self, target, args, daemon)
+
+    def serve(self, conn):
+        serve = self.serves.pop(0) if len(self.serves) > 1 else self.serves[0]
+        serve(conn)
+
+def echo(conn):
+    while (message := conn.recv()) is not None:
+        request_id, user_id, method, kwargs = message
+        if method != 'hang':
+            conn.send((request_id, True, kwargs.get('value'), 1, method == 'start_strategy'))
+
+def make_pool(*serves, **params):
+    pool = EnginePool(workers=1, **params)
+    pool._ctx = FakeContext(*serves)
+    pool.start()
+    return pool
+
+def test_placement_prefers_hash_and_avoids_skew():
+    pool = EnginePool(workers=3)
+    pool._workers = [SimpleNamespace(load=0) for _ in range(3)]
+    users = [u for u in range(100) if zlib.crc32(str(u).encode()) % 3 == 0][:3]
+
+    assert pool.worker_for(users[0]) == 0
+    pool._workers[0].load = 10
+    assert pool.worker_for(users[0]) == 0  # закрепление сохраняется
+    pool._workers[1].load = 2
+    assert pool.worker_for(users[1]) == 2  # предпочтённый перегружен — наименее загруженный
+
+    pool._workers[0].load, pool._workers[2].load = 3, 2
+    assert pool.worker_for(users[2]) == 0  # 3 <= 2 * 1.5 + 1: перекос допустим
+
+def test_replies_are_matched_by_request_id():
+    def reversed_replies(conn):
+        first, second = conn.recv(), conn.recv()
+        for request_id, user_id, method, kwargs in (second, first):
+            conn.send((request_id, True, kwargs['value'], 2, True))
+        echo(conn)
+
+    pool = make_pool(reversed_replies)
+    try:
+        results = {}
+        threads = [
+            threading.Thread(target=lambda v=v: results.setdefault(v, pool._request(0, v, 'get_status', {'value': v})))
+            for v in (1, 2)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert results == {1: (True, 1, True), 2: (True, 2, True)}
+        assert pool.loads() == [2]
+    finally:
+        pool.shutdown()
+
+def test_request_times_out_without_blocking_the_worker():
+    pool = make_pool(echo, request_timeout=0.2)
+    try:
+        with pytest.raises(RuntimeError, match='не ответил'):
+            pool._request(0, 1, 'hang', {})
+        assert pool._request(0, 1, 'get_status', {'value': 'ok'}) == (True, 'ok', False)
+    finally:
+        pool.shutdown()
+
+def test_dead_worker_is_respawned_and_users_are_told():
+    def crash_on_request(conn):
+        while (message := conn.recv()) is not None:
+            request_id, user_id, method, kwargs = message
+            if method == 'crash':
+                return  # процесс умер, не ответив
+            conn.send((request_id, True, True, 1, True))
+
+    lost = []
+    done = threading.Event()
+    pool = make_pool(crash_on_request, echo)
+    pool.on_engines_lost = lambda users: (lost.extend(users), done.set())
+    try:
+        assert pool.start_strategy(7, symbol='BTCUSDT') is True
+        assert pool._placement == {7: 0}
+        with pytest.raises(RuntimeError, match='остановился'):
+            pool._request(0, 7, 'crash', {})
+        assert done.wait(timeout=5)
+        assert lost == [7]
+        assert pool._placement == {}
+        assert len(pool._ctx.spawned) == 2
+        assert pool.get_status(7) is None  # новый воркер отвечает
+    finally:
+        pool.shutdown()
@@ -0,0 +1,82 @@
+import hmac
+import time
+import hashlib
+
+import numpy as np
+import pytest
+
+from exchange_sim import PriceReplay, SimConfig, SimExchange
+
+T0 = 1_767_225_600_000  # мс
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def _candles(closes):
+    opens = [closes[0]] + list(closes[:-1])
+    return np.array([[T0 + 60_000 * i, o, max(o, c) + 1, min(o, c) - 1, c, 10.0]
+                     for i, (o, c) in enumerate(zip(opens, closes))])
+
+def _exchange(closes, **config):
+    clock = Clock(0.0)
+    replay = PriceReplay(_candles(closes), speed=60.0, clock=clock)
+    return SimExchange(SimConfig(**config), {'BTCUSDT': replay}), clock
+
+def test_replay_starts_mid_series_and_aggregates_klines():
+    closes = [100.0 + i for i in range(30)]
+    replay = PriceReplay(_candles(closes), speed=60.0, clock=Clock(0.0))
+    assert replay.position() == 15
+    replay.clock.now = 0.5  # скорость 60: полминуты истории
+    assert replay.price() == pytest.approx(114.5)
+
+    bars = replay.klines(5, limit=2)
+    assert [bar[0] for bar in bars] == [T0 + 10 * 60_000, T0 + 15 * 60_000]
+    # Последняя пятиминутка — одна незакрытая минута
+    assert bars[-1][4] == pytest.approx(114.5) and bars[-1][5] == pytest.approx(5.0)
+    assert bars[0][1] == 109.0 and bars[0][4] == 114.0 and bars[0][5] == 50.0
+
+def test_market_fill_fee_and_take_profit():
+    closes = [100.0] * 20 + [110.0] * 20
+    exchange, clock = _exchange(closes, fee_rate=0.001, initial_balance=1000.0)
+    order = exchange.place_order({'symbol': 'BTCUSDT', 'side': 'buy', 'qty': '2', 'take_profit': '105'})
+    assert order['order_status'] == 'Filled' and order['avg_price'] == 100.0
+    assert exchange.balance == pytest.approx(1000 - 0.2)
+
+    clock.now = 6.0  # шесть минут истории: цена уже 110
+    exchange.match()
+    assert exchange.positions == {}
+    assert exchange.balance == pytest.approx(1000 - 0.2 - 0.21 + 10)
+
+def test_limit_orders_wait_for_price_and_can_be_cancelled():
+    exchange, clock = _exchange([100.0] * 20 + [95.0] * 20)
+    order = exchange.place_order({'symbol': 'BTCUSDT', 'side': 'buy', 'qty': '1',
+                                  'order_type': 'Limit', 'price': '96'})
+    exchange.match()
+    assert order['order_status'] == 'New' and exchange.orders == [order]
+    clock.now = 6.0
+    exchange.match()
+    assert order['order_status'] == 'Filled' and exchange.positions['BTCUSDT']['entry_price'] == 96.0
+
+    other = exchange.place_order({'symbol': 'BTCUSDT', 'side': 'sell', 'qty': '1',
+                                  'order_type': 'Limit', 'price': '200'})
+    assert exchange.cancel_orders('BTCUSDT') == [other['order_id']]
+    # Закрывающая заявка без позиции не открывает встречную
+    exchange.positions.clear()
+    closing = exchange.place_order({'symbol': 'BTCUSDT', 'side': 'sell', 'qty': '1', 'reduce_only': 'true'})
+    assert closing['order_status'] == 'Cancelled' and exchange.positions == {}
+
+def test_signature_and_rate_limit():
+    exchange, _ = _exchange([100.0] * 4, rate_limit=2.0)
+    params = {'api_key': 'sim-key', 'timestamp': str(int(time.time() * 1000)), 'symbol': 'BTCUSDT'}
+    payload = '&'.join(f"{k}={v}" for k, v in sorted(params.items()))
+    params['sign'] = hmac.new(b'sim-secret', payload.encode(), hashlib.sha256).hexdigest()
+    assert exchange.verify_signature(params)
+    assert not exchange.verify_signature({**params, 'symbol': 'ETHUSDT'})
+    assert not exchange.verify_signature({**params, 'timestamp': '0'})
+
+    assert [exchange.take_token('k') for _ in range(3)] == [True, True, False]
+    assert exchange.take_token('other')
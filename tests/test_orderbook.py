@@ -0,0 +1,67 @@
+import random
+
+import pytest
+
+from orderbook import _BookSide
+
+def _side(descending, levels):
+    side = _BookSide(descending)
+    for price, size in levels:
+        side.update(price, size)
+    return side
+
+def _walk(side, qty):
+    """Эталон: проход по уровням от лучшего, без префиксных сумм"""
+    prices = sorted(side.sizes, reverse=side.descending)
+    filled = notional = 0.0
+    worst = prices[0]
+    for price in prices:
+        if filled >= qty:
+            break
+        take = min(side.sizes[price], qty - filled)
+        filled += take
+        notional += take * price
+        worst = price
+    avg = notional / filled
+    return avg, worst, filled, abs(avg - prices[0]) / prices[0] * 10_000
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_estimate_matches_level_walk(descending):
+    rng = random.Random(7)
+    side = _side(descending, [(100 + i * 0.5, rng.uniform(0.1, 3.0)) for i in range(40)])
+    total = sum(side.sizes.values())
+    for qty in [0.05, 1.0, 7.3, total / 2, total, total * 2] + [rng.uniform(0, total) for _ in range(50)]:
+        assert tuple(side.estimate(qty)) == pytest.approx(_walk(side, qty))
+
+def test_updates_invalidate_prefix():
+    side = _side(False, [(100.0, 1.0), (101.0, 1.0), (102.0, 1.0)])
+    assert side.estimate(2.0).avg_price == pytest.approx(100.5)
+    side.update(100.0, 0)      # уровень снят
+    side.update(101.0, 3.0)    # объём изменён
+    side.update(99.0, 0.5)     # новый лучший уровень
+    assert side.best() == 99.0
+    assert tuple(side.estimate(2.0)) == pytest.approx(_walk(side, 2.0))
+    assert side.estimate(0).filled_qty == 0.0
+    assert _BookSide(True).estimate(1.0).filled_qty == 0.0
+
+@pytest.mark.parametrize('descending', [False, True])
+def test_max_qty_hits_slippage_limit(descending):
+    rng = random.Random(11)
+    side = _side(descending, [(100 + i * 0.25, rng.uniform(0.5, 2.0)) for i in range(30)])
+    total = sum(side.sizes.values())
+    for bps in (1, 5, 20, 50, 100):
+        qty = side.max_qty(bps)
+        assert 0 < qty <= total
+        assert side.estimate(qty).slippage_bps <= bps + 1e-9
+        if qty < total:
+            # Чуть больший объём уже выходит за лимит
+            assert side.estimate(qty * 1.001 + 1e-9).slippage_bps > bps
+
+def test_max_qty_edges():
+    side = _side(False, [(100.0, 1.0), (110.0, 1.0)])
+    assert side.max_qty(0) == pytest.approx(1.0)   # только лучший уровень
+    # Средняя 105 = 500 б.п.: весь стакан
+    assert side.max_qty(500) == pytest.approx(2.0)
+    # Средняя 102.5 = 250 б.п.: 1 + x, где (100 + 110x) / (1 + x) = 102.5
+    assert side.max_qty(250) == pytest.approx(1 + 1 / 3)
+    assert _BookSide(False).max_qty(100) == 0.0
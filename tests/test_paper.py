@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from paper import PaperBroker, PaperConfig
+from strategy_base import TradeSignal
+from strategy_one import StrategyOne
+
+FEE = 0.00055
+SLIP = 2.0  # б.п.
+
+def _account(price=100.0, **config):
+    broker = PaperBroker(api=None)
+    config = {'latency': 0.0, 'latency_jitter': 0.0, 'slippage_bps': SLIP, 'fee_rate': FEE, 'seed': 1, **config}
+    executor = broker.account(PaperConfig(**config))
+    broker.on_kline('BTCUSDT', [0, price, price, price, price, 1.0], False)
+    return broker, executor
+
+def _tick(broker, price):
+    broker.on_kline('BTCUSDT', [0, price, price, price, price, 1.0], False)
+
+def test_market_order_pays_slippage_and_fee():
+    broker, executor = _account()
+    result = asyncio.run(executor.place_order('BTCUSDT', 'buy', 2.0))
+    fill = 100.0 * (1 + SLIP / 10_000)
+    assert (result.status, result.avg_price) == ('Filled', pytest.approx(fill))
+    assert result.fee == pytest.approx(2.0 * fill * FEE)
+    assert executor.cash == pytest.approx(10_000 - result.fee)
+    (position,) = asyncio.run(executor.get_positions('BTCUSDT'))
+    assert (position.side, position.size, position.entry_price) == ('Buy', 2.0, pytest.approx(fill))
+    # Маржа позиции не доступна для новых заявок
+    assert executor.available() == pytest.approx(executor.cash - 2.0 * fill / executor.leverage)
+
+def test_limit_order_waits_for_price():
+    broker, executor = _account()
+    result = asyncio.run(executor.place_order('BTCUSDT', 'buy', 1.0, price=99.0))
+    assert result.status == 'New' and executor.positions == {}
+    _tick(broker, 99.5)
+    assert executor.positions == {}
+    _tick(broker, 98.7)
+    # Лимитная исполняется по своей цене, без проскальзывания
+    assert executor.positions['BTCUSDT'].entry_price == 99.0
+    assert executor.orders == []
+
+def test_close_without_position_is_cancelled_for_free():
+    broker, executor = _account()
+    result = asyncio.run(executor.close_position('BTCUSDT', 'Sell', 1.0))
+    assert result.status == 'Cancelled'
+    assert executor.cash == 10_000 and executor.fees_paid == 0
+
+def test_take_profit_and_stop_loss_trigger():
+    broker, executor = _account()
+    closed = []
+    executor.listeners.append(lambda symbol, price, profit: closed.append((symbol, price, profit)))
+    asyncio.run(executor.place_order('BTCUSDT', 'buy', 1.0, take_profit=102.0, stop_loss=99.0))
+    entry = executor.positions['BTCUSDT'].entry_price
+    _tick(broker, 101.9)
+    assert closed == []
+    _tick(broker, 102.5)
+    # Закрытие рыночной заявкой от цены триггера, а не от цены тика
+    exit_price = 102.0 * (1 - SLIP / 10_000)
+    (symbol, price, profit), = closed
+    assert price == pytest.approx(exit_price)
+    assert profit == pytest.approx((exit_price - entry) - exit_price * FEE)
+    assert executor.positions == {}
+
+    asyncio.run(executor.place_order('BTCUSDT', 'sell', 1.0, take_profit=98.0, stop_loss=103.0))
+    _tick(broker, 103.2)
+    assert closed[-1][1] == pytest.approx(103.0 * (1 + SLIP / 10_000))
+    assert closed[-1][2] < 0
+
+def test_latency_is_deterministic_with_seed():
+    _, a = _account(seed=5)
+    _, b = _account(seed=5)
+    draws = [[x._rng.random() for _ in range(3)] for x in (a, b)]
+    assert draws[0] == draws[1]
+
+def test_signal_exit_records_the_paper_fill(db):
+    broker, executor = _account()
+    strategy = StrategyOne(executor, leverage=2)
+    strategy.mode = 'paper'
+    executor.listeners.append(strategy.on_position_closed)
+
+    def run(signal, exits_only=False):
+        async def analyze(symbol, balance, exits_only=False):
+            return signal
+        strategy.analyze = analyze
+        asyncio.run(strategy.execute_trade('BTCUSDT', 1000.0, exits_only))
+
+    run(TradeSignal('buy', 100.0, 3.0, 'test'))
+    entry = executor.positions['BTCUSDT'].entry_price
+    _tick(broker, 101.0)
+    # Объём сигнала выхода другой — закрывается вся позиция
+    run(TradeSignal('sell', 101.0, 1.0, 'test'), exits_only=True)
+    assert executor.positions == {}
+
+    (trade,) = db.get_trade_history(0, mode='paper')
+    row = dict(zip(db.TRADE_COLUMNS, trade))
+    exit_price = 101.0 * (1 - SLIP / 10_000)
+    assert row['exit_price'] == pytest.approx(exit_price)
+    # Комиссия сделки — вход плюс выход
+    assert row['fee'] == pytest.approx(3.0 * (entry + exit_price) * FEE)
+    assert row['profit'] == pytest.approx(3.0 * (exit_price - entry) - row['fee'])
@@ -0,0 +1,63 @@
+import time
+import asyncio
+import threading
+
+import pytest
+
+from profiler import SamplingProfiler, collapsed, format_report, hotspots, lag_stats, merge_reports
+
+STACKS = {
+    'engine-loop;task:run-live;trade_engine:TradeEngine._run;strategy_base:BaseStrategy.analyze': 6,
+    'engine-loop;task:run-live;trade_engine:TradeEngine._run;utils:ema': 3,
+    'profiler': 5,  # поток без кадров с модулем не попадает в горячие точки
+}
+
+def test_hotspots_split_own_and_cumulative_time():
+    own, total = hotspots(STACKS)
+    assert own == [('strategy_base:BaseStrategy.analyze', 6), ('utils:ema', 3)]
+    assert total[0] == ('trade_engine:TradeEngine._run', 9)
+    assert all(not frame.startswith('task:') for frame, _ in total)
+    assert collapsed({'b;c': 2, 'a': 1}) == "a 1\nb;c 2\n"
+
+def test_merge_reports_prefixes_process_names():
+    report = {'running': False, 'samples': 10, 'seconds': 2.0, 'stacks': {'x:f': 4},
+              'lag': {'engine-loop': lag_stats([0.001, 0.003])}}
+    merged = merge_reports({'worker-0': report, 'worker-1': {**report, 'running': True, 'seconds': 3.0}})
+    assert merged['running'] and merged['samples'] == 20 and merged['seconds'] == 3.0
+    assert merged['stacks'] == {'worker-0;x:f': 4, 'worker-1;x:f': 4}
+    assert merged['lag']['worker-1/engine-loop'] == {'count': 2, 'mean_ms': pytest.approx(2.0),
+                                                     'p99_ms': pytest.approx(3.0), 'max_ms': pytest.approx(3.0)}
+    assert lag_stats([]) == {'count': 0, 'mean_ms': 0.0, 'p99_ms': 0.0, 'max_ms': 0.0}
+    assert 'worker-0/engine-loop' in format_report(merged)
+
+def _busy(stop: threading.Event):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+
+def test_samples_busy_threads_and_loop_lag():
+    profiler = SamplingProfiler(interval=0.002, lag_interval=0.01)
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    profiler.watch_loop(loop, 'engine-loop')
+    stop = threading.Event()
+    worker = threading.Thread(target=_busy, args=(stop,), name='busy')
+    try:
+        assert profiler.start(duration=None) and not profiler.start()
+        worker.start()
+        time.sleep(0.1)
+        loop.call_soon_threadsafe(time.sleep, 0.05)  # блокирующий вызов в цикле — заметный лаг
+        time.sleep(0.2)
+    finally:
+        stop.set()
+        worker.join()
+        profiler.stop()
+        # Даём циклу завершить отменённую задачу замера лага
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0.01), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+    report = profiler.report()
+    assert not report['running'] and report['samples'] > 10
+    assert any(stack.startswith('busy;') and 'test_profiler:_busy' in stack for stack in report['stacks'])
+    assert report['lag']['engine-loop']['max_ms'] >= 30
+    with pytest.raises(ValueError):
+        profiler.control('pause')
@@ -0,0 +1,93 @@
+import gzip
+import json
+import asyncio
+
+import numpy as np
+
+from replay import Recording, ReplayAPI, VirtualClock, replay
+
+T0 = 1_767_225_600  # 2026-01-01 00:00 UTC
+KLINE = '/v5/market/kline'
+
+def _rest(t, params, rows):
+    body = {'retCode': 0, 'retMsg': 'OK', 'result': {'list': [[str(x) for x in row] for row in rows[::-1]]}}
+    return {'t': t, 'k': 'rest', 'm': 'GET', 'e': KLINE, 'p': params, 's': 200, 'b': json.dumps(body)}
+
+def _params(symbol, interval, limit):
+    return {'category': 'linear', 'symbol': symbol, 'interval': interval, 'limit': str(limit)}
+
+def test_fallback_keeps_symbol_interval_and_category():
+    recording = Recording([
+        _rest(T0, _params('BTCUSDT', '1', 300), [[1, 2, 3, 4, 5, 6]]),
+        _rest(T0 + 60, _params('BTCUSDT', '1', 300), [[2, 2, 3, 4, 5, 6]]),
+        _rest(T0, _params('ETHUSDT', '1', 300), [[3, 2, 3, 4, 5, 6]]),
+    ])
+
+    def first_ts(params, now=T0 + 30):
+        response = recording.response('GET', KLINE, params, now)
+        return None if response is None else json.loads(response[1])['result']['list'][0][0]
+
+    assert first_ts(_params('BTCUSDT', '1', 300)) == '1'
+    assert first_ts(_params('BTCUSDT', '1', 300), now=T0 + 90) == '2'
+    # Другое окно выборки — тот же запрос
+    assert first_ts({**_params('BTCUSDT', '1', 2), 'start': T0 * 1000}) == '1'
+    assert first_ts(_params('ETHUSDT', '1', 50)) == '3'
+    # Другая пара, таймфрейм или категория — промах
+    assert first_ts(_params('SOLUSDT', '1', 300)) is None
+    assert first_ts(_params('BTCUSDT', '15', 300)) is None
+    assert first_ts({**_params('BTCUSDT', '1', 300), 'category': 'spot'}) is None
+
+    api = ReplayAPI(recording, VirtualClock(T0))
+    result = asyncio.run(api.get_klines('BTCUSDT', '1m', limit=10))
+    assert result[0, 0] == 1 and api.stats == {'requests': 1, 'misses': 0}
+    try:
+        asyncio.run(api.get_klines('SOLUSDT', '1m', limit=10))
+    except Exception:
+        pass
+    assert api.stats == {'requests': 2, 'misses': 1}
+
+def _write_recording(path, hours: int = 24):
+    rng = np.random.default_rng(7)
+    history, live = 1500, hours * 60
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.003, history + live)))
+    volume = rng.uniform(5, 15, history + live)
+    start = T0 - history * 60
+    bars = np.array([[(start + 60 * i) * 1000, c, c * 1.001, c * 0.999, c, v]
+                     for i, (c, v) in enumerate(zip(close, volume))])
+
+    past = bars[:history]
+    quarter = past.reshape(-1, 15, 6)
+    bars_15m = np.column_stack([quarter[:, 0, 0], quarter[:, 0, 1], quarter[:, :, 2].max(axis=1),
+                                quarter[:, :, 3].min(axis=1), quarter[:, -1, 4], quarter[:, :, 5].sum(axis=1)])
+    events = [
+        _rest(T0, _params('BTCUSDT', '1', 300), past[-300:]),
+        _rest(T0, _params('BTCUSDT', '15', 100), bars_15m[-100:]),
+    ]
+    for bar in bars[history:]:
+        ts = int(bar[0])
+        frame = {'topic': 'kline.1.BTCUSDT', 'data': [{
+            'start': ts, 'open': bar[1], 'high': bar[2], 'low': bar[3], 'close': bar[4], 'volume': bar[5],
+            'confirm': True,
+        }]}
+        events.append({'t': ts / 1000 + 60.5, 'k': 'ws', 'f': json.dumps(frame)})
+    with gzip.open(path, 'wt', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event) + '\n')
+
+def test_replay_is_deterministic_and_restores_the_database(db, tmp_path):
+    path = tmp_path / 'session.jsonl.gz'
+    _write_recording(path)
+    runs = [{'symbol': 'BTCUSDT', 'strategy_name': 'Стратегия 2', 'mode': 'paper'}]
+    working = db.DB_NAME
+
+    first = replay(str(path), runs, str(tmp_path / 'first.db'))
+    assert db.DB_NAME == working
+    second = replay(str(path), runs, str(tmp_path / 'second.db'))
+    assert db.DB_NAME == working
+
+    assert first.frames == second.frames == 24 * 60
+    assert first.api_misses == second.api_misses
+    assert first.runs == second.runs
+    assert first.runs['paper-1']['orders'] > 0
+    # Сделки воспроизведения — только в его БД
+    assert db.get_trade_history(0, mode='paper') == []
@@ -0,0 +1,47 @@
+from resampler import BASE_MS, CandleResampler
+
+START = 1_767_225_600_000  # 2026-01-01 00:00 UTC
+
+def _minute(i, close):
+    """Минутная свеча i с предсказуемыми ценами"""
+    return [START + i * BASE_MS, close - 1, close + 2, close - 3, close, 10.0 + i]
+
+def _expected(rows):
+    return [rows[0][0] - rows[0][0] % (5 * BASE_MS), rows[0][1], max(r[2] for r in rows),
+            min(r[3] for r in rows), rows[-1][4], sum(r[5] for r in rows)]
+
+def test_five_minute_bars_from_minutes():
+    resampler = CandleResampler()
+    closed = []
+    series = resampler.subscribe('BTCUSDT', '5m', callback=lambda symbol, interval, s: closed.append(s.row()))
+    rows = [_minute(i, 100.0 + (i * 7) % 11) for i in range(12)]
+    for row in rows:
+        resampler.on_kline('BTCUSDT', row, confirmed=True)
+
+    ohlcv = series.ohlcv().tolist()
+    assert ohlcv == [_expected(rows[0:5]), _expected(rows[5:10]), _expected(rows[10:12])]
+    # Подписчик узнаёт о баре, когда закрыта его последняя минута
+    assert [bar['timestamp'] for bar in closed] == [START, START + 5 * BASE_MS]
+    assert all(bar[0] % (5 * BASE_MS) == 0 for bar in ohlcv)
+
+def test_forming_minute_and_repeats():
+    resampler = CandleResampler()
+    series = resampler.subscribe('BTCUSDT', '5m')
+    first, second = _minute(0, 100.0), _minute(1, 104.0)
+    resampler.on_kline('BTCUSDT', first, confirmed=True)
+    resampler.on_kline('BTCUSDT', first, confirmed=True)  # повтор не удваивает объём
+    resampler.on_kline('BTCUSDT', second, confirmed=False)
+    assert series.ohlcv().tolist() == [_expected([first, second])]
+    # Незакрытая минута обновилась — бар пересчитан без её прежних значений
+    second = _minute(1, 98.0)
+    resampler.on_kline('BTCUSDT', second, confirmed=False)
+    assert series.ohlcv().tolist() == [_expected([first, second])]
+
+def test_seed_rebuilds_forming_bar():
+    resampler = CandleResampler()
+    rows = [_minute(i, 100.0 + i) for i in range(8)]
+    resampler.seed_base('BTCUSDT', rows)
+    # Биржа отдала закрытый бар 00:00 и незакрытый 00:05 — его достраиваем из минуток
+    resampler.seed('BTCUSDT', '5m', [_expected(rows[0:5]), [START + 5 * BASE_MS, 0, 0, 0, 0, 0]])
+    series = resampler.series('BTCUSDT', '5m')
+    assert series.ohlcv().tolist() == [_expected(rows[0:5]), _expected(rows[5:8])]
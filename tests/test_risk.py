@@ -0,0 +1,68 @@
+import pytest
+
+from risk import EXTERNAL_OWNER, RiskBook, RiskLimits
+
+LIMITS = RiskLimits(max_gross_exposure=3.0, max_symbol_exposure=1.5, max_bucket_exposure=2.0,
+                    max_margin_usage=0.5, max_positions=3, min_fill_ratio=0.25)
+
+def test_order_is_cut_to_nearest_limit():
+    book = RiskBook(LIMITS)
+    assert book.check('live', 'BTCUSDT', 'buy', 10, 100.0, 10, 1000.0) == (10, 'ok')
+    # Номинал 2000 при лимите пары 1.5 капитала
+    quantity, reason = book.check('live', 'BTCUSDT', 'buy', 20, 100.0, 10, 1000.0)
+    assert quantity == pytest.approx(15) and 'BTCUSDT' in reason
+    assert book.stats['checks'] == 2 and book.stats['reduced'] == 1
+
+def test_remainder_below_min_fill_ratio_is_rejected():
+    book = RiskBook(LIMITS)
+    # Допустимо 1500 из 10000: меньше четверти заявки
+    assert book.check('live', 'BTCUSDT', 'buy', 100, 100.0, 10, 1000.0).quantity == 0
+    assert book.stats['rejected'] == 1
+
+def test_open_positions_consume_and_return_headroom():
+    book = RiskBook(LIMITS)
+    book.on_open('live', 'BTCUSDT', 'buy', 10, 100.0, 10)
+    assert (book.gross, book.margin) == (pytest.approx(1000), pytest.approx(100))
+
+    # Капитал = свободные 900 + маржа 100. Встречная заявка уменьшает чистую экспозицию
+    assert book.check('paper-1', 'BTCUSDT', 'sell', 20, 100.0, 10, 900.0).quantity == pytest.approx(20)
+    # ETH в той же корзине majors: остаётся 2000 - 1000
+    quantity, reason = book.check('paper-1', 'ETHUSDT', 'buy', 20, 100.0, 10, 900.0)
+    assert quantity == pytest.approx(10) and 'majors' in reason
+
+    # Переоценка по новой цене меняет суммарную экспозицию
+    book.mark('BTCUSDT', 110.0)
+    assert book.gross == pytest.approx(1100)
+
+    book.on_close('live', 'BTCUSDT')
+    assert book.positions == {} and book.symbols == {}
+    assert (book.gross, book.margin, book.buckets) == (0.0, 0.0, {})
+    assert book.check('paper-1', 'ETHUSDT', 'buy', 15, 100.0, 10, 1000.0).quantity == pytest.approx(15)
+
+def test_margin_limit_scales_with_leverage():
+    book = RiskBook(LIMITS)
+    # Маржа не больше половины капитала: при плече 1 — номинал 500
+    quantity, reason = book.check('live', 'SOLUSDT', 'buy', 10, 100.0, 1, 1000.0)
+    assert quantity == pytest.approx(5) and reason == 'лимит: маржа'
+
+def test_position_count_and_release():
+    book = RiskBook(LIMITS)
+    book.on_open(EXTERNAL_OWNER, 'DOGEUSDT', 'buy', 100, 0.1, 1)
+    book.on_open('paper-1', 'SOLUSDT', 'sell', 1, 100.0, 5)
+    book.on_open('paper-1', 'ADAUSDT', 'buy', 10, 1.0, 5)
+    assert book.check('paper-2', 'ETHUSDT', 'buy', 1, 100.0, 5, 1000.0).quantity == 0
+    # Добор к уже открытой позиции лимит числа позиций не задевает
+    assert book.check('paper-1', 'SOLUSDT', 'sell', 1, 100.0, 5, 1000.0).quantity == 1
+
+    # Остановка запуска снимает только его позиции, внешние остаются
+    book.release('paper-1')
+    assert list(book.positions) == [(EXTERNAL_OWNER, 'DOGEUSDT')]
+    assert book.buckets == {'meme': pytest.approx(10.0), 'l1': pytest.approx(0.0)}
+    assert book.snapshot()['buckets'] == {'meme': pytest.approx(10.0)}
+
+def test_reopen_replaces_previous_position():
+    book = RiskBook(LIMITS)
+    book.on_open('live', 'BTCUSDT', 'buy', 5, 100.0, 5)
+    book.on_open('live', 'BTCUSDT', 'buy', 3, 100.0, 5)
+    assert book.positions[('live', 'BTCUSDT')] == (3, pytest.approx(60))
+    assert book.gross == pytest.approx(300)
@@ -0,0 +1,104 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from scheduler import CandleScheduler
+from series import OHLCVSeries
+from strategy_two import INDICATORS, StrategyTwo
+
+PERIOD = 900  # 15m
+T0 = 1_767_225_600  # 2026-01-01 00:00 UTC, кратно любому таймфрейму
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+def test_wakes_after_candle_close():
+    clock = Clock(T0 + 100)
+    scheduler = CandleScheduler('15m', offset=2.0, jitter=0.0, clock=clock)
+    # Сразу после запуска: ближайшее необработанное закрытие — T0
+    wake = scheduler.next_wake('BTCUSDT')
+    assert (wake.delay, wake.exits_only, wake.candle_close) == (0.0, False, T0)
+    scheduler.acknowledge(wake)
+    wake = scheduler.next_wake('BTCUSDT')
+    assert wake.candle_close == T0 + PERIOD
+    assert wake.delay == pytest.approx(PERIOD - 100 + 2.0)
+
+    # Закрытие не подтверждено (ошибка тика) — пробуждение повторится на нём же
+    clock.now = T0 + PERIOD + 2.0
+    assert scheduler.next_wake('BTCUSDT').candle_close == T0 + PERIOD
+
+def test_jitter_is_per_symbol_and_bounded():
+    scheduler = CandleScheduler('15m', offset=2.0, jitter=3.0, clock=Clock(T0 + 1))
+    scheduler.acknowledge(scheduler.next_wake('BTCUSDT'))
+    delays = {s: scheduler.next_wake(s).delay for s in ('BTCUSDT', 'ETHUSDT', 'SOLUSDT')}
+    assert all(PERIOD - 1 + 2.0 <= d < PERIOD - 1 + 5.0 for d in delays.values())
+    assert delays == {s: scheduler.next_wake(s).delay for s in delays}
+
+def test_exit_checks_between_closes():
+    clock = Clock(T0 + 10)
+    scheduler = CandleScheduler('15m', jitter=0.0, exit_check_interval=60, clock=clock)
+    scheduler.acknowledge(scheduler.next_wake('BTCUSDT'))
+    assert not scheduler.next_wake('BTCUSDT', has_position=False).exits_only
+    wake = scheduler.next_wake('BTCUSDT', has_position=True)
+    assert (wake.delay, wake.exits_only) == (60, True)
+    # Проверка выхода не считается обработкой закрытия
+    scheduler.acknowledge(wake)
+    clock.now = T0 + PERIOD - 30
+    assert not scheduler.next_wake('BTCUSDT', has_position=True).exits_only
+
+def _golden_cross_series():
+    """Снижение, затем рост зигзагом: золотой крест EMA 20/50 на свече 105 при RSI ~57"""
+    closes = [100 - 0.3 * i for i in range(60)]
+    for i in range(46):
+        closes.append(closes[-1] + (0.8 if i % 2 else -0.6))
+    closes = np.array(closes)
+    volume = np.full(len(closes), 50.0)
+    volume[-1] = 500.0  # всплеск объёма на свече с крестом
+    klines = np.column_stack([
+        T0 * 1000 + np.arange(len(closes)) * PERIOD * 1000,
+        closes, closes + 0.2, closes - 0.2, closes, volume,
+    ])
+    return klines
+
+def _strategy(klines, now):
+    strategy = StrategyTwo(None)
+    strategy.scheduler = CandleScheduler('15m', clock=Clock(now))
+
+    async def fetch_data(symbol, interval=None, limit=100):
+        return OHLCVSeries.from_klines(klines, INDICATORS)
+    strategy.fetch_data = fetch_data
+    return strategy
+
+def _analyze(strategy, exits_only=False):
+    return asyncio.run(strategy.analyze('BTCUSDT', 1000.0, exits_only))
+
+def test_close_wakeup_evaluates_the_closed_bar():
+    closed = _golden_cross_series()
+    close_time = closed[-1, 0] / 1000 + PERIOD
+    # Через 2 с после закрытия в ряду уже есть новая свеча с крохами объёма
+    forming = [close_time * 1000, closed[-1, 4], closed[-1, 4] + 0.1, closed[-1, 4] - 0.1, closed[-1, 4], 0.3]
+    klines = np.vstack([closed, forming])
+
+    strategy = _strategy(klines, close_time + 2)
+    signal = _analyze(strategy)
+    assert signal.action == 'buy'
+    assert signal.reason == StrategyTwo.entry_reasons['buy']
+
+    # Закрытая свеча не менялась — повторный анализ пропускается, как бы ни росла текущая
+    klines[-1, 5] = 40.0
+    assert _analyze(strategy).reason == 'Data unchanged'
+
+    # Пока новая свеча не пришла, последняя в ряду и есть закрытая
+    assert _analyze(_strategy(closed, close_time + 2)).action == 'buy'
+
+def test_forming_bar_is_not_treated_as_closed():
+    closed = _golden_cross_series()
+    # Та же свеча с крестом, но до её закрытия: входа нет, пока она не закрыта
+    strategy = _strategy(closed, closed[-1, 0] / 1000 + 2)
+    assert _analyze(strategy).action == 'hold'
+    assert strategy._closed_offset(OHLCVSeries.from_klines(closed)) == 2
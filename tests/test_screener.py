@@ -0,0 +1,96 @@
+import asyncio
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from screener import Screener
+from series import OHLCVSeries
+from strategy_two import INDICATORS, StrategyTwo
+from utils import ema
+
+PERIOD_MS = 900_000  # 15m
+T0 = 1_767_225_600  # 2026-01-01 00:00 UTC
+
+class Clock:
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+class FakeAPI:
+    """Свечи по заранее заданной истории пар; fail — пары, запрос которых падает один раз"""
+
+    def __init__(self, history, clock, fail=()):
+        self.history = history
+        self.clock = clock
+        self.fail = set(fail)
+        self.calls = []
+
+    async def get_klines(self, symbol, interval, limit):
+        self.calls.append((symbol, limit))
+        if symbol in self.fail:
+            self.fail.discard(symbol)
+            raise ConnectionError('timeout')
+        bars = self.history[symbol]
+        return bars[bars[:, 0] <= self.clock() * 1000][-limit:]
+
+def _walk(rng, bars: int, end_ms: int) -> np.ndarray:
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, bars)))
+    ts = end_ms - PERIOD_MS * np.arange(bars)[::-1]
+    return np.column_stack([ts, close, close * 1.002, close * 0.998, close, rng.uniform(100, 1000, bars)])
+
+def test_ema_starts_at_first_value_of_each_row():
+    x = np.array([[1.0, 2.0, 3.0, 4.0, 5.0], [np.nan, np.nan, 3.0, 1.0, 2.0]])
+    out = ema(x, 3)
+    for row in x:
+        expected = pd.Series(row).ewm(span=3, adjust=False).mean().to_numpy()
+        np.testing.assert_allclose(ema(row, 3), expected)
+    np.testing.assert_allclose(out[1, 2:], ema(x[1, 2:], 3))
+    assert np.isnan(out[1, :2]).all()
+
+def test_failed_fetch_reloads_the_whole_window():
+    clock = Clock(T0 + 10)
+    end = T0 * 1000
+    rng = np.random.default_rng(0)
+    api = FakeAPI({s: _walk(rng, 200, end + PERIOD_MS) for s in ('AAA', 'BBB')}, clock, fail={'BBB'})
+    screener = Screener(api, {'two': StrategyTwo}, window=100, clock=clock)
+    screener.set_universe(['AAA', 'BBB'])
+
+    asyncio.run(screener.refresh())
+    assert sorted(api.calls) == [('AAA', 100), ('BBB', 100)]
+    assert screener.matrices['15m'].pending == {'BBB'}
+
+    api.calls.clear()
+    clock.now += PERIOD_MS / 1000
+    asyncio.run(screener.refresh())
+    # AAA догружает новую и перечитывает прошлую свечу, BBB — всё окно
+    assert sorted(api.calls) == [('AAA', 2), ('BBB', 100)]
+    assert not screener.matrices['15m'].pending
+
+def test_scan_matches_single_pair_signals_for_short_histories():
+    clock = Clock(T0 + 10)
+    end = T0 * 1000
+    rng = np.random.default_rng(1)
+    # Новые листинги: истории от min_bars до окна, слева в матрице NaN
+    history = {f"S{i:03d}USDT": _walk(rng, int(rng.integers(60, 100)), end) for i in range(300)}
+    screener = Screener(FakeAPI(history, clock), {'two': StrategyTwo}, window=100, clock=clock)
+    screener.set_universe(sorted(history))
+
+    candidates = asyncio.run(screener.screen())
+
+    expected = set()
+    strategy = StrategyTwo(None)
+    for symbol, bars in history.items():
+        series = strategy.calculate_indicators(OHLCVSeries.from_klines(bars, INDICATORS))
+        # Последняя свеча формируется: сигнал — на закрытой
+        long, short = strategy.entry_conditions(series, offset=2)
+        if long:
+            expected.add((symbol, 'buy'))
+        if short:
+            expected.add((symbol, 'sell'))
+    assert expected
+    assert {(c.symbol, c.side) for c in candidates} == expected
+    for c in candidates:
+        assert c.price == pytest.approx(history[c.symbol][-1, 4])
@@ -0,0 +1,40 @@
+import numpy as np
+
+from series import OHLCVSeries
+
+def _bar(i: int):
+    return [60_000.0 * i, 100.0 + i, 101.0 + i, 99.0 + i, 100.5 + i, 10.0 * i]
+
+def test_append_keeps_last_capacity_bars_across_buffer_shifts():
+    series = OHLCVSeries(capacity=5, indicators=('ema',))
+    for i in range(23):  # несколько переносов окна в начало буфера
+        series.append(_bar(i))
+    assert len(series) == 5
+    np.testing.assert_array_equal(series.ohlcv(), np.array([_bar(i) for i in range(18, 23)]))
+    assert series.last('close') == 122.5 and series.last('close', 5) == 118.5
+    assert np.isnan(series['ema']).all()
+
+def test_indicator_writes_through_column_view():
+    series = OHLCVSeries.from_klines([_bar(i) for i in range(4)], indicators=('ema',))
+    np.multiply(series['close'], 2, out=series['ema'])
+    assert series.row(1) == {**dict(zip(series.columns[:6], _bar(3))), 'ema': 207.0}
+    # Новая свеча начинается без значения индикатора
+    series.append(_bar(4))
+    assert np.isnan(series.last('ema')) and series.last('ema', 2) == 207.0
+
+def test_upsert_updates_forming_bar_then_appends():
+    series = OHLCVSeries(capacity=3)
+    series.upsert(_bar(1))
+    series.upsert([60_000.0, 101.0, 105.0, 100.0, 104.0, 15.0])
+    assert len(series) == 1 and series.last('close') == 104.0
+    series.upsert(_bar(2))
+    assert len(series) == 2 and series.last('timestamp', 2) == 60_000.0
+
+def test_load_truncates_and_add_indicator_keeps_data():
+    series = OHLCVSeries(capacity=3)
+    series.load([_bar(i) for i in range(10)])
+    assert len(series) == 3 and series.last('timestamp', 3) == _bar(7)[0]
+    series.add_indicator('rsi')
+    assert series.columns[-1] == 'rsi' and series.last('close') == _bar(9)[4]
+    series.load([])
+    assert len(series) == 0
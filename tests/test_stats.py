@@ -0,0 +1,58 @@
+import pytest
+
+def _trade(db, exit_price, entry_price=100.0, volume=1.0, side='buy', run_id='live', symbol='BTCUSDT',
+           entry_fee=None, exit_fee=None):
+    trade_id = db.add_trade('strategy_one', symbol, entry_price, volume, side=side, run_id=run_id, fee=entry_fee)
+    db.close_trade(trade_id, exit_price, fee=exit_fee)
+    return trade_id
+
+def test_rollup_counts_pnl_and_drawdown(db):
+    # Итоги по порядку: +10, -5, -8, +4 — пик 10, худшая просадка 13
+    _trade(db, 110.0)
+    _trade(db, 95.0)
+    _trade(db, 108.0, side='sell')
+    _trade(db, 104.0)
+
+    stats = db.get_trade_stats(0)
+    assert stats['trades'] == 4 and stats['wins'] == 2
+    assert stats['win_rate'] == pytest.approx(0.5)
+    assert stats['net_pnl'] == pytest.approx(1.0)
+    assert stats['equity'] == pytest.approx(1.0)
+    assert stats['peak'] == pytest.approx(10.0)
+    assert stats['max_drawdown'] == pytest.approx(13.0)
+
+def test_entry_and_exit_fees_reduce_net_pnl(db):
+    trade_id = _trade(db, 110.0, entry_fee=0.5, exit_fee=0.25)
+
+    (trade,) = db.get_trade_history(0)
+    row = dict(zip(db.TRADE_COLUMNS, trade))
+    assert row['id'] == trade_id
+    assert row['fee'] == pytest.approx(0.75)
+    assert row['profit'] == pytest.approx(10.0 - 0.75)
+
+    stats = db.get_trade_stats(0)
+    assert stats['gross_pnl'] == pytest.approx(10.0)
+    assert stats['fees'] == pytest.approx(0.75)
+    assert stats['net_pnl'] == pytest.approx(9.25)
+
+def test_second_close_is_ignored(db):
+    trade_id = _trade(db, 110.0, exit_fee=1.0)
+    # Сигнал выхода пришёл после срабатывания TP: сделка уже закрыта
+    db.close_trade(trade_id, 90.0, fee=1.0)
+
+    stats = db.get_trade_stats(0)
+    assert stats['trades'] == 1
+    assert stats['net_pnl'] == pytest.approx(9.0)
+    (trade,) = db.get_trade_history(0)
+    assert dict(zip(db.TRADE_COLUMNS, trade))['exit_price'] == 110.0
+
+def test_runs_and_symbols_roll_up_into_all(db):
+    _trade(db, 110.0, run_id='paper-1')
+    _trade(db, 97.0, run_id='paper-2', symbol='ETHUSDT')
+
+    assert db.get_trade_stats(0, run_id='paper-1')['net_pnl'] == pytest.approx(10.0)
+    assert db.get_trade_stats(0, run_id='paper-2')['net_pnl'] == pytest.approx(-3.0)
+    assert db.get_trade_stats(0, run_id='paper-1', symbol='ETHUSDT') is None
+    total = db.get_trade_stats(0)
+    assert total['trades'] == 2 and total['net_pnl'] == pytest.approx(7.0)
+    assert db.get_trade_stats(0, symbol='ETHUSDT')['trades'] == 1
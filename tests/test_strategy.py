@@ -0,0 +1,103 @@
+import asyncio
+
+import pytest
+
+from models import OrderResult
+from risk import RiskBook, RiskLimits
+from strategy_base import TradeSignal
+from strategy_one import StrategyOne
+from strategy_two import StrategyTwo
+
+class FakeAPI:
+    """Исполнитель, записывающий заявки; заявки исполняются сразу по цене fill_price"""
+
+    def __init__(self, fill_price: float = 100.0, status: str = 'Filled'):
+        self.fill_price = fill_price
+        self.status = status
+        self.calls = []
+
+    async def place_order(self, **kwargs) -> OrderResult:
+        self.calls.append(('place_order', kwargs))
+        return OrderResult('1', kwargs['symbol'], kwargs['side'], kwargs['quantity'], kwargs['price'],
+                           self.status, None if self.status == 'New' else self.fill_price)
+
+    async def close_position(self, symbol, side, quantity) -> OrderResult:
+        self.calls.append(('close_position', {'symbol': symbol, 'side': side, 'quantity': quantity}))
+        return OrderResult('2', symbol, side, quantity, None, 'Filled', self.fill_price)
+
+    async def cancel_orders(self, symbol):
+        self.calls.append(('cancel_orders', {'symbol': symbol}))
+        return {}
+
+    async def get_positions(self, symbol=None):
+        return []
+
+    async def set_leverage(self, symbol, leverage):
+        self.calls.append(('set_leverage', {'symbol': symbol, 'leverage': leverage}))
+
+def _run(strategy, signal, exits_only=False):
+    async def analyze(symbol, balance, exits_only=False):
+        return signal
+    strategy.analyze = analyze
+    asyncio.run(strategy.execute_trade('BTCUSDT', 1000.0, exits_only))
+
+@pytest.mark.parametrize('cls', [StrategyOne, StrategyTwo])
+def test_entry_and_signal_exit(db, cls):
+    api = FakeAPI(fill_price=100.5)
+    strategy = cls(api, risk_per_trade=0.01, leverage=3)
+    strategy.user_id = 7
+
+    _run(strategy, TradeSignal('buy', 100.0, 2.0, 'test'))
+    name, order = api.calls[-1]
+    assert name == 'place_order'
+    # Обе стратегии передают плечо и ставят TP/SL от цены сигнала
+    assert order['leverage'] == 3
+    assert order['take_profit'] == pytest.approx(102.0)
+    assert order['stop_loss'] == pytest.approx(99.0)
+    assert strategy.position == 'long'
+    (trade,) = db.get_open_trades(7)
+    assert trade[db.TRADE_COLUMNS.index('strategy')] == cls.name
+    assert trade[db.TRADE_COLUMNS.index('entry_price')] == 100.5
+
+    # Встречный сигнал в режиме «только выход» закрывает позицию и не открывает новую
+    _run(strategy, TradeSignal('sell', 101.0, 2.0, 'test'), exits_only=True)
+    assert api.calls[-1][0] == 'close_position'
+    assert api.calls[-1][1]['side'] == 'Sell'
+    assert strategy.position is None
+    assert db.get_open_trades(7) == []
+
+def test_risk_book_cuts_entry_and_frees_headroom_on_exit(db):
+    api = FakeAPI(fill_price=100.0)
+    strategy = StrategyTwo(api, leverage=10)
+    strategy.risk_book = RiskBook(RiskLimits())
+
+    # Баланс 1000: номинал пары не больше 1.5 капитала
+    _run(strategy, TradeSignal('buy', 100.0, 20.0, 'test'))
+    assert ('set_leverage', {'symbol': 'BTCUSDT', 'leverage': 10}) in api.calls
+    assert api.calls[-1][1]['quantity'] == pytest.approx(15)
+    assert strategy.risk_book.positions == {('live', 'BTCUSDT'): (pytest.approx(15), pytest.approx(150))}
+
+    _run(strategy, TradeSignal('sell', 100.0, 20.0, 'test'), exits_only=True)
+    assert api.calls[-1] == ('close_position', {'symbol': 'BTCUSDT', 'side': 'Sell', 'quantity': pytest.approx(15)})
+    assert strategy.risk_book.positions == {}
+
+def test_pending_limit_entry_is_cancelled_on_reversal(db):
+    api = FakeAPI(status='New')
+    strategy = StrategyTwo(api)
+    _run(strategy, TradeSignal('buy', 100.0, 1.0, 'test'))
+    assert strategy.pending_order is not None and strategy.position is None
+    assert db.get_open_trades(0) == []
+
+    _run(strategy, TradeSignal('sell', 99.0, 1.0, 'test'), exits_only=True)
+    assert ('cancel_orders', {'symbol': 'BTCUSDT'}) in api.calls
+    assert strategy.pending_order is None
+
+def test_apply_config_is_atomic():
+    strategy = StrategyTwo(None)
+    with pytest.raises(ValueError):
+        strategy.apply_config({'rsi_period': 10, 'ema_fast': 60})
+    assert (strategy.rsi_period, strategy.ema_fast) == (14, 20)
+    with pytest.raises(ValueError):
+        strategy.apply_config({'unknown': 1})
+    assert strategy.apply_config({'leverage': '4', 'rsi_period': 10}) == {'leverage': 5, 'rsi_period': 14}
+    assert (strategy.leverage, strategy.rsi_period) == (4, 10)
@@ -0,0 +1,86 @@
+import asyncio
+import threading
+
+import pytest
+
+from scheduler import CandleScheduler
+from strategy_one import StrategyOne
+from strategy_two import StrategyTwo
+from trade_engine import StrategyRun, TradeEngine
+
+def test_user_engine_never_uses_operator_keys(monkeypatch):
+    monkeypatch.setenv('BYBIT_API_KEY', 'operator-key')
+    monkeypatch.setenv('BYBIT_API_SECRET', 'operator-secret')
+    engine = TradeEngine(user_id=42, env_credentials=False)
+
+    assert engine._credentials() == ('', '')
+    assert engine.start_strategy('BTCUSDT', mode='live') is False
+    assert engine.runs == {} and not engine.active and engine.thread is None
+
+    engine.update_credentials('user-key', 'user-secret')
+    assert engine._credentials() == ('user-key', 'user-secret')
+
+def test_single_engine_falls_back_to_environment(monkeypatch):
+    monkeypatch.setenv('BYBIT_API_KEY', 'operator-key')
+    monkeypatch.setenv('BYBIT_API_SECRET', 'operator-secret')
+    assert TradeEngine()._credentials() == ('operator-key', 'operator-secret')
+    assert TradeEngine('own-key', 'own-secret')._credentials() == ('own-key', 'own-secret')
+
+def _engine_with_run(position=None, pending=None):
+    """Движок с запуском 'live' на цикле в отдельном потоке, как у работающего движка"""
+    engine = TradeEngine('key', 'secret')
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    engine.loop = loop
+    instance = StrategyTwo(None, 0.02, 3)
+    instance.position, instance.pending_order = position, pending
+    scheduler = CandleScheduler(instance.interval, exit_check_interval=60)
+    run = StrategyRun('live', 'Стратегия 2', 'BTCUSDT', instance, scheduler)
+    engine._attach(run, instance)
+    engine.runs['live'] = run
+    return engine, run
+
+def _close(engine):
+    engine.loop.call_soon_threadsafe(engine.loop.stop)
+
+@pytest.mark.parametrize('params', [{'symbol': 'ETHUSDT'}, {'strategy_name': 'Стратегия 1'}])
+@pytest.mark.parametrize('state', [{'position': 'long'}, {'pending': ('1', 'buy', 1.0, 100.0)}])
+def test_reconfigure_refuses_symbol_or_strategy_change_with_exposure(params, state):
+    engine, run = _engine_with_run(**state)
+    try:
+        instance = run.instance
+        with pytest.raises(ValueError, match='открытой позиции'):
+            engine.reconfigure('live', params)
+        assert (run.symbol, run.name, run.instance) == ('BTCUSDT', 'Стратегия 2', instance)
+        # Параметры самой стратегии меняются и при открытой позиции
+        assert engine.reconfigure('live', {'rsi_period': 10})
+        assert instance.rsi_period == 10
+    finally:
+        _close(engine)
+
+def test_reconfigure_swaps_strategy_and_keeps_risk_settings():
+    engine, run = _engine_with_run()
+    try:
+        old = run.instance
+        assert engine.reconfigure('live', {'strategy_name': 'Стратегия 1', 'symbol': 'ethusdt', 'bb_period': 30})
+        strategy = run.instance
+        assert isinstance(strategy, StrategyOne) and strategy is not old
+        assert (strategy.risk_per_trade, strategy.leverage, strategy.bb_period) == (0.02, 3, 30)
+        assert (run.name, run.symbol, run.scheduler.interval) == ('Стратегия 1', 'ETHUSDT', '5m')
+        assert run.scheduler.exit_check_interval == 60
+        assert strategy.scheduler is run.scheduler and strategy.risk_book is engine.risk_engine.book('live')
+        assert (engine.strategy, engine.symbol, engine.current_strategy_instance) == ('Стратегия 1', 'ETHUSDT', strategy)
+        assert run.wakeup.is_set()  # спящий цикл запуска пересчитает пробуждение
+    finally:
+        _close(engine)
+
+def test_reconfigure_is_atomic_on_invalid_params():
+    engine, run = _engine_with_run()
+    try:
+        with pytest.raises(ValueError):
+            engine.reconfigure('live', {'risk': 0.05, 'ema_fast': 80, 'symbol': 'SOLUSDT'})
+        assert (run.instance.risk_per_trade, run.instance.ema_fast, run.symbol) == (0.02, 20, 'BTCUSDT')
+        with pytest.raises(ValueError, match='Нет запущенной'):
+            engine.reconfigure('paper-9', {'risk': 0.05})
+    finally:
+        _close(engine)
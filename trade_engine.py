@@ -3,16 +3,62 @@ import threading
 import time
 import logging
 import asyncio
-from typing import Optional, Dict, Any
+import concurrent.futures
+from typing import Optional, Dict, Any, List, Tuple
 from strategy_one import StrategyOne
 from strategy_two import StrategyTwo
 from trading import BybitAPI
+from scheduler import CandleScheduler
+from resampler import MarketData
+from market_stream import MarketStream
+from orderbook import OrderBooks
+from paper import PaperBroker, PaperConfig, PaperExecutor
+from screener import Candidate, Screener
+from risk import EXTERNAL_OWNER, RiskEngine
+from replay import recorder_from_env
+from profiler import profiler
 from db import get_user_settings
 
 logger = logging.getLogger(__name__)
 
+STRATEGIES = {
+    "Стратегия 1": StrategyOne,
+    "Стратегия 2": StrategyTwo,
+}
+
+class StrategyRun:
+    """Запущенная стратегия: экземпляр, пара, планировщик и исполнитель заявок"""
+
+    def __init__(self, run_id: str, name: str, symbol: str, instance, scheduler: CandleScheduler,
+                 mode: str = 'live', paper_config: Optional[PaperConfig] = None):
+        self.run_id = run_id
+        self.name = name
+        self.symbol = symbol
+        self.instance = instance
+        self.scheduler = scheduler
+        self.mode = mode
+        self.paper_config = paper_config
+        self.executor = None  # BybitAPI для live, PaperExecutor для paper
+        self.task: Optional[asyncio.Task] = None
+        # Тик держит замок: перенастройка применяется строго между тиками
+        self.tick_lock = asyncio.Lock()
+        self.wakeup = asyncio.Event()  # прерывает сон до свечи после смены расписания
+
 class TradeEngine:
-    def __init__(self):
+    def __init__(self, api_key: Optional[str] = None, api_secret: Optional[str] = None,
+                 loop: Optional[asyncio.AbstractEventLoop] = None,
+                 market_data: Optional[MarketData] = None, order_books: Optional[OrderBooks] = None,
+                 screener: Optional[Screener] = None, user_id: int = 0, env_credentials: bool = True):
+        # Ключи пользователя; ключи из окружения (счёт оператора) допустимы
+        # только у одиночного движка — движки пользователей торгуют своими
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.env_credentials = env_credentials
+        self.user_id = user_id  # владелец сделок, которые пишут стратегии движка
+        # Общий цикл событий и рыночные данные воркера, если движков много в одном процессе
+        self._shared_loop = loop
+        self._owns_market_data = market_data is None
+        self._owns_screener = screener is None
         self.strategy: Optional[str] = None
         self.symbol: Optional[str] = None
         self.risk: float = 0.01
@@ -26,19 +72,45 @@ class TradeEngine:
         self.last_balance_check = 0
         self.balance_cache = 0.0
         self.cache_timeout = 60  # Кеширование баланса на 60 секунд
+        self.scheduler: Optional[CandleScheduler] = None
+        self.candle_offset = 2.0  # Пробуждение через 2 секунды после закрытия свечи
+        self.candle_jitter = 3.0  # Разброс пробуждений между парами
+        self.exit_check_interval: Optional[float] = None
+        self.error_backoff = 30
+        self.use_stream = True  # Минутные свечи через WebSocket, иначе опрос REST
+        self.market_data: Optional[MarketData] = market_data
+        self.stream: Optional[MarketStream] = None
+        self.order_books: Optional[OrderBooks] = order_books
+        self.paper_broker: Optional[PaperBroker] = None
+        self.screener: Optional[Screener] = screener
+        self.screen_timeout = 120
+        self.reconfigure_timeout = 30
+        # Предторговые лимиты: живой счёт и каждый бумажный — отдельные книги экспозиции
+        self.risk_engine = RiskEngine()
+        self.runs: Dict[str, StrategyRun] = {}
+        # Источник времени планировщиков и кешей; при воспроизведении — виртуальные часы
+        self.clock = time.time
+        self.recorder = recorder_from_env()
+        self._paper_seq = 0
+        self._loop_ready = threading.Event()
+
+    def _credentials(self) -> Tuple[Optional[str], Optional[str]]:
+        """Ключи клиента биржи: пользователя, а у одиночного движка — из окружения"""
+        if self.env_credentials:
+            return self.api_key or os.getenv('BYBIT_API_KEY'), self.api_secret or os.getenv('BYBIT_API_SECRET')
+        return self.api_key or '', self.api_secret or ''
 
     async def _init_api(self):
         if self.api is None:
-            self.api = BybitAPI(
-                api_key=os.getenv('BYBIT_API_KEY'),
-                api_secret=os.getenv('BYBIT_API_SECRET')
-            )
+            api_key, api_secret = self._credentials()
+            self.api = BybitAPI(api_key=api_key, api_secret=api_secret)
+            self.api.recorder = self.recorder
             await self.api.initialize()  # Явная инициализация
 
     async def get_balance(self, force_update: bool = False) -> float:
         """Получение баланса с кешированием и принудительным обновлением"""
         try:
-            current_time = time.time()
+            current_time = self.clock()
             
             # Если баланс недавно проверяли и не требуется принудительное обновление
             if not force_update and current_time - self.last_balance_check < self.cache_timeout:
@@ -53,112 +125,438 @@ class TradeEngine:
                 'recvWindow': 5000
             })
             
-            if not balance_data:
-                logger.error("Пустой ответ от API при запросе баланса")
+            if balance_data is None:
+                logger.error("В ответе биржи нет баланса USDT единого счёта")
                 return self.balance_cache
 
-            logger.debug(f"Raw balance response: {balance_data}")
-            
-            if 'list' in balance_data:
-                for account in balance_data['list']:
-                    if account.get('accountType') == 'UNIFIED':
-                        for coin in account.get('coin', []):
-                            if coin.get('coin') == 'USDT':
-                                available = float(coin.get('availableToWithdraw', 0))
-                                self.balance_cache = available
-                                self.last_balance_check = current_time
-                                logger.info(f"Текущий баланс: {available:.2f} USDT")
-                                return available
-            
-            logger.error(f"Неожиданный формат ответа баланса: {balance_data}")
-            return self.balance_cache
+            available = balance_data.available
+            self.balance_cache = available
+            self.last_balance_check = current_time
+            logger.info(f"Текущий баланс: {available:.2f} USDT")
+            return available
             
         except Exception as e:
             logger.error(f"Ошибка получения баланса: {str(e)}", exc_info=True)
             return self.balance_cache
 
-    # ... остальные методы класса без изменений ...
+    def start_strategy(self, symbol: str, strategy_name: str = "Стратегия 2", risk: float = 0.01, leverage: int = 5,
+                       exit_check_interval: Optional[float] = None, mode: str = 'live',
+                       paper_config: Optional[PaperConfig] = None) -> bool:
+        """Запускает стратегию; mode='paper' — бумажная торговля рядом с живой.
 
-    def start_strategy(self, symbol: str, strategy_name: str = "Стратегия 2", risk: float = 0.01, leverage: int = 5) -> bool:
-        if self.active:
+        symbol='AUTO' — пара выбирается скринером по самому сильному сигналу входа.
+        """
+        if mode == 'live' and self.active:
             logger.warning("Стратегия уже запущена")
             return False
+        if mode == 'live' and not all(self._credentials()):
+            logger.warning(f"Живая торговля пользователя {self.user_id} без API-ключей отклонена")
+            return False
 
         try:
-            self.symbol = symbol
-            self.strategy = strategy_name
-            self.risk = risk
-            self.leverage = leverage
-            self._stop_event.clear()
-
-            if strategy_name == "Стратегия 1":
-                self.current_strategy_instance = StrategyOne(self.api, risk, leverage)
+            if symbol.upper() == 'AUTO':
+                candidates = self.screen(strategy_name, top=1)
+                if not candidates:
+                    logger.info(f"Скринер не нашёл пар для '{strategy_name}'")
+                    return False
+                symbol = candidates[0].symbol
+            strategy_cls = STRATEGIES.get(strategy_name, StrategyTwo)
+            instance = strategy_cls(self.api, risk, leverage)
+            instance.mode = mode
+            scheduler = CandleScheduler(
+                instance.interval,
+                offset=self.candle_offset,
+                jitter=self.candle_jitter,
+                exit_check_interval=exit_check_interval,
+                clock=self.clock
+            )
+            instance.scheduler = scheduler
+
+            if mode == 'paper':
+                self._paper_seq += 1
+                run_id = f"paper-{self._paper_seq}"
             else:
-                self.current_strategy_instance = StrategyTwo(self.api, risk, leverage)
+                run_id = 'live'
+                self.symbol = symbol
+                self.strategy = strategy_name
+                self.risk = risk
+                self.leverage = leverage
+                self.exit_check_interval = exit_check_interval
+                self.current_strategy_instance = instance
+                self.scheduler = scheduler
+                self.active = True
 
-            self.active = True
-            self.thread = threading.Thread(target=self._run_loop, daemon=True)
-            self.thread.start()
-            logger.info(f"Стратегия '{strategy_name}' запущена для пары {symbol} с риском {risk*100}% и плечом {leverage}x")
+            run = StrategyRun(run_id, strategy_name, symbol, instance, scheduler, mode, paper_config)
+            self.runs[run_id] = run
+            self._ensure_loop()
+            asyncio.run_coroutine_threadsafe(self._launch(run), self.loop)
+            logger.info(
+                f"Стратегия '{strategy_name}' ({mode}) запущена для пары {symbol} "
+                f"с риском {risk*100}% и плечом {leverage}x"
+            )
             return True
         except Exception as e:
             logger.error(f"Ошибка запуска стратегии: {e}")
+            if mode == 'live':
+                self.active = False
             return False
 
+    def _ensure_loop(self):
+        """Один поток и цикл событий на все стратегии движка"""
+        if self._shared_loop is not None:
+            if self.loop is None:
+                self._stop_event.clear()
+                self.loop = self._shared_loop
+                asyncio.run_coroutine_threadsafe(self._setup(), self.loop).result(timeout=30)
+            return
+        if self.thread and self.thread.is_alive():
+            return
+        self._stop_event.clear()
+        self._loop_ready.clear()
+        self.thread = threading.Thread(target=self._run_loop, name='trade-engine', daemon=True)
+        self.thread.start()
+        self._loop_ready.wait(timeout=30)
+
+    async def _setup(self):
+        try:
+            await self._init_api()
+            await self._start_market_data()
+        except Exception as e:
+            logger.critical(f"Критическая ошибка инициализации движка: {e}")
+
     def _run_loop(self):
-        while not self._stop_event.is_set():
-            try:
-                self.loop = asyncio.new_event_loop()
-                asyncio.set_event_loop(self.loop)
-                self.loop.run_until_complete(self._init_api())
-                self.loop.run_until_complete(self._run())
-            except Exception as e:
-                logger.critical(f"Критическая ошибка в цикле стратегии: {e}")
-                time.sleep(60)
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        profiler.watch_loop(self.loop, 'trade-engine')
+        try:
+            self.loop.run_until_complete(self._setup())
+        finally:
+            self._loop_ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            profiler.unwatch_loop(self.loop)
+            self.loop.run_until_complete(self._shutdown())
+            self.loop.close()
+
+    async def _start_market_data(self):
+        """Один поток минутных свечей на пару, из которого строятся все таймфреймы"""
+        if self.paper_broker is not None:
+            return
+        if not self._owns_market_data:
+            self.paper_broker = PaperBroker(self.market_data.api, self.market_data, clock=self.clock)
+            return
+        self.stream = MarketStream() if self.use_stream else None
+        self.market_data = MarketData(self.api, self.stream, clock=self.clock)
+        self.paper_broker = PaperBroker(self.api, self.market_data, clock=self.clock)
+        if self.stream is not None:
+            self.stream.recorder = self.recorder
+            self.order_books = OrderBooks(self.stream)
+            asyncio.create_task(self.stream.run())
+
+    def screen(self, strategy_name: Optional[str] = None, top: Optional[int] = 10) -> List[Candidate]:
+        """Кандидаты на вход по всем USDT-контрактам, от самого сильного сигнала"""
+        names = [strategy_name] if strategy_name else None
+        loop = self.loop or self._shared_loop
+        if loop is not None and loop.is_running() and (self.screener is not None or self.api is not None):
+            future = asyncio.run_coroutine_threadsafe(self._screen(names, top), loop)
+            return future.result(timeout=self.screen_timeout)
+        return asyncio.run(self._screen_once(names, top))
 
-    async def _run(self):
+    async def _screen(self, names, top) -> List[Candidate]:
+        if self.screener is None:
+            self.screener = Screener(self.api, STRATEGIES)
+        return await self.screener.screen(names, top)
+
+    async def _screen_once(self, names, top) -> List[Candidate]:
+        """Разовый скан, пока движок не запущен: публичные данные, ключи не нужны"""
+        async with BybitAPI(api_key='', api_secret='') as api:
+            return await Screener(api, STRATEGIES).screen(names, top)
+
+    async def _launch(self, run: StrategyRun):
+        if run.mode == 'paper':
+            run.executor = self.paper_broker.account(run.paper_config)
+        else:
+            # API создаётся уже внутри потока, поэтому передаём его стратегии здесь
+            run.executor = self.api
+            await self._seed_risk_book(run)
+        await self._track(run.symbol)
+        self._attach(run, run.instance)
+        run.task = asyncio.create_task(self._run(run))
+
+    async def _track(self, symbol: str):
+        """Свечи и стакан пары нужны запущенной стратегии"""
+        try:
+            if self.market_data is not None:
+                self.market_data.track(symbol)
+            if self.order_books is not None:
+                await self.order_books.track(symbol)
+        except Exception as e:
+            # Поток переподпишет все топики при переподключении
+            logger.error(f"Ошибка подписки на {symbol}: {e}")
+
+    async def _untrack(self, symbol: str):
+        """Отписка от свечей и стакана пары, если она больше не нужна ни одной стратегии"""
+        try:
+            if self.market_data is not None:
+                await self.market_data.untrack(symbol)
+            if self.order_books is not None:
+                await self.order_books.untrack(symbol)
+        except Exception as e:
+            logger.error(f"Ошибка отписки от {symbol}: {e}")
+
+    async def _seed_risk_book(self, run: StrategyRun):
+        """Позиции, уже открытые на счёте, учитываются в книге до первой проверки заявки"""
+        book = self.risk_engine.book(self._risk_account(run))
+        try:
+            positions = await run.executor.get_positions()
+        except Exception as e:
+            logger.error(f"Не удалось получить позиции счёта для риск-книги: {e}")
+            return
+        book.release(EXTERNAL_OWNER)
+        for position in positions:
+            if position.size > 0 and position.side:
+                book.on_open(EXTERNAL_OWNER, position.symbol, position.side, position.size,
+                             position.entry_price, position.leverage or 1)
+        if book.positions:
+            logger.info(f"Риск-книга: учтено открытых позиций счёта: {len(book.positions)}")
+
+    def _attach(self, run: StrategyRun, strategy):
+        """Подключает экземпляр стратегии к исполнителю, данным и риск-книге запуска"""
+        strategy.api = run.executor
+        strategy.market_data = self.market_data
+        strategy.order_books = self.order_books
+        strategy.run_id = run.run_id
+        strategy.user_id = self.user_id
+        strategy.risk_book = self.risk_engine.book(self._risk_account(run))
+        if isinstance(run.executor, PaperExecutor):
+            run.executor.listeners.append(strategy.on_position_closed)
+
+    def update_credentials(self, api_key: Optional[str], api_secret: Optional[str]) -> bool:
+        """Новые ключи пользователя применяются к работающему движку без остановки стратегий"""
+        self.api_key, self.api_secret = api_key, api_secret
+        api, loop = self.api, self.loop
+        if api is None or loop is None or loop.is_closed():
+            return True  # клиент биржи ещё не создан и возьмёт новые ключи при создании
+        api_key, api_secret = self._credentials()
+
+        def apply():
+            # В потоке цикла: запрос не подпишется наполовину старыми ключами
+            api.api_key = api_key
+            api.api_secret = api_secret
+            self.last_balance_check = 0  # вместе с ключами мог смениться счёт
+        loop.call_soon_threadsafe(apply)
+        logger.info("Ключи API движка обновлены")
+        return True
+
+    def reconfigure(self, run_id: str = 'live', params: Optional[Dict[str, Any]] = None) -> bool:
+        """Меняет параметры работающей стратегии, не останавливая цикл событий.
+
+        params — параметры start_strategy (symbol, strategy_name, risk, leverage,
+        exit_check_interval) и параметры стратегии из её PARAMS. Изменения
+        применяются атомарно между тиками; прогретые свечи, HTTP-сессия и учёт
+        открытой позиции сохраняются. Неприменимые параметры — ValueError с причиной.
+        """
+        params = params or {}
+        run = self.runs.get(run_id)
+        if run is None or self.loop is None or self.loop.is_closed():
+            raise ValueError(f"Нет запущенной стратегии {run_id}")
+        future = asyncio.run_coroutine_threadsafe(self._reconfigure(run, dict(params)), self.loop)
+        try:
+            future.result(timeout=self.reconfigure_timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise TimeoutError(f"Перенастройка {run_id} не успела за {self.reconfigure_timeout} с")
+        except Exception as e:
+            logger.error(f"Ошибка перенастройки {run_id}: {e}")
+            raise
+        logger.info(f"Стратегия {run_id} перенастроена: {params}")
+        return True
+
+    async def _reconfigure(self, run: StrategyRun, params: Dict[str, Any]):
+        if 'risk' in params:
+            params['risk_per_trade'] = params.pop('risk')
+        symbol = params.pop('symbol', run.symbol).upper()
+        name = params.pop('strategy_name', run.name)
+        exit_check = params.pop('exit_check_interval', run.scheduler.exit_check_interval)
+        exit_check = float(exit_check) if exit_check else None
+        if name != run.name and name not in STRATEGIES:
+            raise ValueError(f"Неизвестная стратегия {name}")
+
+        async with run.tick_lock:
+            strategy = run.instance
+            if (symbol != run.symbol or name != run.name) and (
+                    strategy.position is not None or strategy.pending_order is not None):
+                raise ValueError("Пару и стратегию нельзя сменить при открытой позиции или заявке")
+            scheduler = run.scheduler
+            if name != run.name:
+                # Другая стратегия — новый экземпляр, но данные рынка и исполнитель прежние
+                strategy = STRATEGIES[name](run.executor, run.instance.risk_per_trade, run.instance.leverage)
+                strategy.mode = run.mode
+                scheduler = CandleScheduler(
+                    strategy.interval,
+                    offset=self.candle_offset,
+                    jitter=self.candle_jitter,
+                    exit_check_interval=exit_check,
+                    clock=self.clock
+                )
+                strategy.scheduler = scheduler
+            strategy.apply_config(params)
+
+            # Дальше ничего не может упасть: применяем всё разом
+            reschedule = symbol != run.symbol or strategy is not run.instance \
+                or exit_check != scheduler.exit_check_interval
+            scheduler.exit_check_interval = exit_check
+            if strategy is not run.instance:
+                if isinstance(run.executor, PaperExecutor):
+                    run.executor.listeners.remove(run.instance.on_position_closed)
+                self._attach(run, strategy)
+                run.instance, run.scheduler, run.name = strategy, scheduler, name
+            previous_symbol, run.symbol = run.symbol, symbol
+            if run.run_id == 'live':
+                self.symbol, self.strategy = symbol, name
+                self.risk, self.leverage = strategy.risk_per_trade, strategy.leverage
+                self.exit_check_interval = exit_check
+                self.current_strategy_instance, self.scheduler = strategy, scheduler
+            if symbol != previous_symbol:
+                await self._track(symbol)
+                await self._untrack(previous_symbol)
+            if reschedule:
+                run.wakeup.set()
+
+    async def _sleep(self, run: StrategyRun, delay: float):
+        """Сон до пробуждения, который перенастройка может прервать"""
+        try:
+            await asyncio.wait_for(run.wakeup.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    @staticmethod
+    def _risk_account(run: StrategyRun) -> str:
+        return run.run_id if run.mode == 'paper' else 'live'
+
+    async def _balance_for(self, run: StrategyRun, cached: bool = False) -> float:
+        if isinstance(run.executor, PaperExecutor):
+            return run.executor.available()
+        return self.balance_cache if cached else await self.get_balance()
+
+    async def _run(self, run: StrategyRun):
         while not self._stop_event.is_set():
+            # Экземпляр, планировщик и пару читаем заново: их могла сменить перенастройка
+            wake = run.scheduler.next_wake(run.symbol, has_position=run.instance.position is not None)
+            if wake.delay > 0:
+                await self._sleep(run, wake.delay)
+            if self._stop_event.is_set():
+                break
+            if run.wakeup.is_set():
+                run.wakeup.clear()
+                continue
+
             try:
-                if not self.loop or self.loop.is_closed():
-                    self.loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(self.loop)
-                
-                balance = await self.get_balance()
-                if balance > 0:
-                    await self.current_strategy_instance.execute_trade(self.symbol, balance)
-                else:
-                    logger.warning("Нулевой баланс, торговля приостановлена")
+                async with run.tick_lock:
+                    strategy = run.instance
+                    if wake.exits_only:
+                        # Внутри свечи проверяем только выход, баланс берём из кеша
+                        balance = await self._balance_for(run, cached=True)
+                        await strategy.execute_trade(run.symbol, balance, exits_only=True)
+                    else:
+                        balance = await self._balance_for(run)
+                        if balance > 0:
+                            await strategy.execute_trade(run.symbol, balance)
+                        else:
+                            logger.warning(f"Нулевой баланс, торговля {run.run_id} приостановлена")
+                    run.scheduler.acknowledge(wake)
             except Exception as e:
-                logger.error(f"Ошибка при выполнении сделки: {e}")
-                await asyncio.sleep(30)
-            
-            await asyncio.sleep(15)
+                logger.error(f"Ошибка при выполнении сделки ({run.run_id}): {e}")
+                await asyncio.sleep(self.error_backoff)
 
-    def stop_strategy(self) -> bool:
-        if self.active:
-            try:
-                self._stop_event.set()
-                if self.loop and not self.loop.is_closed():
-                    self.loop.call_soon_threadsafe(self.loop.stop)
-                if self.thread and self.thread.is_alive():
-                    self.thread.join(timeout=5)
+    async def _stop_run(self, run: StrategyRun):
+        if run.task is not None:
+            run.task.cancel()
+        await self._untrack(run.symbol)
+        if isinstance(run.executor, PaperExecutor):
+            await run.executor.close()
+            self.risk_engine.drop(self._risk_account(run))
+        else:
+            # Новый экземпляр стратегии не знает о позициях старого
+            self.risk_engine.book(self._risk_account(run)).release(run.run_id)
+
+    async def _shutdown(self):
+        for run in list(self.runs.values()):
+            await self._stop_run(run)
+        if self.stream is not None:
+            await self.stream.close()
+        if self.paper_broker is not None:
+            self.paper_broker.close()
+        if self._shared_loop is None:
+            current = asyncio.current_task()
+            for task in asyncio.all_tasks():
+                if task is not current:
+                    task.cancel()
+        # Сессия aiohttp привязана к циклу событий, при следующем запуске создаём новую
+        if self.api is not None:
+            await self.api.close()
+            self.api = None
+
+    def stop_strategy(self, run_id: str = 'live') -> bool:
+        run = self.runs.get(run_id)
+        if run is None:
+            logger.info("Нет активной стратегии для остановки")
+            return False
+        try:
+            del self.runs[run_id]
+            if self.loop and not self.loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self._stop_run(run), self.loop).result(timeout=5)
+            if run_id == 'live':
                 self.active = False
                 self.current_strategy_instance = None
-                logger.info("Торговля остановлена")
-                return True
-            except Exception as e:
-                logger.error(f"Ошибка остановки стратегии: {e}")
-                return False
-        logger.info("Нет активной стратегии для остановки")
-        return False
+            if not self.runs:
+                self._stop_loop()
+            logger.info(f"Торговля остановлена ({run_id})")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка остановки стратегии: {e}")
+            return False
+
+    def stop_all(self):
+        for run_id in list(self.runs):
+            self.stop_strategy(run_id)
+
+    def _stop_loop(self):
+        self._stop_event.set()
+        if self._shared_loop is not None:
+            # Общий цикл воркера продолжает работать, закрываем только своё
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop).result(timeout=5)
+            self.loop = None
+        else:
+            if self.loop and not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(self.loop.stop)
+            if self.thread and self.thread.is_alive():
+                self.thread.join(timeout=5)
+        if self._owns_market_data:
+            self.market_data = None
+            self.order_books = None
+        if self._owns_screener:
+            # Скринер держит API этого цикла, который только что закрыт
+            self.screener = None
+        self.stream = None
+        self.paper_broker = None
 
     def get_status(self) -> str:
+        paper = [run for run in self.runs.values() if run.mode == 'paper']
+        paper_line = f"\n🧪 <b>Бумажных стратегий</b>: <code>{len(paper)}</code>" if paper else ""
         if self.active and self.strategy and self.symbol:
+            exposure = self.risk_engine.book('live').snapshot()
             return (
                 f"📊 <b>Активная стратегия</b>:\n"
                 f"🏷 <b>Стратегия</b>: <code>{self.strategy}</code>\n"
                 f"📌 <b>Пара</b>: <code>{self.symbol}</code>\n"
                 f"⚠ <b>Риск на сделку</b>: <code>{self.risk*100}%</code>\n"
-                f"↔ <b>Плечо</b>: <code>{self.leverage}x</code>"
+                f"↔ <b>Плечо</b>: <code>{self.leverage}x</code>\n"
+                f"⏱ <b>Таймфрейм</b>: <code>{self.scheduler.interval}</code>, "
+                f"сэкономлено анализов: <code>{self.scheduler.saved_evaluations()}</code>\n"
+                f"🛡 <b>Экспозиция</b>: <code>{exposure['gross']:.2f} USDT</code>, "
+                f"маржа: <code>{exposure['margin']:.2f} USDT</code>"
+                f"{paper_line}"
             )
-        return "ℹ <b>Стратегия не запущена</b>"
+        return "ℹ <b>Стратегия не запущена</b>" + paper_line
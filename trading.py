@@ -2,22 +2,33 @@ import os
 import hmac
 import hashlib
 import time
-import json
 import aiohttp
+import numpy as np
 from typing import Optional, Dict, Any, List
 import logging
+from models import OrderResult, PositionInfo, WalletBalance, loads, parse_klines
 
 logger = logging.getLogger(__name__)
 
+# Таймфреймы бота -> значения параметра interval в API Bybit v5
+KLINE_INTERVALS = {
+    '1m': '1', '3m': '3', '5m': '5', '15m': '15', '30m': '30',
+    '1h': '60', '2h': '120', '4h': '240', '1d': 'D'
+}
+
 class BybitAPI:
     BASE_URL = 'https://api.bybit.com'
+    mode = 'live'
     
-    def __init__(self, api_key: str, api_secret: str):
+    def __init__(self, api_key: str, api_secret: str, base_url: Optional[str] = None):
         self.api_key = api_key
         self.api_secret = api_secret
+        # BYBIT_BASE_URL позволяет направить бота на локальный симулятор биржи
+        self.base_url = (base_url or os.getenv('BYBIT_BASE_URL') or self.BASE_URL).rstrip('/')
         self._session = None
         self.leverage = 5
         self.initialized = False
+        self.recorder = None  # replay.Recorder: запись запросов и ответов для воспроизведения
 
     async def initialize(self):
         """Явная инициализация соединения"""
@@ -41,13 +52,17 @@ class BybitAPI:
         ).hexdigest()
 
     async def _request(self, method: str, endpoint: str, params: Optional[Dict] = None, signed: bool = False) -> Dict:
-        url = f"{self.BASE_URL}{endpoint}"
+        url = f"{self.base_url}{endpoint}"
         headers = {
             'Content-Type': 'application/json',
             'X-BAPI-RECV-WINDOW': '5000',
             'X-BAPI-TIMESTAMP': str(int(time.time() * 1000))
         }
         
+        if params:
+            # aiohttp не принимает bool в query, а подпись должна совпасть с отправленной строкой
+            params = {k: str(v).lower() if isinstance(v, bool) else v for k, v in params.items()}
+
         if signed:
             if params is None:
                 params = {}
@@ -60,45 +75,85 @@ class BybitAPI:
             async with session.request(
                 method, url, params=params, headers=headers
             ) as response:
-                response_text = await response.text()
-                
-                if response.status != 200:
-                    logger.error(f"API error {response.status}: {response_text}")
-                    raise Exception(f"API returned {response.status}: {response_text}")
-                
-                try:
-                    data = json.loads(response_text)
-                    if data.get('retCode') != 0 and data.get('ret_code') != 0:
-                        msg = data.get('retMsg') or data.get('ret_msg', 'Unknown error')
-                        logger.error(f"API error: {msg}")
-                        raise Exception(f"API error: {msg}")
-                    return data.get('result', data)
-                except json.JSONDecodeError:
-                    logger.error(f"Invalid JSON: {response_text}")
-                    raise Exception(f"Invalid JSON response: {response_text}")
+                # Разбираем JSON прямо из байтов, без промежуточной строки
+                body = await response.read()
+                if self.recorder is not None:
+                    self.recorder.rest(method, endpoint, params, response.status, body)
+                return self._decode(response.status, body)
                     
         except Exception as e:
             logger.error(f"Request failed: {str(e)}", exc_info=True)
             raise
 
-    async def get_balance(self, params: Optional[Dict] = None) -> Dict[str, Any]:
+    @staticmethod
+    def _decode(status: int, body: bytes) -> Dict:
+        if status != 200:
+            response_text = body.decode('utf-8', 'replace')
+            logger.error(f"API error {status}: {response_text}")
+            raise Exception(f"API returned {status}: {response_text}")
+        
+        try:
+            data = loads(body)
+        except ValueError:
+            response_text = body.decode('utf-8', 'replace')
+            logger.error(f"Invalid JSON: {response_text}")
+            raise Exception(f"Invalid JSON response: {response_text}")
+        if data.get('retCode') != 0 and data.get('ret_code') != 0:
+            msg = data.get('retMsg') or data.get('ret_msg', 'Unknown error')
+            logger.error(f"API error: {msg}")
+            raise Exception(f"API error: {msg}")
+        return data.get('result', data)
+
+    async def get_balance(self, params: Optional[Dict] = None) -> Optional[WalletBalance]:
+        """Баланс USDT единого счёта; None, если биржа его не вернула"""
         endpoint = '/v5/account/wallet-balance'
         params = params or {}
         params.update({
             'accountType': 'UNIFIED',
             'coin': 'USDT'
         })
-        return await self._request('GET', endpoint, params, signed=True)
+        result = await self._request('GET', endpoint, params, signed=True)
+        return WalletBalance.from_result(result)
 
-    # ... остальные методы без изменений ...
+    async def get_positions(self, symbol: Optional[str] = None) -> List[PositionInfo]:
+        endpoint = '/v5/position/list'
+        params = {'category': 'linear', 'settleCoin': 'USDT'}
+        if symbol:
+            params['symbol'] = symbol
+        result = await self._request('GET', endpoint, params, signed=True)
+        return PositionInfo.list_from_result(result)
 
-    async def get_balance(self) -> Dict[str, Any]:
-        endpoint = '/v5/account/wallet-balance'
+    async def get_klines(self, symbol: str, interval: str = '5m', limit: int = 100) -> np.ndarray:
+        """Свечи float64-массивом (N x 6) в хронологическом порядке:
+        timestamp, open, high, low, close, volume"""
+        endpoint = '/v5/market/kline'
         params = {
-            'accountType': 'UNIFIED',
-            'coin': 'USDT'
+            'category': 'linear',
+            'symbol': symbol,
+            'interval': KLINE_INTERVALS[interval],
+            'limit': limit
         }
-        return await self._request('GET', endpoint, params, signed=True)
+        result = await self._request('GET', endpoint, params)
+        # Bybit отдаёт свечи от новых к старым, последний столбец — turnover
+        return parse_klines(result.get('list', []))
+
+    async def get_symbols(self, quote_coin: str = 'USDT') -> List[str]:
+        """Торгуемые бессрочные контракты с котировкой в quote_coin"""
+        endpoint = '/v5/market/instruments-info'
+        params = {'category': 'linear', 'limit': 1000}
+        symbols = []
+        while True:
+            result = await self._request('GET', endpoint, dict(params))
+            symbols.extend(
+                item['symbol'] for item in result.get('list', [])
+                if item.get('status') == 'Trading'
+                and item.get('quoteCoin') == quote_coin
+                and item.get('contractType') == 'LinearPerpetual'
+            )
+            cursor = result.get('nextPageCursor')
+            if not cursor:
+                return symbols
+            params['cursor'] = cursor
 
     async def set_leverage(self, symbol: str, leverage: int) -> Dict[str, Any]:
         """Set leverage for a specific symbol"""
@@ -122,8 +177,9 @@ class BybitAPI:
         price: Optional[float] = None,
         order_type: str = 'Market',
         take_profit: Optional[float] = None,
-        stop_loss: Optional[float] = None
-    ) -> Dict[str, Any]:
+        stop_loss: Optional[float] = None,
+        leverage: Optional[int] = None
+    ) -> OrderResult:
         endpoint = '/private/linear/order/create'
         params = {
             'symbol': symbol,
@@ -134,7 +190,7 @@ class BybitAPI:
             'reduce_only': False,
             'close_on_trigger': False,
             'is_isolated': True,
-            'leverage': self.leverage
+            'leverage': leverage or self.leverage
         }
         
         if price is not None:
@@ -146,9 +202,10 @@ class BybitAPI:
         if stop_loss:
             params['stop_loss'] = stop_loss
         
-        return await self._request('POST', endpoint, params, signed=True)
+        result = await self._request('POST', endpoint, params, signed=True)
+        return OrderResult.from_result(result)
 
-    async def close_position(self, symbol: str, side: str, quantity: float) -> Dict[str, Any]:
+    async def close_position(self, symbol: str, side: str, quantity: float) -> OrderResult:
         endpoint = '/private/linear/order/create'
         params = {
             'symbol': symbol,
@@ -161,7 +218,13 @@ class BybitAPI:
             'is_isolated': True,
             'leverage': self.leverage
         }
-        return await self._request('POST', endpoint, params, signed=True)
+        result = await self._request('POST', endpoint, params, signed=True)
+        return OrderResult.from_result(result)
+
+    async def cancel_orders(self, symbol: str) -> Dict[str, Any]:
+        """Снимает все активные заявки по паре"""
+        endpoint = '/private/linear/order/cancel-all'
+        return await self._request('POST', endpoint, {'symbol': symbol}, signed=True)
 
     async def close(self):
         if self._session and not self._session.closed:
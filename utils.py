@@ -1,6 +1,10 @@
 from datetime import datetime
+import json
+import hashlib
 import logging
-from typing import Optional
+from typing import Any, Dict, Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 
 logger = logging.getLogger(__name__)
 
@@ -8,7 +12,7 @@ def now_iso() -> str:
     """Возвращает текущее время в ISO формате"""
     return datetime.utcnow().isoformat()
 
-def log_trade_entry(strategy: str, symbol: str, price: float, volume: float):
+def log_trade_entry(strategy: str, symbol: str, price: float, volume: float, leverage: Optional[int] = None):
     """Логирует вход в сделку"""
     message = (
         f"[{now_iso()}] 📈 Вход в сделку | "
@@ -17,6 +21,8 @@ def log_trade_entry(strategy: str, symbol: str, price: float, volume: float):
         f"Цена: {price:.4f} | "
         f"Объем: {volume:.2f}"
     )
+    if leverage is not None:
+        message += f" | Плечо: {leverage}x"
     logger.info(message)
     print(message)
 
@@ -35,3 +41,103 @@ def log_trade_exit(trade_id: int, price: float, profit: Optional[float]):
 def calculate_percentage_change(entry: float, exit: float) -> float:
     """Вычисляет процент изменения цены"""
     return ((exit - entry) / entry) * 100
+
+# Длительность свечи в секундах для поддерживаемых таймфреймов
+INTERVAL_SECONDS = {
+    '1m': 60,
+    '3m': 180,
+    '5m': 300,
+    '15m': 900,
+    '30m': 1800,
+    '1h': 3600,
+    '2h': 7200,
+    '4h': 14400,
+    '1d': 86400,
+}
+
+def params_hash(params: Dict[str, Any]) -> str:
+    """Короткий отпечаток набора параметров: сделки с разными настройками не смешиваются"""
+    payload = json.dumps(params, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()[:12]
+
+def interval_to_seconds(interval: str) -> int:
+    """Возвращает длительность таймфрейма в секундах"""
+    try:
+        return INTERVAL_SECONDS[interval]
+    except KeyError:
+        raise ValueError(f"Неподдерживаемый таймфрейм: {interval}")
+
+
+# Индикаторы на NumPy. Все функции считают вдоль последней оси, поэтому
+# работают как с одним рядом, так и с матрицей (инструмент x время).
+# Первые значения до заполнения окна равны NaN, как у pandas.rolling.
+
+def _output(x: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+    if out is None:
+        out = np.empty(x.shape, dtype=np.float64)
+    return out
+
+def rolling_mean(x: np.ndarray, window: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Скользящее среднее"""
+    out = _output(x, out)
+    out[..., :window - 1] = np.nan
+    if x.shape[-1] >= window:
+        np.mean(sliding_window_view(x, window, axis=-1), axis=-1, out=out[..., window - 1:])
+    return out
+
+def rolling_std(x: np.ndarray, window: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Скользящее стандартное отклонение (ddof=1, как у pandas)"""
+    out = _output(x, out)
+    out[..., :window - 1] = np.nan
+    if x.shape[-1] >= window:
+        np.std(sliding_window_view(x, window, axis=-1), axis=-1, ddof=1, out=out[..., window - 1:])
+    return out
+
+def ema(x: np.ndarray, span: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Экспоненциальное среднее (adjust=False).
+
+    Ряд начинается с первого конечного значения строки: у пар в матрице
+    скринера с историей короче окна слева NaN, и без этого EMA осталась бы
+    NaN целиком.
+    """
+    out = _output(x, out)
+    alpha = 2.0 / (span + 1)
+    out[..., 0] = x[..., 0]
+    for i in range(1, x.shape[-1]):
+        out[..., i] = alpha * x[..., i] + (1 - alpha) * out[..., i - 1]
+        np.copyto(out[..., i], x[..., i], where=np.isnan(out[..., i - 1]))
+    return out
+
+def rsi(close: np.ndarray, period: int, out: Optional[np.ndarray] = None) -> np.ndarray:
+    """RSI на простых скользящих средних прироста и падения"""
+    out = _output(close, out)
+    delta = np.empty(close.shape, dtype=np.float64)
+    delta[..., 0] = np.nan
+    np.subtract(close[..., 1:], close[..., :-1], out=delta[..., 1:])
+    avg_gain = rolling_mean(np.clip(delta, 0, None), period)
+    avg_loss = rolling_mean(-np.clip(delta, None, 0), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        np.divide(avg_gain, avg_loss, out=out)
+    return np.subtract(100, 100 / (1 + out), out=out)
+
+def atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, period: int,
+        out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Средний истинный диапазон"""
+    tr = high - low
+    prev_close = close[..., :-1]
+    np.fmax(tr[..., 1:], np.abs(high[..., 1:] - prev_close), out=tr[..., 1:])
+    np.fmax(tr[..., 1:], np.abs(low[..., 1:] - prev_close), out=tr[..., 1:])
+    return rolling_mean(tr, period, out)
+
+def supertrend_direction(close: np.ndarray, upper: np.ndarray, lower: np.ndarray,
+                         out: Optional[np.ndarray] = None) -> np.ndarray:
+    """Направление Supertrend: 1 — вверх, -1 — вниз"""
+    out = _output(close, out)
+    out[..., 0] = 1
+    for i in range(1, close.shape[-1]):
+        prev = out[..., i - 1]
+        out[..., i] = np.where(
+            close[..., i] > upper[..., i - 1], 1,
+            np.where(close[..., i] < lower[..., i - 1], -1, prev)
+        )
+    return out